@@ -0,0 +1,3 @@
+"""Spans, timing breakdowns and metrics for the SailPoint onboarding agent tools."""
+from .spans import Span, add_exporter, current_span, span, trace, traced
+from .export import TraceFileExporter, add_collector, otlp_trace, prometheus_text, start_metrics_server
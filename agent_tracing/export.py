@@ -0,0 +1,212 @@
+"""Process metrics and trace files for long-running agent processes.
+
+Every finished trace is folded into in-process metrics:
+
+- `agent_tool_duration_seconds`: histogram per root span (tool)
+- `agent_tool_errors_total`: traces that raised or returned an error status
+- `agent_stage_duration_seconds`: sum and count per tool and stage path
+
+Other components add their own series with `add_collector`.
+`prometheus_text()` renders everything in the Prometheus text format, which
+`start_metrics_server` serves at `/metrics` on `TOOL_METRICS_PORT` (0, the
+default, serves nothing). With `TOOL_TRACE_FILE` set, each trace is also
+appended to that file as one OTLP/JSON `ExportTraceServiceRequest` per line,
+the format the OpenTelemetry Collector's `otlpjsonfile` receiver reads.
+"""
+import os
+import json
+import threading
+from collections import defaultdict
+
+from .spans import add_exporter
+
+METRICS_PORT = int(os.environ.get('TOOL_METRICS_PORT', '0'))
+METRICS_HOST = os.environ.get('TOOL_METRICS_HOST', '127.0.0.1')
+TRACE_FILE = os.environ.get('TOOL_TRACE_FILE', '')
+SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'sailpoint-agent')
+
+# Histogram bucket upper bounds, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OTLP_STATUS_ERROR = 2
+OTLP_SPAN_KIND_INTERNAL = 1
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tools = {}
+        self._errors = defaultdict(int)
+        self._stages = {}
+
+    def record(self, root) -> None:
+        seconds = root.duration_ms / 1000
+        with self._lock:
+            tool = self._tools.setdefault(root.name, {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    tool['buckets'][i] += 1
+            tool['sum'] += seconds
+            tool['count'] += 1
+            if root.error is not None:
+                self._errors[root.name] += 1
+            for path, child in root.walk():
+                stage = self._stages.setdefault((root.name, path), [0.0, 0])
+                stage[0] += child.duration_ms / 1000
+                stage[1] += 1
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return ({name: {**tool, 'buckets': list(tool['buckets'])} for name, tool in self._tools.items()},
+                    dict(self._errors), {key: list(value) for key, value in self._stages.items()})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tools.clear()
+            self._errors.clear()
+            self._stages.clear()
+
+
+metrics = _Metrics()
+add_exporter(metrics.record)
+# Callables returning extra exposition lines (with their HELP and TYPE comments)
+_collectors = []
+
+
+def add_collector(collector) -> None:
+    """Registers a callable whose exposition lines are appended to `prometheus_text()`."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def _label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def prometheus_text() -> str:
+    """The process metrics in the Prometheus text exposition format."""
+    tools, errors, stages = metrics.snapshot()
+    lines = ['# HELP agent_tool_duration_seconds Duration of agent tool calls.',
+             '# TYPE agent_tool_duration_seconds histogram']
+    for name, tool in sorted(tools.items()):
+        label = f'tool="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, tool['buckets']):
+            lines.append(f'agent_tool_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'agent_tool_duration_seconds_bucket{{{label},le="+Inf"}} {tool["count"]}')
+        lines.append(f'agent_tool_duration_seconds_sum{{{label}}} {tool["sum"]:.6f}')
+        lines.append(f'agent_tool_duration_seconds_count{{{label}}} {tool["count"]}')
+    lines += ['# HELP agent_tool_errors_total Agent tool calls that raised or returned an error status.',
+              '# TYPE agent_tool_errors_total counter']
+    for name in sorted(tools):
+        lines.append(f'agent_tool_errors_total{{tool="{_label(name)}"}} {errors.get(name, 0)}')
+    lines += ['# HELP agent_stage_duration_seconds Time spent in each stage of an agent tool call.',
+              '# TYPE agent_stage_duration_seconds summary']
+    for (name, path), (total, count) in sorted(stages.items()):
+        label = f'tool="{_label(name)}",stage="{_label(path)}"'
+        lines.append(f'agent_stage_duration_seconds_sum{{{label}}} {total:.6f}')
+        lines.append(f'agent_stage_duration_seconds_count{{{label}}} {count}')
+    for collector in list(_collectors):
+        try:
+            lines += collector()
+        except Exception:
+            pass
+    return '\n'.join(lines) + '\n'
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = None):
+    """
+    Serves `prometheus_text()` at /metrics from a daemon thread, once per process.
+
+    Args:
+        port: Port to listen on (TOOL_METRICS_PORT when None; 0 serves nothing)
+        host: Address to bind (TOOL_METRICS_HOST when None)
+
+    Returns:
+        The HTTP server, or None when no port is configured
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    # Imported here so processes that only record spans don't pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host or METRICS_HOST, port), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='agent-metrics', daemon=True).start()
+        return _server
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_trace(root) -> dict:
+    """A finished trace as an OTLP/JSON `ExportTraceServiceRequest`."""
+    spans = []
+    for _, current in [('', root)] + list(root.walk()):
+        otlp_span = {
+            "traceId": current.trace_id,
+            "spanId": current.span_id,
+            "name": current.name,
+            "kind": OTLP_SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(current.start_ns),
+            "endTimeUnixNano": str(current.end_ns),
+            # Profiles and memory summaries only go to the tool result
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in current.attributes.items()
+                           if isinstance(value, (str, int, float, bool))]
+        }
+        if current.parent is not None:
+            otlp_span["parentSpanId"] = current.parent.span_id
+        if current.error is not None:
+            otlp_span["status"] = {"code": OTLP_STATUS_ERROR, "message": current.error}
+        spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}}]},
+        "scopeSpans": [{"scope": {"name": "agent_tracing"}, "spans": spans}]
+    }]}
+
+
+class TraceFileExporter:
+    """Appends each finished trace to `path` as one line of OTLP/JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, root) -> None:
+        line = json.dumps(otlp_trace(root), separators=(',', ':')) + '\n'
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+if TRACE_FILE:
+    add_exporter(TraceFileExporter(TRACE_FILE))
@@ -0,0 +1,236 @@
+"""Lightweight spans around agent tools and their internal stages.
+
+`trace(name)` times a block as the root of a new trace, and `span(name)`
+times a stage of the active trace (in the same thread or asyncio task) as a
+child of the innermost open span. Outside a trace, `span` does nothing, so
+library code can be instrumented at no cost to callers that don't trace,
+e.g. batch worker processes. When a trace ends, its tree is recorded in the
+process metrics (see `export.py`) and, with `TOOL_TRACE_FILE` set, appended
+to that file as OTLP/JSON.
+
+`traced` wraps an agent tool in a trace named after the tool and adds the
+breakdown to its dict result:
+
+    "timings": {"total_ms": 96.4, "stages": {"fetch_form_data": 41.7,
+                "fetch_form_data/mcp.get_user_summary": 3.2, ..., "xlsx.patch": 38.5}}
+
+Stages are keyed by their path below the root; repeated stages are summed.
+With `TOOL_TRACE_PROFILE` set to `cprofile` and/or `tracemalloc`
+(comma-separated), each traced call is also profiled, and the hottest
+functions and the allocation growth per line are added under
+`timings.profile` and `timings.memory`.
+"""
+import os
+import time
+import inspect
+import secrets
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TRACE_PROFILE = {mode.strip() for mode in os.environ.get('TOOL_TRACE_PROFILE', '').split(',') if mode.strip()}
+PROFILE_TOP = int(os.environ.get('TOOL_TRACE_PROFILE_TOP', '15'))
+
+_current = contextvars.ContextVar('agent_tracing_span', default=None)
+# Called with each finished root span
+_exporters = []
+_profile_lock = threading.Lock()
+
+
+class Span:
+    """One timed block of a trace."""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'children', 'attributes', 'error',
+                 'start_ns', 'end_ns', '_started')
+
+    def __init__(self, name: str, parent: 'Span' = None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.children = []
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter_ns()
+
+    def finish(self) -> None:
+        # Wall-clock start plus a monotonic duration
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else self.start_ns + time.perf_counter_ns() - self._started
+        return (end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def walk(self, path: str = ''):
+        """Yields (path below this span, span) for every descendant, depth first."""
+        for child in self.children:
+            child_path = f"{path}/{child.name}" if path else child.name
+            yield child_path, child
+            yield from child.walk(child_path)
+
+    def breakdown(self) -> dict:
+        """Total and per-stage milliseconds, stages keyed by path and summed when repeated."""
+        stages = {}
+        for path, child in self.walk():
+            stages[path] = stages.get(path, 0.0) + child.duration_ms
+        return {
+            "total_ms": round(self.duration_ms, 2),
+            "stages": {path: round(ms, 2) for path, ms in stages.items()}
+        }
+
+
+def current_span():
+    """The active span of this thread or task, or None."""
+    return _current.get()
+
+
+def add_exporter(exporter) -> None:
+    """Registers a callable that receives every finished root span."""
+    if exporter not in _exporters:
+        _exporters.append(exporter)
+
+
+def _export(root: Span) -> None:
+    for exporter in list(_exporters):
+        try:
+            exporter(root)
+        except Exception:
+            # Telemetry must never fail the tool it observes
+            pass
+
+
+@contextmanager
+def _open(name: str, parent, attributes: dict):
+    current = Span(name, parent, attributes)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+        if parent is None:
+            _export(current)
+
+
+def trace(name: str, **attributes):
+    """Times the block as the root span of a new trace, even inside another trace."""
+    return _open(name, None, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Times the block as a stage of the active trace; yields the `Span`, or None outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with _open(name, parent, attributes) as current:
+        yield current
+
+
+def _profile_summary(profiler) -> list:
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    # By own time: cumulative time would rank the tool's own wrappers first
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:PROFILE_TOP]
+    return [{
+        "function": f"{os.path.basename(filename)}:{line}({function})",
+        "calls": calls,
+        "own_ms": round(own * 1000, 2),
+        "cumulative_ms": round(cumulative * 1000, 2)
+    } for (filename, line, function), (_, calls, own, cumulative, _) in hottest]
+
+
+def _memory_summary(before, peak: int) -> dict:
+    import tracemalloc
+    growth = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ]).compare_to(before, 'lineno')
+    return {
+        "peak_kb": round(peak / 1024, 1),
+        "top_growth": [{"where": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                        "kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+                       for stat in growth[:PROFILE_TOP] if stat.size_diff > 0]
+    }
+
+
+@contextmanager
+def _profiled(root: Span):
+    """Profiles the block per TRACE_PROFILE; one profiled call at a time, others run unprofiled."""
+    if not TRACE_PROFILE or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = before = None
+    started_tracemalloc = False
+    try:
+        if 'tracemalloc' in TRACE_PROFILE:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracemalloc = True
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        if 'cprofile' in TRACE_PROFILE:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        # Before the profile summary, whose allocations aren't the tool's
+        if before is not None:
+            import tracemalloc
+            root.set(memory=_memory_summary(before, tracemalloc.get_traced_memory()[1]))
+            if started_tracemalloc:
+                tracemalloc.stop()
+        if profiler is not None:
+            root.set(profile=_profile_summary(profiler))
+        _profile_lock.release()
+
+
+def _with_timings(root: Span, result):
+    if isinstance(result, dict):
+        result = {**result, "timings": root.breakdown()}
+        for key in ('profile', 'memory'):
+            if key in root.attributes:
+                result["timings"][key] = root.attributes[key]
+    return result
+
+
+def traced(tool):
+    """Decorates an agent tool (sync or async) to run in a root span and report its timings."""
+    def finish(root: Span, result):
+        if isinstance(result, dict) and result.get("status") == "error":
+            root.error = result.get("message") or "error"
+        return result
+
+    # The breakdown is taken after the root span ends, so it includes everything
+    if inspect.iscoroutinefunction(tool):
+        @functools.wraps(tool)
+        async def wrapper(*args, **kwargs):
+            with trace(tool.__name__) as root:
+                with _profiled(root):
+                    result = finish(root, await tool(*args, **kwargs))
+            return _with_timings(root, result)
+    else:
+        @functools.wraps(tool)
+        def wrapper(*args, **kwargs):
+            with trace(tool.__name__) as root:
+                with _profiled(root):
+                    result = finish(root, tool(*args, **kwargs))
+            return _with_timings(root, result)
+    return wrapper
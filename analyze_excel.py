@@ -1,62 +1,65 @@
-import pandas as pd
-import openpyxl
+"""Analyze onboarding Excel templates and write one consolidated JSON index.
+
+Each workbook is parsed once (see `xlsx_forms/analyze.py`) and workbooks are
+spread over a process pool:
+
+    python analyze_excel.py [TEMPLATE_OR_DIRECTORY ...] [-o excel_analysis.json] [--workers N]
+
+Without paths the questionnaire template in the project root is analyzed.
+Workbooks are keyed by their path relative to the project root (absolute
+outside it), so the index is the same whichever directory it is run from.
+"""
+import sys
 import json
+import argparse
+from pathlib import Path
+
+from xlsx_forms.analyze import DEFAULT_SAMPLE_ROWS, analyze_templates
 
-# File path
-excel_file = r'C:\Users\banu.parasuraman\Downloads\SailPoint_Onboarding_Application_Questionnaire_v2.xlsx'
+PROJECT_ROOT = Path(__file__).parent
+DEFAULT_TEMPLATE = PROJECT_ROOT / 'SailPoint_Onboarding_Application_Questionnaire_v2.xlsx'
+DEFAULT_OUTPUT = PROJECT_ROOT / 'excel_analysis.json'
 
-# Load the workbook
-wb = openpyxl.load_workbook(excel_file)
 
-print("=" * 80)
-print("EXCEL FILE ANALYSIS: SailPoint Application Onboarding Template")
-print("=" * 80)
+def index_key(path) -> str:
+    """The workbook's path relative to the project root, or its absolute path outside it."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(PROJECT_ROOT.resolve()).as_posix()
+    except ValueError:
+        return str(path)
 
-# Get all sheet names
-sheet_names = wb.sheetnames
-print(f"\nTotal Sheets: {len(sheet_names)}")
-print(f"Sheet Names: {sheet_names}\n")
 
-# Analyze each sheet
-analysis = {}
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='*', default=[str(DEFAULT_TEMPLATE)],
+                        help='Workbooks, or directories searched recursively for .xlsx/.xlsm files')
+    parser.add_argument('-o', '--output', default=str(DEFAULT_OUTPUT), help='Path of the JSON index to write')
+    parser.add_argument('--workers', type=int, default=0, help='Analysis processes (0 uses the CPU count)')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLE_ROWS, help='Sample rows per sheet')
+    args = parser.parse_args(argv)
+
+    index = {index_key(path): result for path, result in
+             analyze_templates(args.paths, max_workers=args.workers or None, sample_rows=args.samples).items()}
 
-for sheet_name in sheet_names:
     print("=" * 80)
-    print(f"SHEET: {sheet_name}")
+    print(f"EXCEL TEMPLATE ANALYSIS: {len(index)} workbook(s)")
     print("=" * 80)
-    
-    # Read with pandas
-    df = pd.read_excel(excel_file, sheet_name=sheet_name)
-    
-    # Basic info
-    print(f"\nDimensions: {df.shape[0]} rows x {df.shape[1]} columns")
-    print(f"\nColumns: {list(df.columns)}")
-    
-    # Show first few rows
-    print(f"\nFirst 5 rows:")
-    print(df.head().to_string())
-    
-    # Check for empty cells
-    empty_cells = df.isnull().sum()
-    if empty_cells.sum() > 0:
-        print(f"\nEmpty/Missing cells per column:")
-        print(empty_cells[empty_cells > 0])
-    
-    # Store analysis
-    analysis[sheet_name] = {
-        'dimensions': df.shape,
-        'columns': list(df.columns),
-        'sample_data': df.head(3).to_dict('records'),
-        'empty_cells': empty_cells.to_dict()
-    }
-    
-    print("\n")
-
-# Save analysis to JSON
-output_file = r'C:\Users\banu.parasuraman\Downloads\agentic-cyber\excel_analysis.json'
-with open(output_file, 'w') as f:
-    json.dump(analysis, f, indent=2, default=str)
-
-print("=" * 80)
-print(f"Analysis saved to: {output_file}")
-print("=" * 80)
+    for path, result in index.items():
+        if result["status"] == "error":
+            print(f"\n{path}: {result['message']}")
+            continue
+        print(f"\n{path} ({len(result['sheets'])} sheets, {result['parse_ms']} ms)")
+        for sheet_name, sheet in result["sheets"].items():
+            rows, columns = sheet["dimensions"]
+            empty = sum(sheet["empty_cells"].values())
+            print(f"  {sheet_name}: {rows} rows x {columns} columns, {empty} empty cells")
+
+    with open(args.output, 'w') as f:
+        json.dump(index, f, indent=2, default=str)
+    print(f"\nAnalysis saved to: {args.output}")
+    return 1 if any(result["status"] == "error" for result in index.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
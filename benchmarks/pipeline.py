@@ -0,0 +1,228 @@
+"""Wall time, peak RSS and bytes transferred per stage of the agent pipeline.
+
+Serves seeded synthetic users (see `synthetic.py`) from the in-process MCP
+stand-in (see `standin.py`) and runs each stage the agents run against it in
+a fresh process, so peak RSS is the stage's own and no cache of an earlier
+stage is warm:
+
+    python benchmarks/pipeline.py --users 1000,100000 [--stages fill_form,read_form]
+        [--json results.json] [--compare baseline.json --threshold 0.2]
+
+With --compare, a stage whose wall time, peak RSS or bytes sent grew by more
+than the threshold over the baseline run is reported and the exit status is 1.
+Snapshot stages run against a temporary snapshot directory, every other stage
+with snapshots disabled. onboarding_form is skipped when `google.adk` is not
+installed.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import subprocess
+import multiprocessing
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+
+TEMPLATE = PROJECT_ROOT / 'SailPoint_Onboarding_Application_Questionnaire_v2.xlsx'
+MAPPING = PROJECT_ROOT / 'excel-form-filler-agent' / 'sailpoint_field_mapping.json'
+
+STAGES = ['mcp_summary', 'snapshot_sync_cold', 'snapshot_sync_warm', 'user_store', 'schema_profile',
+          'entitlement_analytics', 'onboarding_form', 'fill_form', 'read_form']
+SNAPSHOT_STAGES = {'snapshot_sync_cold', 'snapshot_sync_warm'}
+# Metrics compared against a baseline, and the smallest change worth reporting for each
+COMPARED_METRICS = {'wall_ms': 5.0, 'peak_rss_mb': 2.0, 'bytes_sent': 1024}
+DEFAULT_THRESHOLD = 0.2
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _fill_form_data(client) -> dict:
+    # Same data the form filler agent fills the form with
+    from sailpoint_mcp import analyze_user_store, fetch_user_data
+    data = fetch_user_data(client, include_users=False)
+    return {**data, "analytics": analyze_user_store(client)}
+
+
+def _stage(name: str, query_url: str, work_dir: Path):
+    """Returns (setup, run) for the stage; only `run` is timed."""
+    from sailpoint_mcp import (analyze_user_store, fetch_user_data, get_client, get_user_store,
+                               profile_user_schema, sync_snapshot)
+    client = get_client(query_url)
+    output_path = work_dir / 'filled.xlsx'
+
+    if name == 'mcp_summary':
+        return None, lambda: fetch_user_data(client, include_users=False)
+    if name in SNAPSHOT_STAGES:
+        return None, lambda: sync_snapshot(client).last_sync
+    if name == 'user_store':
+        return None, lambda: len(get_user_store(client))
+    if name == 'schema_profile':
+        return None, lambda: profile_user_schema(client)
+    if name == 'entitlement_analytics':
+        return None, lambda: analyze_user_store(client)
+    if name == 'onboarding_form':
+        import importlib.util
+        spec = importlib.util.spec_from_file_location('onboarding_agent', PROJECT_ROOT / 'python-adk-agent' / 'agent.py')
+        agent = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(agent)
+        return None, agent.generate_sailpoint_onboarding_form
+
+    from xlsx_forms import fill_form, get_plan, read_form
+    if name == 'fill_form':
+        return None, lambda: fill_form(_fill_form_data(client), TEMPLATE, output_path, MAPPING)
+    if name == 'read_form':
+        def setup():
+            fill_form(_fill_form_data(client), TEMPLATE, output_path, MAPPING)
+        return setup, lambda: read_form(output_path, get_plan(TEMPLATE, MAPPING))
+    raise ValueError(f"Unknown stage: {name}")
+
+
+def run_stage(name: str, query_url: str, env: dict, work_dir: str) -> dict:
+    """Runs one stage in this (fresh) process and measures it."""
+    os.environ.update(env)
+    if name == 'onboarding_form':
+        try:
+            import google.adk  # noqa: F401
+        except ImportError:
+            return {"status": "skipped", "message": "google.adk is not installed"}
+
+    setup, run = _stage(name, query_url, Path(work_dir))
+    if setup is not None:
+        setup()
+    baseline_rss = _rss_mb()
+    start = time.perf_counter()
+    result = run()
+    wall_ms = (time.perf_counter() - start) * 1000
+    status = result.get("status", "success") if isinstance(result, dict) else "success"
+    return {
+        "status": status,
+        "wall_ms": round(wall_ms, 1),
+        "peak_rss_mb": _rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+        **({"message": result.get("message")} if status == "error" else {})
+    }
+
+
+def run(user_counts: list, stages: list, roles: int = 50, extra_attributes: int = 0, seed: int = 7) -> list:
+    """Runs every stage for every user count; returns one result dict per (user count, stage)."""
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for count in user_counts:
+        users = synthetic_users(count, roles, extra_attributes, seed)
+        with MCPStandIn(users) as server, tempfile.TemporaryDirectory(prefix='mcp-bench-') as work_dir:
+            for stage in stages:
+                env = {
+                    'MCP_QUERY_URL': server.query_url,
+                    'MCP_SNAPSHOT_DIR': str(Path(work_dir) / 'snapshots') if stage in SNAPSHOT_STAGES else '',
+                    'XLSX_FIELD_INDEX_DIR': str(Path(work_dir) / 'field_indexes')
+                }
+                before = server.stats()
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    measured = pool.submit(run_stage, stage, server.query_url, env, work_dir).result()
+                after = server.stats()
+                if stage == 'read_form':
+                    # Only its untimed setup (filling the form to read) used the network
+                    before = after
+                results.append({
+                    "users": count,
+                    "stage": stage,
+                    **measured,
+                    "bytes_sent": after["bytes_sent"] - before["bytes_sent"],
+                    "requests": after["requests"] - before["requests"]
+                })
+    return results
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """Returns a message per stage metric that grew by more than `threshold` over the baseline."""
+    previous = {(r["users"], r["stage"]): r for r in baseline if r.get("status") == "success"}
+    regressions = []
+    for result in results:
+        old = previous.get((result["users"], result["stage"]))
+        if old is None or result.get("status") != "success":
+            continue
+        for metric, minimum in COMPARED_METRICS.items():
+            new_value, old_value = result.get(metric), old.get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if new_value - old_value > max(old_value * threshold, minimum):
+                regressions.append(f"{result['stage']} ({result['users']} users): {metric} "
+                                   f"{old_value} -> {new_value}")
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', default='1000,100000', help='Comma-separated user counts')
+    parser.add_argument('--roles', type=int, default=50)
+    parser.add_argument('--extra-attributes', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma-separated stages, run in this order')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('--compare', help='Results JSON of a baseline run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative growth over the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    user_counts = [int(count) for count in args.users.split(',')]
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if 'snapshot_sync_warm' in stages and 'snapshot_sync_cold' not in stages[:stages.index('snapshot_sync_warm')]:
+        parser.error('snapshot_sync_warm needs snapshot_sync_cold before it')
+
+    results = run(user_counts, stages, args.roles, args.extra_attributes, args.seed)
+
+    print(f"{'users':>8}  {'stage':<24}{'status':<9}{'wall ms':>10}{'peak MB':>9}{'sent MB':>9}{'requests':>10}")
+    for r in results:
+        print(f"{r['users']:>8}  {r['stage']:<24}{r['status']:<9}{r.get('wall_ms', 0):>10.1f}"
+              f"{r.get('peak_rss_mb', 0):>9.1f}{r['bytes_sent'] / 1e6:>9.2f}{r['requests']:>10}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "commit": _commit(),
+                "config": {"users": user_counts, "roles": args.roles, "extra_attributes": args.extra_attributes,
+                           "seed": args.seed, "stages": stages},
+                "results": results
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""In-process stand-in for the MCP server's `/mcp/query` protocol.
+
+Serves a list of user documents over HTTP on localhost, so the client, the
+agent tools and the benchmarks run end to end without MongoDB, GKE or the
+deployed server address. Every query of `mcp-server/index.js` is answered
+with the same body shapes and semantics:
+
+- get_user_data, get_user_page, stream_user_data (with fields, filter, limit)
+- stream_user_changes, stream_user_sample, stream_user_ids, get_sync_state
+- get_user_count, get_role_counts, get_attribute_keys, get_user_summary
+
+Bodies are JSON, or MessagePack when the client prefers it and `msgpack` is
+installed. Bodies of MIN_COMPRESS_BYTES or more and all streams are gzipped
+when accepted. Plain bodies carry an ETag and honour If-None-Match. Response
+bytes and requests are counted per query name for the benchmarks.
+
+    with MCPStandIn(users) as server:
+        client = MCPClient(server.query_url)
+"""
+import json
+import zlib
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+DEFAULT_SAMPLE_SIZE = 3
+MAX_SAMPLE_SIZE = 100
+MAX_PROFILE_SAMPLE_SIZE = 100000
+MIN_COMPRESS_BYTES = 1024
+MSGPACK_TYPE = 'application/x-msgpack'
+# Documents encoded per write of a streamed response
+STREAM_BATCH = 1000
+
+FILTER_OPERATORS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand
+}
+
+
+class QueryError(ValueError):
+    """Raised for a malformed query; answered with 400 like the real server."""
+
+
+def _matches(user: dict, filter: dict) -> bool:
+    for field, condition in filter.items():
+        value = user.get(field)
+        # Like MongoDB, a condition on an array attribute matches any of its elements
+        values = value if isinstance(value, list) else [value]
+        if not isinstance(condition, dict):
+            if condition not in values:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == '$exists':
+                if (field in user) != operand:
+                    return False
+            elif operator in ('$ne', '$nin'):
+                if not all(FILTER_OPERATORS[operator](item, operand) for item in values):
+                    return False
+            elif not any(FILTER_OPERATORS[operator](item, operand) for item in values):
+                return False
+    return True
+
+
+def _parse_filter(filter) -> dict:
+    if filter is None:
+        return {}
+    if not isinstance(filter, dict):
+        raise QueryError('filter must be an object')
+    for field, condition in filter.items():
+        if isinstance(condition, dict) and not set(condition) <= set(FILTER_OPERATORS) | {'$exists'}:
+            raise QueryError(f"Unsupported filter operator in {field}")
+    return filter
+
+
+def _project(user: dict, fields) -> dict:
+    if fields is None:
+        return user
+    return {field: user[field] for field in fields if field in user}
+
+
+def _limit(value) -> int:
+    if value is None:
+        return 0
+    if not isinstance(value, int) or value <= 0:
+        raise QueryError('limit must be a positive integer')
+    return value
+
+
+def _page_size(value) -> int:
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return min(size, MAX_PAGE_SIZE) if size > 0 else DEFAULT_PAGE_SIZE
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY each small response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    server: '_Server'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != '/mcp/query':
+            return self._send_json(404, {"error": "Not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            return self._send_json(400, {"error": "Invalid JSON body"})
+        query = body.get('query')
+        handler = getattr(self.server.standin, f"_query_{query}", None) if isinstance(query, str) else None
+        if handler is None:
+            return self._send_json(400, {"error": "Unknown query"}, query)
+        try:
+            handler(self, body)
+        except QueryError as e:
+            self._send_json(400, {"error": str(e)}, query)
+
+    # Response writing
+
+    def _msgpack(self) -> bool:
+        return msgpack is not None and MSGPACK_TYPE in self.headers.get('Accept', '') \
+            and 'application/json' not in self.headers.get('Accept', '').split(MSGPACK_TYPE)[0]
+
+    def _gzip(self) -> bool:
+        return any(part.split(';')[0].strip() == 'gzip' and 'q=0' not in part.replace(' ', '')
+                   for part in self.headers.get('Accept-Encoding', '').split(','))
+
+    def _send_json(self, status: int, body, query: str = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        # Counted before the client can read the response, so stats() read after a call include it
+        self.server.standin._count(query, len(payload))
+        self.wfile.write(payload)
+
+    def send_body(self, query: str, body) -> None:
+        packed = self._msgpack()
+        payload = msgpack.packb(body) if packed else json.dumps(body).encode()
+        coding = 'gzip' if len(payload) >= MIN_COMPRESS_BYTES and self._gzip() else None
+        etag = f'"{hashlib.sha1(payload).hexdigest()}{"-msgpack" if packed else ""}{"-gzip" if coding else ""}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.server.standin._count(query, 0)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if coding:
+            payload = zlib.compress(payload, 4, wbits=31)
+        self.send_response(200)
+        self.send_header('Content-Type', MSGPACK_TYPE if packed else 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        if coding:
+            self.send_header('Content-Encoding', coding)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.server.standin._count(query, len(payload))
+        self.wfile.write(payload)
+
+    def send_stream(self, query: str, users) -> None:
+        """Streams documents as NDJSON or concatenated MessagePack with chunked transfer encoding."""
+        packed = self._msgpack()
+        compressor = zlib.compressobj(4, wbits=31) if self._gzip() else None
+        self.send_response(200)
+        self.send_header('Content-Type', MSGPACK_TYPE if packed else 'application/x-ndjson')
+        if compressor:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        sent = 0
+        batch = []
+
+        def flush(final: bool = False):
+            nonlocal sent
+            data = b''.join(batch)
+            batch.clear()
+            if compressor:
+                data = compressor.compress(data) + (compressor.flush() if final else b'')
+            if data:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                sent += len(data)
+
+        for user in users:
+            batch.append(msgpack.packb(user) if packed else json.dumps(user).encode() + b'\n')
+            if len(batch) >= STREAM_BATCH:
+                flush()
+        flush(final=True)
+        # Before the last chunk, which ends the response for the client
+        self.server.standin._count(query, sent)
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    standin: 'MCPStandIn'
+
+
+class MCPStandIn:
+    """
+    Serves `users` (dicts with string `_id`s in ascending order) on
+    127.0.0.1 in a background thread. Use as a context manager, or call
+    `start` and `stop`.
+    """
+
+    def __init__(self, users: list, port: int = 0):
+        self.users = users
+        self._port = port
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._bytes = Counter()
+        self._requests = Counter()
+
+    def __enter__(self) -> 'MCPStandIn':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> 'MCPStandIn':
+        self._server = _Server(('127.0.0.1', self._port), _Handler)
+        self._server.standin = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mcp-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def query_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/mcp/query"
+
+    def _count(self, query: str, size: int) -> None:
+        with self._lock:
+            self._bytes[query] += size
+            self._requests[query] += 1
+
+    def stats(self) -> dict:
+        """Response body bytes and requests so far: totals and per query name."""
+        with self._lock:
+            return {
+                "bytes_sent": sum(self._bytes.values()),
+                "requests": sum(self._requests.values()),
+                "queries": {query: {"bytes": self._bytes[query], "requests": count}
+                            for query, count in self._requests.items()}
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._bytes.clear()
+            self._requests.clear()
+
+    # Queries, named after the MCP server's
+
+    def _select(self, body: dict, fields=None):
+        filter = _parse_filter(body.get('filter'))
+        limit = _limit(body.get('limit'))
+        fields = body.get('fields') if fields is None else fields
+        if fields is not None and (not isinstance(fields, list) or not fields):
+            raise QueryError('fields must be a list of attribute names')
+        selected = (user for user in self.users if not filter or _matches(user, filter))
+        if limit:
+            selected = (user for _, user in zip(range(limit), selected))
+        return (_project(user, fields) for user in selected)
+
+    def _query_get_user_data(self, request, body):
+        request.send_body('get_user_data', list(self._select(body)))
+
+    def _query_get_user_page(self, request, body):
+        limit = _page_size(body.get('limit'))
+        filter = _parse_filter(body.get('filter'))
+        fields = body.get('fields')
+        cursor = body.get('cursor')
+        page = []
+        for user in self.users:
+            if cursor and user['_id'] <= cursor:
+                continue
+            if filter and not _matches(user, filter):
+                continue
+            page.append(_project(user, fields + ['_id'] if fields else None))
+            if len(page) == limit:
+                break
+        request.send_body('get_user_page', {
+            "users": page,
+            "next_cursor": page[-1]['_id'] if len(page) == limit else None
+        })
+
+    def _query_stream_user_data(self, request, body):
+        request.send_stream('stream_user_data', self._select(body))
+
+    def _query_stream_user_changes(self, request, body):
+        ids = body.get('ids')
+        if ids is not None:
+            wanted = set(ids)
+            changed = (user for user in self.users if user['_id'] in wanted)
+        else:
+            after_id, since = body.get('after_id'), body.get('since')
+            changed = (user for user in self.users
+                       if (after_id is None and since is None)
+                       or (after_id is not None and user['_id'] > after_id)
+                       or (since is not None and user.get('updatedAt', '') >= since))
+        request.send_stream('stream_user_changes', changed)
+
+    def _query_stream_user_sample(self, request, body):
+        size = body.get('size')
+        if not isinstance(size, int) or size <= 0:
+            raise QueryError('size must be a positive integer')
+        request.send_stream('stream_user_sample',
+                            random.sample(self.users, min(size, MAX_PROFILE_SAMPLE_SIZE, len(self.users))))
+
+    def _query_stream_user_ids(self, request, body):
+        request.send_stream('stream_user_ids', ({"_id": user['_id']} for user in self.users))
+
+    def _query_get_sync_state(self, request, body):
+        request.send_body('get_sync_state', {"count": len(self.users)})
+
+    def _query_get_user_count(self, request, body):
+        filter = _parse_filter(body.get('filter'))
+        count = sum(1 for user in self.users if _matches(user, filter)) if filter else len(self.users)
+        request.send_body('get_user_count', {"count": count})
+
+    def _role_counts(self) -> list:
+        counts = Counter()
+        for user in self.users:
+            roles = user.get('roles')
+            counts.update(set(roles) if isinstance(roles, list) else [roles] if roles is not None else [])
+        return [{"count": count, "role": role}
+                for role, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+
+    def _attribute_keys(self) -> list:
+        keys = set()
+        for user in self.users:
+            keys.update(user)
+        return sorted(keys)
+
+    def _query_get_role_counts(self, request, body):
+        request.send_body('get_role_counts', {"roles": self._role_counts()})
+
+    def _query_get_attribute_keys(self, request, body):
+        request.send_body('get_attribute_keys', {"attributes": self._attribute_keys()})
+
+    def _query_get_user_summary(self, request, body):
+        try:
+            sample_size = min(int(body.get('sample_size')) or DEFAULT_SAMPLE_SIZE, MAX_SAMPLE_SIZE)
+        except (TypeError, ValueError):
+            sample_size = DEFAULT_SAMPLE_SIZE
+        request.send_body('get_user_summary', {
+            "count": len(self.users),
+            "roles": self._role_counts(),
+            "attributes": self._attribute_keys(),
+            "sample": self.users[:sample_size]
+        })
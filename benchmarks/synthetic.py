@@ -0,0 +1,63 @@
+"""Seeded synthetic user directories shaped like the `users` collection.
+
+The same seed always yields the same users, so benchmark runs on different
+versions measure the same data. Role popularity follows a Zipf-like
+distribution (a few roles with most users, a long tail of small ones), which
+is what real entitlement catalogs look like and what the role indexes and
+co-occurrence analytics are sensitive to.
+"""
+import random
+import itertools
+
+STATUSES = ['active', 'active', 'active', 'inactive', 'locked']
+FIRST_NAMES = ['Ana', 'Ben', 'Chen', 'Dara', 'Eli', 'Fatima', 'Goran', 'Hana', 'Ivan', 'Jia']
+LAST_NAMES = ['Ito', 'Khan', 'Lopez', 'Smith', 'Novak', 'Okafor', 'Petrov', 'Quinn', 'Rossi', 'Silva']
+DEPARTMENTS = ['Engineering', 'Finance', 'HR', 'IT', 'Legal', 'Marketing', 'Operations', 'Sales']
+
+
+def role_names(count: int) -> list:
+    """`count` role names; the first ones include the roles named by the default SoD rules."""
+    base = ['admin', 'user', 'auditor', 'approver', 'payments', 'developer', 'deployer', 'viewer']
+    return base[:count] + [f"role_{i}" for i in range(len(base), count)]
+
+
+def iter_synthetic_users(count: int, roles: int = 50, extra_attributes: int = 0, seed: int = 7,
+                         max_roles_per_user: int = 4):
+    """
+    Yields `count` user documents in `_id` order.
+
+    Args:
+        count: Number of users
+        roles: Size of the role catalog
+        extra_attributes: Additional string attributes (attr0, attr1, ...) per user
+        seed: Random seed; equal arguments always yield equal users
+        max_roles_per_user: Upper bound of the 1..n roles assigned to each user
+    """
+    rng = random.Random(seed)
+    names = role_names(roles)
+    # Zipf-like popularity: role k is picked with weight 1 / (k + 1)
+    cumulative = list(itertools.accumulate(1 / (k + 1) for k in range(len(names))))
+    for i in range(count):
+        assigned = set()
+        wanted = rng.randint(1, min(max_roles_per_user, len(names)))
+        while len(assigned) < wanted:
+            assigned.add(rng.choices(names, cum_weights=cumulative)[0])
+        user = {
+            "_id": f"{i + 1:024x}",
+            "userId": f"user{i:07d}",
+            "firstName": rng.choice(FIRST_NAMES),
+            "lastName": rng.choice(LAST_NAMES),
+            "email": f"user{i:07d}@example.com",
+            "department": rng.choice(DEPARTMENTS),
+            "status": rng.choice(STATUSES),
+            "roles": sorted(assigned),
+            "updatedAt": f"2026-01-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00.000Z"
+        }
+        for n in range(extra_attributes):
+            user[f"attr{n}"] = f"value-{rng.randint(0, 999)}"
+        yield user
+
+
+def synthetic_users(count: int, roles: int = 50, extra_attributes: int = 0, seed: int = 7) -> list:
+    """`iter_synthetic_users` as a list."""
+    return list(iter_synthetic_users(count, roles, extra_attributes, seed))
@@ -0,0 +1,141 @@
+"""Transfer size and client decode cost of the MCP user stream per encoding.
+
+Encodes synthetic user documents the way the MCP server streams them (NDJSON
+or concatenated MessagePack, optionally compressed) and decodes them the way
+`MCPClient.stream` does. Reports bytes on the wire and decode time per
+combination relative to plain NDJSON.
+
+    python benchmarks/transport.py --users 200000 --extra-attributes 10 [--json results.json]
+
+MessagePack, brotli and zstd rows are skipped when `msgpack`, `brotli` or
+`zstandard` is not installed.
+"""
+import sys
+import json
+import time
+import zlib
+import argparse
+from pathlib import Path
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.synthetic import synthetic_users
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _encoders() -> dict:
+    encoders = {'ndjson': lambda users: b''.join(json.dumps(user).encode() + b'\n' for user in users)}
+    if msgpack is not None:
+        encoders['msgpack'] = lambda users: b''.join(msgpack.packb(user) for user in users)
+    return encoders
+
+
+def _codings() -> dict:
+    # Levels match the MCP server's (gzip 4, brotli quality 4, zstd 3)
+    codings = {
+        'identity': (lambda data: data, lambda data: data),
+        'gzip': (lambda data: zlib.compress(data, 4, wbits=31), lambda data: zlib.decompress(data, wbits=31))
+    }
+    if brotli is not None:
+        codings['br'] = (lambda data: brotli.compress(data, quality=4), brotli.decompress)
+    if zstandard is not None:
+        codings['zstd'] = (lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                           lambda data: zstandard.ZstdDecompressor().decompress(data))
+    return codings
+
+
+def _decode(representation: str, data: bytes) -> int:
+    """Decodes chunk by chunk like `MCPClient.stream`; returns the number of documents."""
+    count = 0
+    if representation == 'msgpack':
+        unpacker = msgpack.Unpacker()
+        for start in range(0, len(data), CHUNK_SIZE):
+            unpacker.feed(data[start:start + CHUNK_SIZE])
+            for _ in unpacker:
+                count += 1
+        return count
+    pending = b''
+    for start in range(0, len(data), CHUNK_SIZE):
+        lines = (pending + data[start:start + CHUNK_SIZE]).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if line:
+                json.loads(line)
+                count += 1
+    if pending.strip():
+        json.loads(pending)
+        count += 1
+    return count
+
+
+def run(users: list, repeat: int = 3) -> list:
+    results = []
+    for representation, encode in _encoders().items():
+        raw = encode(users)
+        for coding, (compress, decompress) in _codings().items():
+            start = time.perf_counter()
+            wire = compress(raw)
+            encode_ms = (time.perf_counter() - start) * 1000
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                decoded = _decode(representation, decompress(wire))
+                timings.append((time.perf_counter() - start) * 1000)
+                if decoded != len(users):
+                    raise RuntimeError(f"{representation}+{coding} decoded {decoded} of {len(users)} users")
+            results.append({
+                "representation": representation,
+                "coding": coding,
+                "wire_bytes": len(wire),
+                "compress_ms": round(encode_ms, 1),
+                "decode_ms": round(min(timings), 1)
+            })
+
+    baseline = next(r for r in results if r['representation'] == 'ndjson' and r['coding'] == 'identity')
+    for result in results:
+        result["size_ratio"] = round(result["wire_bytes"] / baseline["wire_bytes"], 3)
+        result["decode_speedup"] = round(baseline["decode_ms"] / result["decode_ms"], 2) if result["decode_ms"] else None
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--roles', type=int, default=50)
+    parser.add_argument('--extra-attributes', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    users = synthetic_users(args.users, args.roles, args.extra_attributes)
+    results = run(users, args.repeat)
+
+    print(f"{'encoding':<20}{'wire MB':>10}{'size':>8}{'compress ms':>13}{'decode ms':>11}{'speedup':>9}")
+    for r in results:
+        # None when the decode was too fast to time
+        speedup = f"{r['decode_speedup']:>9.2f}" if r['decode_speedup'] is not None else f"{'-':>9}"
+        print(f"{r['representation'] + '+' + r['coding']:<20}{r['wire_bytes'] / 1e6:>10.2f}{r['size_ratio']:>8.3f}"
+              f"{r['compress_ms']:>13.1f}{r['decode_ms']:>11.1f}{speedup}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"users": args.users, "extra_attributes": args.extra_attributes, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,88 +1,75 @@
+import os
+import sys
 import json
-import requests
-import openpyxl
 from openpyxl.utils import get_column_letter
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 from google.adk.agents.llm_agent import Agent
 
-MCP_QUERY_URL = 'http://34.9.116.130:3000/mcp/query'
-
-def safe_set_cell(ws, cell_ref, value):
-    """Safely set cell value, handling merged cells."""
-    try:
-        cell = ws[cell_ref]
-        # For merged cells, openpyxl only allows writing to the top-left cell
-        # Check if this cell is part of a merged range
-        for merged_range in ws.merged_cells.ranges:
-            if cell.coordinate in merged_range:
-                # Get the top-left cell of the merged range
-                top_left_cell = ws.cell(merged_range.min_row, merged_range.min_col)
-                top_left_cell.value = value
-                return
-        # Not a merged cell, set directly
-        cell.value = value
-    except Exception as e:
-        # If there's any issue, try to set the value directly
-        try:
-            ws[cell_ref].value = value
-        except:
-            pass  # Skip if unable to write
-
 # Get the project root directory (parent of excel-form-filler-agent)
 PROJECT_ROOT = Path(__file__).parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from agent_tracing import span, start_metrics_server, traced
+from sailpoint_mcp import IntentRouter, Route, budgeted, fetch_form_data, fetch_user_data, get_client, result_page
+from sailpoint_mcp.router import FILL_FORM, RAW_DATA, READ_FORM
+from xlsx_forms import fill_form, fill_forms, get_plan, read_form
+
+MCP_QUERY_URL = os.environ.get('MCP_QUERY_URL', 'http://34.9.116.130:3000/mcp/query')
+
+# Prometheus metrics of the tool calls, when TOOL_METRICS_PORT is set
+start_metrics_server()
+
 DEFAULT_TEMPLATE = str(PROJECT_ROOT / 'SailPoint_Onboarding_Application_Questionnaire_v2.xlsx')
+DEFAULT_MAPPING = str(Path(__file__).parent / 'sailpoint_field_mapping.json')
 
-def get_sailpoint_data_from_mcp() -> dict:
-    """Fetches SailPoint onboarding data from the MCP server."""
-    try:
-        response = requests.post(MCP_QUERY_URL, json={'query': 'get_user_data'})
-        response.raise_for_status()
-        
-        users = response.json()
-        
-        # Extract schema information
-        if users:
-            schema = {
-                'identityAttribute': 'userId',
-                'displayAttribute': 'email',
-                'attributes': list(users[0].keys())
-            }
-            
-            # Extract unique roles
-            all_roles = [role for user in users for role in user.get('roles', [])]
-            entitlements = list(set(all_roles))
-            
-            return {
-                "status": "success",
-                "user_count": len(users),
-                "users": users,
-                "schema": schema,
-                "entitlements": entitlements
-            }
-        else:
-            return {
-                "status": "success",
-                "user_count": 0,
-                "users": [],
-                "schema": {},
-                "entitlements": []
-            }
-    
-    except requests.exceptions.RequestException as e:
-        return {
-            "status": "error",
-            "message": f"Failed to fetch user data: {str(e)}"
-        }
+def _default_output_path(prefix: str = "SailPoint_Onboarding_Filled") -> Path:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Path(__file__).parent / f"{prefix}_{timestamp}.xlsx"
+
+def get_sailpoint_data_from_mcp(include_users: bool = False) -> dict:
+    """
+    Fetches a summary of the SailPoint onboarding data from the MCP server: user count,
+    schema, roles with member counts and a few sample users.
+
+    With include_users, the users are returned too, as many as fit the result size
+    budget; the rest can be paged through with 'get_result_page'.
+
+    Args:
+        include_users: Whether to return user documents in addition to the summary
+    """
+    return fetch_user_data(get_client(MCP_QUERY_URL), include_users=include_users)
+
+def get_result_page(handle: str, offset: int = 0, limit: int = 0) -> dict:
+    """
+    Returns more items of a list that was cut from an earlier tool result. Cut lists are
+    reported in the result's 'truncated' entry with their total, a handle and next_offset.
+
+    Args:
+        handle: The handle from the 'truncated' entry
+        offset: Index of the first item to return (next_offset from the previous page)
+        limit: Maximum number of items to return (0 returns as many as fit)
+    """
+    return result_page(handle, offset=offset, limit=limit or None)
 
-def fill_excel_form(template_path: Optional[str] = None, output_path: Optional[str] = None) -> dict:
+def _fetch_form_data(query_url: str) -> dict:
+    """Returns the summary the form needs plus entitlement analytics (SoD, role counts per user)."""
+    return fetch_form_data(get_client(query_url))
+
+def fill_excel_form(template_path: Optional[str] = None, output_path: Optional[str] = None,
+                    mapping_path: Optional[str] = None) -> dict:
     """
     Fills the SailPoint onboarding Excel form with data from MCP server.
     
+    Which value goes into which cell is defined by a field mapping file, compiled
+    once per template into a write plan.
+    
     Args:
         template_path: Path to the Excel template file (optional, uses default if not provided)
         output_path: Path where the filled Excel file should be saved
+        mapping_path: Path to the field mapping file (optional, uses default if not provided)
     
     Returns:
         Dictionary with status and details of the operation
@@ -102,181 +89,31 @@ def fill_excel_form(template_path: Optional[str] = None, output_path: Optional[s
                 "message": f"Template file not found: {template_path}"
             }
         
-        # Get data from MCP server
-        data = get_sailpoint_data_from_mcp()
+        # Get the summary and entitlement analytics from the MCP server
+        with span('fetch_form_data'):
+            data = _fetch_form_data(MCP_QUERY_URL)
         
         if data["status"] == "error":
             return data
         
-        # Load the Excel template
-        wb = openpyxl.load_workbook(str(template_path))
-        
-        # Fill Application General Information sheet
-        if 'Application General Information' in wb.sheetnames:
-            ws = wb['Application General Information']
-            
-            # Application Name
-            safe_set_cell(ws, 'C12', "MongoDB Authorization App")
-            
-            # Application Description  
-            safe_set_cell(ws, 'C19', "MongoDB-based application managing user authorization, roles, and permissions for internal systems.")
-            
-            # Submitted By
-            safe_set_cell(ws, 'D21', "Automated Agent")
-            
-            # Business Owner
-            safe_set_cell(ws, 'C25', "IT Security Team")
-            
-            # Technical Owner
-            safe_set_cell(ws, 'C26', "Database Administrator")
-            
-            # Lead Technical Contact
-            safe_set_cell(ws, 'C27', "MongoDB Team")
-            
-            # Internally developed or procured
-            safe_set_cell(ws, 'C29', "Internally Developed")
-            
-            # Environments
-            safe_set_cell(ws, 'C30', "DEV, UAT, PROD")
-            
-            # Domain
-            safe_set_cell(ws, 'C31', "CWS")
-            
-            # Business Objectives
-            safe_set_cell(ws, 'C32', "Centralized user access management and role-based authorization")
-            
-            # SOW Required
-            safe_set_cell(ws, 'C33', "No")
-            
-            # Total active users
-            safe_set_cell(ws, 'C34', str(data.get('user_count', 0)))
-            
-            # Uses Entra/AD
-            safe_set_cell(ws, 'C35', "No - uses MongoDB for authentication")
-            
-            # Current provisioning process
-            safe_set_cell(ws, 'C36', "Manual - Database updates")
-            
-            # Account creation process
-            safe_set_cell(ws, 'C37', "Direct MongoDB document insertion with role assignment")
-            
-            # Account types
-            safe_set_cell(ws, 'C38', "Employee, Contractor")
-            
-            # Total roles
-            safe_set_cell(ws, 'C39', f"{len(data.get('entitlements', []))} roles: {', '.join(data.get('entitlements', []))}")
-            
-            # Multiple roles
-            safe_set_cell(ws, 'C40', "Yes")
-            
-            # Elevated privileges
-            safe_set_cell(ws, 'C41', "Admin role provides elevated access to system configuration")
-            
-            # RBAC
-            safe_set_cell(ws, 'C42', "Yes - role-based access controls implemented")
-            
-            # Super admin
-            safe_set_cell(ws, 'C43', "Yes - 'admin' role has full system access")
-            
-            # SOD Policies
-            safe_set_cell(ws, 'C44', "Yes - admin and user roles have separation")
-        
-        # Fill Application On-boarding Form sheet
-        if 'Application On-boarding Form' in wb.sheetnames:
-            ws = wb['Application On-boarding Form']
-            
-            # Case sensitive
-            safe_set_cell(ws, 'C13', "Yes")
-            
-            # Authorized to change
-            safe_set_cell(ws, 'C14', "Database Administrator")
-            
-            # Disabled accounts
-            safe_set_cell(ws, 'C15', "Yes - status='inactive'")
-            
-            # Dormant accounts
-            safe_set_cell(ws, 'C16', "Yes - via status field")
-            
-            # Service accounts
-            safe_set_cell(ws, 'C17', "Yes - MongoDB connection credentials")
-            
-            # Password rotation
-            safe_set_cell(ws, 'C18', "Quarterly")
-            
-            # Business Owner
-            safe_set_cell(ws, 'C20', "IT Security Team")
-            
-            # Attribute Name
-            safe_set_cell(ws, 'C21', "userId, firstName, lastName, email, status, roles")
-        
-        # Fill Environment sheet
-        if 'Environment' in wb.sheetnames:
-            ws = wb['Environment']
-            
-            # Production Details
-            safe_set_cell(ws, 'G13', "34.172.211.78")  # Hostname
-            safe_set_cell(ws, 'G14', "27017")  # Port
-            safe_set_cell(ws, 'G15', "app_auth")  # Database Name
-            safe_set_cell(ws, 'G16', "sailpoint_readonly")  # Username (placeholder)
-            safe_set_cell(ws, 'G17', "[Stored in Secrets Manager]")  # Password
-            safe_set_cell(ws, 'G18', "mongodb://34.172.211.78:27017/app_auth")  # JDBC/Connection URL
-            
-            # API Details
-            safe_set_cell(ws, 'G23', "http://34.9.116.130:3000")  # Base URL (MCP Server)
-        
-        # Fill Process type sheet
-        if 'Process type ' in wb.sheetnames:
-            ws = wb['Process type ']
-            
-            # Create account
-            safe_set_cell(ws, 'B3', "Yes")
-            safe_set_cell(ws, 'C3', "Create user document in MongoDB with required attributes and roles")
-            
-            # Modify account
-            safe_set_cell(ws, 'B4', "Yes")
-            safe_set_cell(ws, 'C4', "Update user document fields including roles array")
-            
-            # Disable account
-            safe_set_cell(ws, 'B5', "Yes")
-            safe_set_cell(ws, 'C5', "Set status field to 'inactive'")
-            
-            # Delete account
-            safe_set_cell(ws, 'B6', "Yes")
-            safe_set_cell(ws, 'C6', "Remove user document from collection")
-            
-            # Required attributes
-            safe_set_cell(ws, 'B7', "userId, firstName, lastName, email, status, roles[]")
-        
-        # Fill Roles sheet
-        if 'Roles' in wb.sheetnames:
-            ws = wb['Roles']
-            
-            # Fill production roles
-            roles_data = data.get('entitlements', [])
-            start_row = 2
-            for idx, role in enumerate(roles_data, start=1):
-                safe_set_cell(ws, f'G{start_row + idx}', idx)  # S.no
-                safe_set_cell(ws, f'H{start_row + idx}', role)  # Role Name
-                safe_set_cell(ws, f'I{start_row + idx}', f"{role} permissions")  # Entitlement
-                safe_set_cell(ws, f'J{start_row + idx}', f"Standard {role} role")  # Description
-        
         # Generate output path if not provided
         if not output_path:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_dir = Path(__file__).parent
-            output_path = output_dir / f"SailPoint_Onboarding_Filled_{timestamp}.xlsx"
+            output_path = _default_output_path()
+        
+        # Evaluate the (cached) write plan and write the form atomically
+        result = fill_form(data, template_path, output_path, mapping_path or DEFAULT_MAPPING)
         
-        # Save the filled workbook
-        wb.save(str(output_path))
-        wb.close()
+        message = f"Excel form filled successfully and saved to: {output_path}"
+        if result["write_failures"]:
+            message += f" ({len(result['write_failures'])} cell writes failed, see write_failures)"
         
         return {
             "status": "success",
-            "message": f"Excel form filled successfully and saved to: {output_path}",
+            "message": message,
             "output_file": str(output_path),
             "total_accounts": data["user_count"],
             "entitlements": data["entitlements"],
-            "filled_sheets": ["Application General Information", "Application On-boarding Form", "Environment", "Process type ", "Roles"]
+            **result
         }
     
     except Exception as e:
@@ -285,15 +122,74 @@ def fill_excel_form(template_path: Optional[str] = None, output_path: Optional[s
             "message": f"Error filling Excel form: {str(e)}"
         }
 
-def read_excel_form(file_path: str) -> dict:
+def fill_excel_forms_batch(applications: list[dict], max_workers: int = 0) -> dict:
+    """
+    Fills one SailPoint onboarding form per application in a single call.
+
+    MCP data for all applications is fetched concurrently (once per distinct endpoint)
+    and the workbooks are filled in parallel worker processes as the data arrives.
+
+    Args:
+        applications: One dict per application with optional keys name, mcp_url,
+            template_path, output_path and mapping_path (defaults as for fill_excel_form)
+        max_workers: Number of fill processes (0 uses every CPU, 1 fills in-process)
+
+    Returns:
+        Dictionary with status, per-application results and timings
+    """
+    try:
+        specs = []
+        for position, application in enumerate(applications, start=1):
+            name = application.get("name") or f"application_{position}"
+            template_path = Path(application.get("template_path") or DEFAULT_TEMPLATE)
+            if not template_path.exists():
+                return {
+                    "status": "error",
+                    "message": f"Template file not found for {name}: {template_path}"
+                }
+            safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+            specs.append({
+                "name": name,
+                "mcp_url": application.get("mcp_url") or MCP_QUERY_URL,
+                "template_path": str(template_path),
+                "output_path": application.get("output_path") or str(
+                    _default_output_path(f"SailPoint_Onboarding_Filled_{safe_name}")),
+                "mapping_path": application.get("mapping_path") or DEFAULT_MAPPING
+            })
+
+        start = datetime.now()
+        results = fill_forms(specs, _fetch_form_data, max_workers=max_workers or None)
+        failed = sum(1 for result in results if result["status"] == "error")
+
+        return {
+            "status": "success" if not failed else "error" if failed == len(results) else "partial",
+            "message": f"Filled {len(results) - failed} of {len(results)} forms",
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "elapsed_ms": round((datetime.now() - start).total_seconds() * 1000, 2),
+            "results": results
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error filling Excel forms: {str(e)}"
+        }
+
+def read_excel_form(file_path: str, template_path: Optional[str] = None, mapping_path: Optional[str] = None) -> dict:
     """
     Reads the filled SailPoint onboarding Excel form and returns the data.
     
+    Only the cells the field mapping fills are read, sheet by sheet, without
+    loading styles or the rest of the workbook.
+    
     Args:
         file_path: Path to the Excel file to read
+        template_path: Template the form was filled from (optional, uses default if not provided)
+        mapping_path: Field mapping the form was filled with (optional, uses default if not provided)
     
     Returns:
-        Dictionary containing all the form data
+        Dictionary containing all the form data, grouped by sheet
     """
     try:
         if not Path(file_path).exists():
@@ -302,51 +198,10 @@ def read_excel_form(file_path: str) -> dict:
                 "message": f"File not found: {file_path}"
             }
         
-        wb = openpyxl.load_workbook(file_path)
-        ws = wb.active
-        
-        form_data = {
-            "application_details": {
-                "application_name": ws['B4'].value,
-                "application_owner": ws['B5'].value,
-                "description": ws['B6'].value,
-                "application_type": ws['B7'].value
-            },
-            "connection_details": {
-                "connector_type": ws['B9'].value,
-                "host": ws['B10'].value,
-                "port": ws['B11'].value,
-                "database": ws['B12'].value,
-                "jdbc_url": ws['B13'].value,
-                "authentication": ws['B14'].value
-            },
-            "schema_mapping": {
-                "identity_attribute": ws['B16'].value,
-                "display_attribute": ws['B17'].value,
-                "account_attributes": ws['B18'].value,
-                "entitlement_attribute": ws['B19'].value
-            },
-            "entitlements": {
-                "discovered_roles": ws['B21'].value,
-                "entitlement_type": ws['B22'].value
-            },
-            "account_correlation": {
-                "correlation_rule": ws['B24'].value,
-                "correlation_attribute": ws['B25'].value
-            },
-            "provisioning_policy": {
-                "create_account": ws['B27'].value,
-                "update_account": ws['B28'].value,
-                "delete_account": ws['B29'].value,
-                "manage_entitlements": ws['B30'].value
-            },
-            "aggregation_info": {
-                "total_accounts": ws['B32'].value,
-                "sample_account_1": ws['B33'].value,
-                "sample_account_2": ws['B34'].value,
-                "sample_account_3": ws['B35'].value
-            }
-        }
+        with span('xlsx.plan'):
+            plan = get_plan(template_path or DEFAULT_TEMPLATE, mapping_path or DEFAULT_MAPPING)
+        with span('xlsx.read_form'):
+            form_data = read_form(file_path, plan)
         
         return {
             "status": "success",
@@ -359,6 +214,19 @@ def read_excel_form(file_path: str) -> dict:
             "message": f"Error reading Excel form: {str(e)}"
         }
 
+# The budget is applied last, so it also covers the timings traced adds
+tools = ([budgeted(traced(tool)) for tool in (fill_excel_form, fill_excel_forms_batch, read_excel_form,
+                                              get_sailpoint_data_from_mcp)]
+         + [budgeted(traced(get_result_page))])
+tool = {t.__name__: t for t in tools}
+
+# Canonical requests are answered by their tool without a model call
+router = IntentRouter('excel_form_filler_agent', [
+    Route('fill_form', FILL_FORM, lambda: tool['fill_excel_form']()),
+    Route('read_form', READ_FORM, lambda file_path: tool['read_excel_form'](file_path)),
+    Route('raw_data', RAW_DATA, lambda: tool['get_sailpoint_data_from_mcp']())
+])
+
 # Create the Excel Form Filler Agent
 root_agent = Agent(
     model='gemini-2.0-flash-exp',
@@ -373,14 +241,24 @@ When a user asks you to fill the Excel form:
 
 IMPORTANT: Do NOT specify a template_path when calling fill_excel_form. The default template is automatically used.
 
+When a user asks to fill forms for several applications at once:
+1. Call 'fill_excel_forms_batch' with one entry per application (name, and mcp_url if the application has its own MCP server)
+2. Summarize which forms succeeded, which failed and why, and where each file was saved
+
 When a user asks to read a filled form:
 1. Use 'read_excel_form' tool with the file path
 2. Present the data in a clear, organized format
 
 When a user asks for raw MongoDB data:
-1. Use 'get_sailpoint_data_from_mcp' tool
+1. Use 'get_sailpoint_data_from_mcp' tool; it returns a summary unless include_users is set
+2. Long lists in tool results are cut to a size budget and listed under 'truncated' with a handle;
+   call 'get_result_page' with that handle and next_offset only when the user asks for more items
+
+Every tool result has a 'timings' entry with the milliseconds spent per stage (MCP queries, plan,
+render, patch or load/write/save); only mention it when the user asks why something is slow.
 
 The template is automatically located in the project root directory.
 Output files are saved in the excel-form-filler-agent directory with a timestamp.""",
-    tools=[fill_excel_form, read_excel_form, get_sailpoint_data_from_mcp],
+    tools=tools,
+    before_agent_callback=router.before_agent_callback,
 )
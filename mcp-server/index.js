@@ -1,7 +1,12 @@
 const express = require('express');
 const bodyParser = require('body-parser');
 const cors = require('cors');
-const { MongoClient } = require('mongodb');
+const crypto = require('crypto');
+const zlib = require('zlib');
+const { once } = require('events');
+const { promisify } = require('util');
+const { encode: encodeMsgpack } = require('@msgpack/msgpack');
+const { MongoClient, ObjectId } = require('mongodb');
 
 const app = express();
 const port = 3000;
@@ -12,6 +17,18 @@ app.use(bodyParser.json());
 // Use internal Kubernetes service name when deployed to GKE
 const mongoUrl = process.env.MONGO_URL || 'mongodb://mongodb-service.sailpoint.svc.cluster.local:27017';
 const dbName = 'app_auth';
+const DEFAULT_PAGE_SIZE = 1000;
+const MAX_PAGE_SIZE = 10000;
+const DEFAULT_SAMPLE_SIZE = 3;
+const MAX_SAMPLE_SIZE = 100;
+const MAX_PROFILE_SAMPLE_SIZE = 100000;
+const MAX_FIELDS = 100;
+// Filter operators clients may use; anything else ($where, $expr, ...) is rejected
+const FILTER_OPERATORS = new Set(['$eq', '$ne', '$in', '$nin', '$exists', '$gt', '$gte', '$lt', '$lte']);
+const FIELD_NAME = /^[A-Za-z0-9_][A-Za-z0-9_.-]*$/;
+const MSGPACK_TYPE = 'application/x-msgpack';
+// Smaller bodies are sent uncompressed: the saving would not pay for the CPU
+const MIN_COMPRESS_BYTES = 1024;
 let db;
 
 MongoClient.connect(mongoUrl, { useUnifiedTopology: true }, (err, client) => {
@@ -47,18 +64,378 @@ app.get('/mcp/sse', (req, res) => {
   });
 });
 
+// Content codings in order of preference, at levels tuned for throughput rather
+// than ratio. zstd is offered only where the Node runtime provides it (22.15+).
+const CODINGS = [
+    ...(zlib.createZstdCompress ? [{
+        name: 'zstd',
+        stream: () => zlib.createZstdCompress({ params: { [zlib.constants.ZSTD_c_compressionLevel]: 3 } }),
+        compress: promisify(zlib.zstdCompress)
+    }] : []),
+    {
+        name: 'br',
+        stream: () => zlib.createBrotliCompress({ params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 } }),
+        compress: (buffer) => promisify(zlib.brotliCompress)(buffer, { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 } })
+    },
+    {
+        name: 'gzip',
+        stream: () => zlib.createGzip({ level: 4 }),
+        compress: (buffer) => promisify(zlib.gzip)(buffer, { level: 4 })
+    }
+];
+
+// Our most preferred coding that the client accepts (q > 0), or null for identity.
+const negotiateCoding = (req) => {
+    const accepted = new Set();
+    for (const part of (req.get('Accept-Encoding') || '').split(',')) {
+        const [name, ...params] = part.trim().toLowerCase().split(';');
+        const q = params.map((param) => param.trim()).find((param) => param.startsWith('q='));
+        if (name && !(q && Number(q.slice(2)) === 0)) {
+            accepted.add(name);
+        }
+    }
+    return CODINGS.find((coding) => accepted.has(coding.name)) || null;
+};
+
+// MessagePack when the client prefers it over JSON in Accept.
+const wantsMsgpack = (req) => req.accepts(['application/json', MSGPACK_TYPE]) === MSGPACK_TYPE;
+
+// Converts BSON values (ObjectId, Date, ...) the way JSON.stringify would, so
+// MessagePack bodies carry exactly the same data as JSON ones.
+const toPlain = (value) => {
+    if (value === null || typeof value !== 'object') {
+        return value;
+    }
+    if (Array.isArray(value)) {
+        return value.map(toPlain);
+    }
+    if (typeof value.toJSON === 'function') {
+        return value.toJSON();
+    }
+    const plain = {};
+    for (const [key, item] of Object.entries(value)) {
+        plain[key] = toPlain(item);
+    }
+    return plain;
+};
+
+const encodeBody = (msgpack, body) => {
+    if (!msgpack) {
+        return Buffer.from(JSON.stringify(body));
+    }
+    const encoded = encodeMsgpack(toPlain(body));
+    return Buffer.from(encoded.buffer, encoded.byteOffset, encoded.byteLength);
+};
+
+// Sends a body as JSON or MessagePack (per Accept), compressed per
+// Accept-Encoding, with an ETag per representation. Express only answers
+// conditional GET/HEAD requests itself, so If-None-Match on POST queries is
+// handled here.
+const sendBody = async (req, res, body) => {
+    const msgpack = wantsMsgpack(req);
+    const payload = encodeBody(msgpack, body);
+    const coding = payload.length >= MIN_COMPRESS_BYTES ? negotiateCoding(req) : null;
+    const hash = crypto.createHash('sha1').update(payload).digest('base64url');
+    const etag = `"${hash}${msgpack ? '-msgpack' : ''}${coding ? `-${coding.name}` : ''}"`;
+    res.setHeader('ETag', etag);
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('Vary', 'Accept, Accept-Encoding');
+
+    if (req.get('If-None-Match') === etag) {
+        return res.status(304).end();
+    }
+    res.type(msgpack ? MSGPACK_TYPE : 'application/json');
+    if (!coding) {
+        return res.send(payload);
+    }
+    res.setHeader('Content-Encoding', coding.name);
+    res.send(await coding.compress(payload));
+};
+
+// Starts a streamed response and returns the stream to write the body to:
+// the response itself, or a compressor piped into it.
+const openStream = (req, res, contentType) => {
+    const coding = negotiateCoding(req);
+    res.setHeader('Content-Type', contentType);
+    res.setHeader('Vary', 'Accept, Accept-Encoding');
+    if (!coding) {
+        return res;
+    }
+    res.setHeader('Content-Encoding', coding.name);
+    const compressor = coding.stream();
+    compressor.pipe(res);
+    return compressor;
+};
+
+// Parses the requested page size, falling back to the default and capping it.
+const parsePageSize = (limit) => {
+    const size = parseInt(limit, 10);
+    if (!Number.isInteger(size) || size <= 0) {
+        return DEFAULT_PAGE_SIZE;
+    }
+    return Math.min(size, MAX_PAGE_SIZE);
+};
+
+class QueryError extends Error {}
+
+const isScalar = (value) => value === null || ['string', 'number', 'boolean'].includes(typeof value);
+
+// Validates a filter of the form {field: value} or {field: {$op: value}}, where
+// values are scalars (arrays of scalars for $in/$nin, a boolean for $exists).
+const parseFilter = (filter) => {
+    if (filter === undefined || filter === null) {
+        return {};
+    }
+    if (typeof filter !== 'object' || Array.isArray(filter)) {
+        throw new QueryError('filter must be an object');
+    }
+    for (const [field, condition] of Object.entries(filter)) {
+        if (!FIELD_NAME.test(field)) {
+            throw new QueryError(`Invalid filter field: ${field}`);
+        }
+        if (isScalar(condition)) {
+            continue;
+        }
+        if (typeof condition !== 'object' || Array.isArray(condition)) {
+            throw new QueryError(`Invalid condition for ${field}`);
+        }
+        for (const [operator, value] of Object.entries(condition)) {
+            if (!FILTER_OPERATORS.has(operator)) {
+                throw new QueryError(`Unsupported filter operator: ${operator}`);
+            }
+            const valid = operator === '$exists' ? typeof value === 'boolean'
+                : ['$in', '$nin'].includes(operator) ? Array.isArray(value) && value.every(isScalar)
+                : isScalar(value);
+            if (!valid) {
+                throw new QueryError(`Invalid value for ${field} ${operator}`);
+            }
+        }
+    }
+    return filter;
+};
+
+// Turns a list of attribute names into a projection; _id is only returned when listed.
+const parseProjection = (fields) => {
+    if (fields === undefined || fields === null) {
+        return undefined;
+    }
+    if (!Array.isArray(fields) || !fields.length || fields.length > MAX_FIELDS
+            || !fields.every((field) => typeof field === 'string' && FIELD_NAME.test(field))) {
+        throw new QueryError(`fields must be a list of 1-${MAX_FIELDS} attribute names`);
+    }
+    const projection = Object.fromEntries(fields.map((field) => [field, 1]));
+    if (!fields.includes('_id')) {
+        projection._id = 0;
+    }
+    return projection;
+};
+
+const parseLimit = (limit) => {
+    if (limit === undefined || limit === null) {
+        return 0;
+    }
+    const size = Number(limit);
+    if (!Number.isInteger(size) || size <= 0) {
+        throw new QueryError('limit must be a positive integer');
+    }
+    return size;
+};
+
+// Optional fields (projection), filter and limit accepted by the user document queries.
+const queryOptions = (body) => ({
+    filter: parseFilter(body.filter),
+    projection: parseProjection(body.fields),
+    limit: parseLimit(body.limit)
+});
+
+// Writes every document of a cursor as one JSON document per line (or as
+// concatenated MessagePack values), honouring backpressure so the server never
+// buffers more than a driver batch regardless of collection size.
+const streamCursor = async (req, res, cursor) => {
+    req.on('close', () => cursor.close());
+
+    const msgpack = wantsMsgpack(req);
+    const out = openStream(req, res, msgpack ? MSGPACK_TYPE : 'application/x-ndjson');
+    for await (const user of cursor) {
+        const chunk = msgpack ? encodeBody(true, user) : JSON.stringify(user) + '\n';
+        if (!out.write(chunk)) {
+            await once(out, 'drain');
+        }
+    }
+    out.end();
+};
+
+const streamUsers = (req, res, filter = {}, projection = undefined, limit = 0) =>
+    streamCursor(req, res, db.collection('users').find(filter, { projection, limit })
+        .batchSize(parsePageSize(req.body.batch_size)));
+
+// A uniform random sample of `size` users, so the schema can be profiled
+// without reading the whole collection.
+const streamUserSample = async (req, res) => {
+    const size = parseLimit(req.body.size);
+    if (!size) {
+        throw new QueryError('size must be a positive integer');
+    }
+    const pipeline = [{ $sample: { size: Math.min(size, MAX_PROFILE_SAMPLE_SIZE) } }];
+    await streamCursor(req, res, db.collection('users').aggregate(pipeline, { allowDiskUse: true })
+        .batchSize(parsePageSize(req.body.batch_size)));
+};
+
+// Returns one page of users ordered by _id; pass next_cursor back to get the following page.
+// With fields, _id is always included because it is the page cursor.
+const getUserPage = async (req, res) => {
+    const { cursor } = req.body;
+    const limit = parsePageSize(req.body.limit);
+    const filter = { ...parseFilter(req.body.filter) };
+    const projection = parseProjection(req.body.fields);
+    if (projection) {
+        delete projection._id;
+    }
+
+    if (cursor) {
+        if (!ObjectId.isValid(cursor)) {
+            return res.status(400).json({ error: 'Invalid cursor' });
+        }
+        filter._id = { $gt: new ObjectId(cursor) };
+    }
+
+    const users = await db.collection('users').find(filter, { projection }).sort({ _id: 1 }).limit(limit).toArray();
+    const nextCursor = users.length === limit ? String(users[users.length - 1]._id) : null;
+    await sendBody(req, res, { users, next_cursor: nextCursor });
+};
+
+// Filter for users changed since a client's sync watermark: inserted after
+// after_id, or with updatedAt at or after since. With ids, exactly those users.
+// Returns null when a parameter is malformed.
+const changeFilter = ({ since, after_id: afterId, ids }) => {
+    if (ids) {
+        if (!Array.isArray(ids) || !ids.every((id) => ObjectId.isValid(id))) {
+            return null;
+        }
+        return { _id: { $in: ids.map((id) => new ObjectId(id)) } };
+    }
+
+    const clauses = [];
+    if (afterId) {
+        if (!ObjectId.isValid(afterId)) {
+            return null;
+        }
+        clauses.push({ _id: { $gt: new ObjectId(afterId) } });
+    }
+    if (since) {
+        const date = new Date(since);
+        if (Number.isNaN(date.getTime())) {
+            return null;
+        }
+        clauses.push({ updatedAt: { $gte: date } });
+    }
+    return clauses.length ? { $or: clauses } : {};
+};
+
+const streamUserChanges = async (req, res) => {
+    const filter = changeFilter(req.body);
+    if (!filter) {
+        return res.status(400).json({ error: 'Invalid since, after_id or ids' });
+    }
+    await streamUsers(req, res, filter);
+};
+
+// Aggregation stages shared by the per-metric queries and get_user_summary.
+// They run inside MongoDB so only the aggregated result crosses the network.
+const roleCountStages = [
+    { $unwind: '$roles' },
+    // A role listed twice on one user counts that user once
+    { $group: { _id: { user: '$_id', role: '$roles' } } },
+    { $group: { _id: '$_id.role', count: { $sum: 1 } } },
+    { $sort: { count: -1, _id: 1 } },
+    { $project: { _id: 0, role: '$_id', count: 1 } }
+];
+
+const attributeKeyStages = [
+    { $project: { kv: { $objectToArray: '$$ROOT' } } },
+    { $unwind: '$kv' },
+    { $group: { _id: '$kv.k' } },
+    { $sort: { _id: 1 } }
+];
+
+const aggregate = (pipeline) =>
+    db.collection('users').aggregate(pipeline, { allowDiskUse: true }).toArray();
+
+const getRoleCounts = async (req, res) => {
+    await sendBody(req, res, { roles: await aggregate(roleCountStages) });
+};
+
+const getAttributeKeys = async (req, res) => {
+    const keys = await aggregate(attributeKeyStages);
+    await sendBody(req, res, { attributes: keys.map((key) => key._id) });
+};
+
+// Count, role counts, attribute keys and a few sample users in one collection pass.
+const getUserSummary = async (req, res) => {
+    const sampleSize = Math.min(parseInt(req.body.sample_size, 10) || DEFAULT_SAMPLE_SIZE, MAX_SAMPLE_SIZE);
+    const [summary] = await aggregate([{
+        $facet: {
+            count: [{ $count: 'count' }],
+            roles: roleCountStages,
+            attributes: attributeKeyStages,
+            sample: [{ $limit: sampleSize }]
+        }
+    }]);
+
+    await sendBody(req, res, {
+        count: summary.count.length ? summary.count[0].count : 0,
+        roles: summary.roles,
+        attributes: summary.attributes.map((key) => key._id),
+        sample: summary.sample
+    });
+};
+
 app.post('/mcp/query', async (req, res) => {
     const { query } = req.body;
 
-    if (query === 'get_user_data') {
-        const users = await db.collection('users').find({}).toArray();
-        res.json(users);
-    } else {
-        res.status(400).json({ error: 'Unknown query' });
+    try {
+        if (query === 'get_user_data') {
+            const { filter, projection, limit } = queryOptions(req.body);
+            const users = await db.collection('users').find(filter, { projection, limit }).toArray();
+            await sendBody(req, res, users);
+        } else if (query === 'get_user_page') {
+            await getUserPage(req, res);
+        } else if (query === 'stream_user_data') {
+            const { filter, projection, limit } = queryOptions(req.body);
+            await streamUsers(req, res, filter, projection, limit);
+        } else if (query === 'stream_user_changes') {
+            await streamUserChanges(req, res);
+        } else if (query === 'stream_user_sample') {
+            await streamUserSample(req, res);
+        } else if (query === 'stream_user_ids') {
+            await streamUsers(req, res, {}, { _id: 1 });
+        } else if (query === 'get_sync_state') {
+            // Never cached by clients: a count mismatch after a delta sync reveals deletions
+            await sendBody(req, res, { count: await db.collection('users').countDocuments({}) });
+        } else if (query === 'get_user_count') {
+            await sendBody(req, res, { count: await db.collection('users').countDocuments(parseFilter(req.body.filter)) });
+        } else if (query === 'get_role_counts') {
+            await getRoleCounts(req, res);
+        } else if (query === 'get_attribute_keys') {
+            await getAttributeKeys(req, res);
+        } else if (query === 'get_user_summary') {
+            await getUserSummary(req, res);
+        } else {
+            res.status(400).json({ error: 'Unknown query' });
+        }
+    } catch (err) {
+        if (err instanceof QueryError && !res.headersSent) {
+            return res.status(400).json({ error: err.message });
+        }
+        console.error(`Query ${query} failed`, err);
+        if (res.headersSent) {
+            res.destroy(err);
+        } else {
+            res.status(500).json({ error: 'Query failed' });
+        }
     }
 });
 
-
 app.listen(port, () => {
   console.log(`MCP Server listening at http://localhost:${port}`);
 });
@@ -0,0 +1,274 @@
+"""Fill SailPoint onboarding forms for a list of applications, without an agent.
+
+Runs the same fetch -> fill -> save pipeline as the agents' tools, directly,
+so scheduled refreshes pay no model latency:
+
+    python onboarding_jobs.py jobs.json -o forms/ [--workers N] [--fetch-workers N]
+        [--snapshot-dir DIR | --no-snapshot] [--field-index-dir DIR] [--query-cache-ttl SECONDS]
+
+The job file is a JSON list of applications, or {"defaults": {...},
+"applications": [...]} where defaults apply to every application:
+
+    {"defaults": {"mcp_url": "http://10.0.0.5:3000/mcp/query"},
+     "applications": [{"name": "payments"},
+                      {"name": "hr", "mcp_url": "http://10.0.0.6:3000/mcp/query"},
+                      {"name": "hr", "form": "json"}]}
+
+Each application has a name and optionally mcp_url, form ("excel", the
+filled questionnaire, or "json", the onboarding form of
+`generate_sailpoint_onboarding_form`), output (file name in the output
+directory), template_path and mapping_path. JSON forms report the
+application's database from its connection ({"host", "port", "database"}
+and optionally "connection_string"); only applications on MCP_QUERY_URL may
+omit it and get the agents' MONGODB_CONNECTION. Relative paths are resolved
+against the job file's directory. Every output is written atomically, so a
+refresh never leaves a partial form, and a run summary is written next to the
+forms. Excel forms that share an MCP endpoint share one fetch, and so do
+JSON forms.
+
+Field indexes persist between runs. With --snapshot-dir, user snapshots do
+too, so a nightly refresh only transfers the users that changed since the
+previous night; without one, summaries come from the server's aggregate
+queries and user lists are streamed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = Path(__file__).parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+MCP_QUERY_URL = os.environ.get('MCP_QUERY_URL', 'http://34.9.116.130:3000/mcp/query')
+DEFAULT_TEMPLATE = PROJECT_ROOT / 'SailPoint_Onboarding_Application_Questionnaire_v2.xlsx'
+DEFAULT_MAPPING = PROJECT_ROOT / 'excel-form-filler-agent' / 'sailpoint_field_mapping.json'
+SUMMARY_NAME = 'summary.json'
+
+FORM_EXTENSIONS = {'excel': '.xlsx', 'json': '.json'}
+PATH_KEYS = ('template_path', 'mapping_path')
+CONNECTION_KEYS = ('host', 'port', 'database')
+
+
+class JobError(ValueError):
+    """Raised for a job file or job list that can't be run."""
+
+
+def _safe_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+
+
+def load_jobs(path) -> list:
+    """Reads a job file and returns its applications with defaults applied and paths resolved."""
+    path = Path(path)
+    with open(path, encoding='utf-8') as f:
+        content = json.load(f)
+    if isinstance(content, list):
+        content = {"applications": content}
+    if not isinstance(content, dict) or not isinstance(content.get("applications"), list):
+        raise JobError(f"{path}: expected a list of applications or an object with 'applications'")
+
+    defaults = content.get("defaults") or {}
+    jobs = []
+    for application in content["applications"]:
+        if not isinstance(application, dict):
+            raise JobError(f"{path}: every application must be an object")
+        job = {**defaults, **application}
+        for key in PATH_KEYS:
+            if job.get(key):
+                job[key] = str((path.parent / job[key]).resolve())
+        jobs.append(job)
+    return jobs
+
+
+def _connection(name: str, job: dict, mcp_url: str) -> dict:
+    """The database a JSON form reports: the job's connection, or MONGODB_CONNECTION on MCP_QUERY_URL."""
+    connection = job.get("connection")
+    if connection is None:
+        if mcp_url != MCP_QUERY_URL:
+            raise JobError(f"{name}: json forms for {mcp_url} need a connection with host, port and database")
+        from sailpoint_mcp import MONGODB_CONNECTION
+        return dict(MONGODB_CONNECTION)
+    if not isinstance(connection, dict) or any(connection.get(key) in (None, '') for key in CONNECTION_KEYS):
+        raise JobError(f"{name}: connection needs {', '.join(CONNECTION_KEYS)}")
+    return connection
+
+
+def _plan_jobs(jobs: list, output_dir: Path, mcp_url: str) -> list:
+    """Fills in each job's defaults and output path, and checks the jobs before anything runs."""
+    planned = []
+    outputs = {}
+    for position, job in enumerate(jobs, start=1):
+        name = str(job.get("name") or f"application_{position}")
+        form = job.get("form") or "excel"
+        if form not in FORM_EXTENSIONS:
+            raise JobError(f"{name}: form must be one of {', '.join(FORM_EXTENSIONS)}, not {form!r}")
+        output_path = (output_dir / (job.get("output") or _safe_name(name) + FORM_EXTENSIONS[form])).resolve()
+        if output_path in outputs:
+            raise JobError(f"{name}: output {output_path} is also written by {outputs[output_path]}")
+        outputs[output_path] = name
+
+        planned_job = {
+            "name": name,
+            "form": form,
+            "mcp_url": job.get("mcp_url") or mcp_url,
+            "output_path": str(output_path)
+        }
+        if form == 'excel':
+            planned_job["template_path"] = str(job.get("template_path") or DEFAULT_TEMPLATE)
+            planned_job["mapping_path"] = str(job.get("mapping_path") or DEFAULT_MAPPING)
+            if not Path(planned_job["template_path"]).exists():
+                raise JobError(f"{name}: template file not found: {planned_job['template_path']}")
+        else:
+            planned_job["connection"] = _connection(name, job, planned_job["mcp_url"])
+        planned.append(planned_job)
+    return planned
+
+
+def _write_json(path: Path, content) -> None:
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(content, f, indent=2, default=str)
+        os.replace(temporary_path, path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
+def _build_json_forms(mcp_url: str, jobs: list) -> list:
+    # One form per endpoint, written to every job that asked for it with that job's database
+    from sailpoint_mcp import build_onboarding_form, connection_details, get_client
+
+    start = time.perf_counter()
+    try:
+        result = build_onboarding_form(get_client(mcp_url), jobs[0]["connection"])
+    except Exception as e:
+        result = {"status": "error", "message": f"Failed to fetch data from {mcp_url}: {str(e)}"}
+    fetch_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    results = []
+    for job in jobs:
+        if result["status"] == "error":
+            results.append({"name": job["name"], "status": "error", "message": result["message"], "fetch_ms": fetch_ms})
+            continue
+        try:
+            form = {**result["sailpoint_onboarding_form"], "connection_details": connection_details(job["connection"])}
+            _write_json(Path(job["output_path"]), form)
+            results.append({"name": job["name"], "status": "success", "output_file": job["output_path"],
+                            "fetch_ms": fetch_ms})
+        except OSError as e:
+            results.append({"name": job["name"], "status": "error",
+                            "message": f"Error writing onboarding form: {str(e)}", "fetch_ms": fetch_ms})
+    return results
+
+
+def run_jobs(jobs: list, output_dir, max_workers: int = None, fetch_workers: int = None,
+             mcp_url: str = None) -> dict:
+    """
+    Produces every job's form in `output_dir`.
+
+    Excel forms are filled by `xlsx_forms.fill_forms` (concurrent fetches,
+    parallel fill processes); JSON onboarding forms are built on a thread pool
+    meanwhile. Cache behaviour follows the MCP_* and XLSX_* environment
+    variables, read when the packages are first imported.
+
+    Args:
+        jobs: Application dicts as returned by `load_jobs`
+        output_dir: Directory the forms are written to (created if missing)
+        max_workers: Fill processes (defaults to the CPU count; 1 fills in-process)
+        fetch_workers: Concurrent MCP fetches (defaults to BATCH_FETCH_WORKERS)
+        mcp_url: MCP query URL of jobs without one (defaults to MCP_QUERY_URL)
+
+    Returns:
+        Dictionary with status, message, succeeded, failed, elapsed_ms and one
+        result per job, in job order
+    """
+    # Imported on first use, so `main` can set the cache environment variables first
+    from sailpoint_mcp import fetch_form_data, get_client
+    from xlsx_forms import fill_forms
+    from xlsx_forms.batch import DEFAULT_FETCH_WORKERS
+
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    planned = _plan_jobs(jobs, output_dir, mcp_url or MCP_QUERY_URL)
+    fetch_workers = fetch_workers or DEFAULT_FETCH_WORKERS
+
+    excel = [job for job in planned if job["form"] == 'excel']
+    json_by_url = {}
+    for job in planned:
+        if job["form"] == 'json':
+            json_by_url.setdefault(job["mcp_url"], []).append(job)
+
+    by_output = {}
+    with ThreadPoolExecutor(max_workers=min(fetch_workers, len(json_by_url)) or 1) as json_pool:
+        json_futures = [json_pool.submit(_build_json_forms, url, url_jobs) for url, url_jobs in json_by_url.items()]
+        if excel:
+            excel_results = fill_forms(excel, lambda url: fetch_form_data(get_client(url)),
+                                       max_workers=max_workers, fetch_workers=fetch_workers)
+            for job, result in zip(excel, excel_results):
+                by_output[job["output_path"]] = result
+        for future, url_jobs in zip(json_futures, json_by_url.values()):
+            for job, result in zip(url_jobs, future.result()):
+                by_output[job["output_path"]] = result
+
+    results = [{"form": job["form"], **by_output[job["output_path"]]} for job in planned]
+    failed = sum(1 for result in results if result["status"] == "error")
+    return {
+        "status": "success" if not failed else "error" if failed == len(results) else "partial",
+        "message": f"Produced {len(results) - failed} of {len(results)} forms",
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "results": results
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('job_file', help='JSON job file (see the module docstring)')
+    parser.add_argument('-o', '--output-dir', default='.', help='Directory the forms are written to')
+    parser.add_argument('--summary', help=f'Path of the run summary (default: {SUMMARY_NAME} in the output directory)')
+    parser.add_argument('--workers', type=int, default=0, help='Fill processes (0 uses the CPU count, 1 fills in-process)')
+    parser.add_argument('--fetch-workers', type=int, default=0, help='Concurrent MCP fetches (0 uses BATCH_FETCH_WORKERS)')
+    parser.add_argument('--mcp-url', help='MCP query URL of applications without one (default: MCP_QUERY_URL)')
+    cache = parser.add_argument_group('cache options')
+    snapshots = cache.add_mutually_exclusive_group()
+    snapshots.add_argument('--snapshot-dir', help='Keep local user snapshots in this directory and delta sync them')
+    snapshots.add_argument('--no-snapshot', action='store_true', help='Ignore MCP_SNAPSHOT_DIR and stream every user')
+    cache.add_argument('--field-index-dir', help='Directory of the persisted template field indexes')
+    cache.add_argument('--query-cache-ttl', type=float, help='Seconds aggregate query results are reused within the run')
+    args = parser.parse_args(argv)
+
+    # Environment rather than arguments, so the fill worker processes see them too
+    if args.snapshot_dir is not None or args.no_snapshot:
+        os.environ['MCP_SNAPSHOT_DIR'] = '' if args.no_snapshot else args.snapshot_dir
+    if args.field_index_dir is not None:
+        os.environ['XLSX_FIELD_INDEX_DIR'] = args.field_index_dir
+    if args.query_cache_ttl is not None:
+        os.environ['MCP_CACHE_TTL'] = str(args.query_cache_ttl)
+
+    try:
+        summary = run_jobs(load_jobs(args.job_file), args.output_dir, max_workers=args.workers or None,
+                           fetch_workers=args.fetch_workers or None, mcp_url=args.mcp_url)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    for result in summary["results"]:
+        detail = result.get("output_file") if result["status"] == "success" else result.get("message")
+        print(f"{result['status']:<8}{result['form']:<7}{result['name']:<30}{detail}")
+    print(f"\n{summary['message']} in {summary['elapsed_ms'] / 1000:.1f} s")
+
+    summary_path = Path(args.summary or Path(args.output_dir) / SUMMARY_NAME)
+    _write_json(summary_path, summary)
+    print(f"Summary saved to: {summary_path}")
+    return 0 if summary["status"] == "success" else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,115 +1,120 @@
+import os
+import sys
 import json
-import requests
+from pathlib import Path
+from typing import Optional
 from google.adk.agents.llm_agent import Agent
 
-MCP_SSE_URL = 'http://34.9.116.130:3000/mcp/sse'
-MCP_QUERY_URL = 'http://34.9.116.130:3000/mcp/query'
+PROJECT_ROOT = Path(__file__).parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from agent_tracing import start_metrics_server, traced
+from sailpoint_mcp import (MONGODB_CONNECTION, IntentRouter, Route, analyze_user_store, budgeted, build_onboarding_form,
+                           discover_endpoints, fetch_user_data, get_client, profile_user_schema, query_user_store,
+                           result_page)
+from sailpoint_mcp.router import CONNECTION_INFO, ONBOARDING_FORM, RAW_DATA
+
+MCP_SSE_URL = os.environ.get('MCP_SSE_URL', 'http://34.9.116.130:3000/mcp/sse')
+MCP_QUERY_URL = os.environ.get('MCP_QUERY_URL', 'http://34.9.116.130:3000/mcp/query')
+
+# Prometheus metrics of the tool calls, when TOOL_METRICS_PORT is set
+start_metrics_server()
 
 def get_mongodb_connection_info() -> dict:
     """Returns the MongoDB connection information for the application."""
-    return {
-        "status": "success",
-        "host": "34.172.211.78",
-        "port": 27017,
-        "database": "app_auth",
-        "connection_string": "mongodb://34.172.211.78:27017/app_auth"
-    }
-
-def fetch_user_data_from_mcp() -> dict:
-    """Fetches user data from MongoDB via the MCP server."""
-    try:
-        response = requests.post(MCP_QUERY_URL, json={'query': 'get_user_data'})
-        response.raise_for_status()
-        
-        users = response.json()
-        
-        # Extract schema information from the first user
-        if users:
-            schema = {
-                'identityAttribute': 'userId',
-                'displayAttribute': 'email',
-                'attributes': list(users[0].keys())
-            }
-            
-            # Extract unique roles (entitlements)
-            all_roles = [role for user in users for role in user.get('roles', [])]
-            entitlements = list(set(all_roles))
-            
-            return {
-                "status": "success",
-                "user_count": len(users),
-                "users": users,
-                "schema": schema,
-                "entitlements": entitlements
-            }
-        else:
-            return {
-                "status": "success",
-                "user_count": 0,
-                "users": [],
-                "schema": {},
-                "entitlements": []
-            }
-    
-    except requests.exceptions.RequestException as e:
-        return {
-            "status": "error",
-            "message": f"Failed to fetch user data: {str(e)}"
-        }
+    return {"status": "success", **MONGODB_CONNECTION}
+
+def fetch_user_data_from_mcp(include_users: bool = False) -> dict:
+    """
+    Fetches a summary of the user data in MongoDB via the MCP server: user count, schema,
+    roles with member counts and a few sample users.
+
+    With include_users, the users are returned too, as many as fit the result size
+    budget; the rest can be paged through with 'get_result_page'.
+
+    Args:
+        include_users: Whether to return user documents in addition to the summary
+    """
+    return fetch_user_data(get_client(MCP_QUERY_URL), include_users=include_users)
+
+def query_users(role: Optional[str] = None, attribute: Optional[str] = None, limit: int = 100) -> dict:
+    """
+    Answers user count, role and membership questions without returning every user.
+
+    Users are streamed once into a compact in-memory store and reused for later questions.
+    With no arguments, returns the user count and the member count of every role.
+
+    Args:
+        role: Return the userIds of the members of this role
+        attribute: Return the distinct values of this attribute with their user counts
+        limit: Maximum number of members or values to return
+    """
+    return query_user_store(get_client(MCP_QUERY_URL), role=role, attribute=attribute, limit=limit)
+
+def analyze_entitlements(top_pairs: int = 20) -> dict:
+    """
+    Analyzes role assignments across all users: role sizes, roles per user, the most
+    frequent role combinations and users violating separation-of-duties (SoD) rules.
+
+    Args:
+        top_pairs: Number of most frequent role pairs to return
+    """
+    return analyze_user_store(get_client(MCP_QUERY_URL), top_pairs=top_pairs)
+
+def profile_schema(sample_size: int = 0) -> dict:
+    """
+    Profiles the attributes of all users in one pass: which attributes exist, their
+    types, null rates, whether they are multi-valued and approximate distinct counts.
+    Also suggests the identity, display and entitlement attributes.
+
+    Args:
+        sample_size: Profile a random sample of this many users instead of all (0 profiles all)
+    """
+    return profile_user_schema(get_client(MCP_QUERY_URL), sample_size=sample_size or None)
+
+async def discover_applications(mcp_urls: list[str]) -> dict:
+    """
+    Discovers the user count, schema and entitlements of many applications at once,
+    one MCP query URL per application, and returns a consolidated result.
+
+    All endpoints are queried concurrently, so the call takes about as long as the
+    slowest endpoint. Endpoints that fail are reported without failing the others.
+
+    Args:
+        mcp_urls: MCP query URLs (http://host:3000/mcp/query), one per application
+    """
+    return await discover_endpoints(mcp_urls or [MCP_QUERY_URL])
+
+def get_result_page(handle: str, offset: int = 0, limit: int = 0) -> dict:
+    """
+    Returns more items of a list that was cut from an earlier tool result. Cut lists are
+    reported in the result's 'truncated' entry with their total, a handle and next_offset.
+
+    Args:
+        handle: The handle from the 'truncated' entry
+        offset: Index of the first item to return (next_offset from the previous page)
+        limit: Maximum number of items to return (0 returns as many as fit)
+    """
+    return result_page(handle, offset=offset, limit=limit or None)
 
 def generate_sailpoint_onboarding_form() -> dict:
     """Generates the complete SailPoint application onboarding form with all required fields."""
-    connection_info = get_mongodb_connection_info()
-    user_data = fetch_user_data_from_mcp()
-    
-    if user_data["status"] == "error":
-        return user_data
-    
-    sailpoint_form = {
-        "application_details": {
-            "application_name": "MongoDB Authorization App",
-            "application_owner": "IT Security Team",
-            "description": "Application using MongoDB for user authorization and role management",
-            "application_type": "Directly Connected"
-        },
-        "connection_details": {
-            "connector_type": "JDBC Connector",
-            "host": connection_info["host"],
-            "port": connection_info["port"],
-            "database": connection_info["database"],
-            "jdbc_url": connection_info["connection_string"],
-            "authentication": "No authentication (development environment)"
-        },
-        "schema_mapping": {
-            "identity_attribute": user_data["schema"].get("identityAttribute", "userId"),
-            "display_attribute": user_data["schema"].get("displayAttribute", "email"),
-            "account_attributes": user_data["schema"].get("attributes", []),
-            "entitlement_attribute": "roles"
-        },
-        "entitlements": {
-            "discovered_roles": user_data["entitlements"],
-            "entitlement_type": "Multi-valued attribute"
-        },
-        "account_correlation": {
-            "correlation_rule": "Match by email address",
-            "correlation_attribute": "email"
-        },
-        "provisioning_policy": {
-            "create_account": "Enabled",
-            "update_account": "Enabled",
-            "delete_account": "Enabled",
-            "manage_entitlements": "Enabled"
-        },
-        "aggregation_info": {
-            "total_accounts": user_data["user_count"],
-            "sample_accounts": user_data["users"][:3] if user_data["users"] else []
-        }
-    }
-    
-    return {
-        "status": "success",
-        "sailpoint_onboarding_form": sailpoint_form
-    }
+    return build_onboarding_form(get_client(MCP_QUERY_URL), MONGODB_CONNECTION)
+
+# The budget is applied last, so it also covers the timings traced adds
+tools = ([budgeted(traced(tool)) for tool in (get_mongodb_connection_info, fetch_user_data_from_mcp, query_users,
+                                              profile_schema, analyze_entitlements, discover_applications,
+                                              generate_sailpoint_onboarding_form)]
+         + [budgeted(traced(get_result_page))])
+tool = {t.__name__: t for t in tools}
+
+# Canonical requests are answered by their tool without a model call
+router = IntentRouter('sailpoint_onboarding_agent', [
+    Route('onboarding_form', ONBOARDING_FORM, lambda: tool['generate_sailpoint_onboarding_form']()),
+    Route('raw_data', RAW_DATA, lambda: tool['fetch_user_data_from_mcp']()),
+    Route('connection_info', CONNECTION_INFO, lambda: tool['get_mongodb_connection_info']())
+])
 
 # Create the ADK agent
 root_agent = Agent(
@@ -123,6 +128,19 @@ When a user asks you to prepare the onboarding form or get application details:
 2. Use the 'fetch_user_data_from_mcp' tool to retrieve user data and discover the schema
 3. Use the 'generate_sailpoint_onboarding_form' tool to create a complete onboarding form
 
+For questions about users and roles (how many users, which roles exist, who has a role,
+how users split by status), use the 'query_users' tool instead of fetching every user.
+For questions about which attributes users have, their types, null rates or cardinality, use 'profile_schema'.
+For questions about role combinations, role sizes or separation-of-duties conflicts, use 'analyze_entitlements'.
+When a user wants to survey several applications (each with its own MCP server), call 'discover_applications'
+once with all of their MCP query URLs and summarize the consolidated result, noting endpoints that failed.
+Tool results are kept to a size budget: long lists are cut and listed under 'truncated' with their total
+and a handle. Work from the summaries and counts; only call 'get_result_page' with the handle and
+next_offset when the user asks for the individual items.
+Every tool result has a 'timings' entry with the milliseconds spent per stage; only mention it when
+the user asks why something is slow.
+
 Present the information in a clear, structured format that can be used to fill out the SailPoint application onboarding form.""",
-    tools=[get_mongodb_connection_info, fetch_user_data_from_mcp, generate_sailpoint_onboarding_form],
+    tools=tools,
+    before_agent_callback=router.before_agent_callback,
 )
\ No newline at end of file
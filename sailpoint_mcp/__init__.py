@@ -0,0 +1,15 @@
+"""Shared MCP client code used by the SailPoint onboarding agents."""
+from .cache import QueryCache
+from .client import MCPClient, MCPError, CircuitOpenError, CircuitBreaker, get_client
+from .aggregates import fetch_user_count, fetch_role_counts, fetch_attribute_keys, fetch_user_summary
+from .stream import iter_users, iter_user_pages, iter_user_sample, summarize_users
+from .snapshot import UserSnapshot, get_snapshot, sync_snapshot
+from .store import UserStore, get_user_store
+from .results import LazyItems, budgeted, result_page, shape_result
+from .profile import HyperLogLog, SchemaProfiler, choose_attributes
+from .users import fetch_user_data, profile_user_schema, query_user_store
+from .fanout import AsyncMCPClient, discover_endpoints
+from .router import IntentRouter, Route, format_response, normalize_request
+from .onboarding import MONGODB_CONNECTION, build_onboarding_form, connection_details, fetch_form_data
+from .analytics import (RuleError, analyze_entitlements, analyze_user_store, load_sod_rules,
+                        role_cooccurrence, sod_violations)
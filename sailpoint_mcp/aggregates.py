@@ -0,0 +1,53 @@
+"""Server-side aggregate queries.
+
+These are answered by MongoDB aggregation pipelines in the MCP server, so the
+agent receives kilobytes of counts and key names instead of every user document.
+"""
+from .stream import DEFAULT_SAMPLE_SIZE
+
+
+def fetch_user_count(client) -> int:
+    """Returns the number of documents in the users collection."""
+    return client.query('get_user_count')['count']
+
+
+def fetch_role_counts(client) -> dict:
+    """Returns {role: member count}, largest roles first."""
+    return {row['role']: row['count'] for row in client.query('get_role_counts')['roles']}
+
+
+def fetch_attribute_keys(client) -> list:
+    """Returns the sorted union of attribute names across all users."""
+    return client.query('get_attribute_keys')['attributes']
+
+
+def fetch_user_summary(client, sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+    """
+    Fetches count, roles, attribute names and sample users in one round trip.
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+        sample_size: Number of sample users to include
+
+    Returns:
+        Dictionary in the same shape as `summarize_users`, plus per-role member counts
+    """
+    summary = client.query('get_user_summary', sample_size=sample_size)
+    role_counts = {row['role']: row['count'] for row in summary['roles']}
+
+    schema = {}
+    if summary['count']:
+        schema = {
+            'identityAttribute': 'userId',
+            'displayAttribute': 'email',
+            'attributes': summary['attributes']
+        }
+
+    return {
+        "status": "success",
+        "user_count": summary['count'],
+        "schema": schema,
+        "entitlements": list(role_counts),
+        "role_counts": role_counts,
+        "sample_users": summary['sample']
+    }
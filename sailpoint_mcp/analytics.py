@@ -0,0 +1,319 @@
+"""Entitlement analytics over a `UserStore`: role co-occurrence, SoD conflicts and role sizes.
+
+Role assignments are taken from the store as a users x roles incidence in
+CSR form and processed with NumPy, without a Python loop per user:
+
+- co-occurrence counts every pair of roles held by the same user. Pairs are
+  generated per block of users, encoded as `left * roles + right` and counted
+  with `bincount` into a dense matrix, or by sorting when the role count
+  makes a dense matrix too large
+- a separation-of-duties (SoD) rule is a set of roles no user may hold
+  together; its violators are the intersection of the rule's sorted member
+  arrays
+- role sizes and roles per user are summarized as histograms
+
+A million users with thousands of roles take about a second.
+`analyze_user_store` keeps its last analysis per endpoint and reuses it for
+as long as `get_user_store` returns the same store, i.e. until the snapshot's
+delta sync finds changed users (or the store expires without a snapshot).
+
+SoD rules are read from a JSON file (`SOD_RULES_PATH`, by default
+`sod_rules.json` next to this module):
+
+    {"rules": [{"name": "admin_user_separation",
+                "description": "Administrators need a separate standard account",
+                "roles": ["admin", "user"]}]}
+"""
+import os
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from agent_tracing import span
+
+from .store import IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE, get_user_store
+
+DEFAULT_SOD_RULES = os.environ.get('SOD_RULES_PATH', str(Path(__file__).parent / 'sod_rules.json'))
+
+DEFAULT_TOP_PAIRS = 20
+DEFAULT_SAMPLE_SIZE = 10
+
+# Largest roles x roles matrix counted densely (int64 entries). Each block's
+# bincount allocates another matrix of this size, and co-occurrence is sparse
+# beyond a few hundred roles, so larger catalogs are counted by sorting instead
+MAX_DENSE_CELLS = 1 << 20
+# Role pairs generated per block of users
+PAIRS_PER_BLOCK = 1 << 22
+
+# The only attributes the analyses read; the store is built from just these
+ANALYTICS_FIELDS = (IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE)
+
+ROLE_SIZE_BUCKETS = [1, 2, 11, 101, 1001, 10001, 100001]
+MAX_LISTED_ROLES_PER_USER = 10
+
+
+# {(query url, rules path, top pairs): (store, rules, analysis)}
+_analyses = {}
+_analyses_lock = threading.Lock()
+
+
+class RuleError(ValueError):
+    """Raised when an SoD rule file is malformed."""
+
+
+def load_sod_rules(path=None) -> list:
+    """Loads and validates SoD rules; each rule needs a name and at least two roles."""
+    with open(path or DEFAULT_SOD_RULES, encoding='utf-8') as f:
+        rules = json.load(f).get('rules', [])
+    for rule in rules:
+        if not rule.get('name') or len(set(rule.get('roles', []))) < 2:
+            raise RuleError(f"SoD rule needs a name and at least two distinct roles: {rule}")
+    return rules
+
+
+def _group_sum(codes: np.ndarray, weights: np.ndarray = None) -> tuple:
+    """
+    Returns the sorted distinct `codes` and the summed `weights` of each
+    (occurrence counts without weights). Sort-based, which is several times
+    faster than np.unique for these int64 codes.
+    """
+    if weights is None:
+        codes = np.sort(codes)
+    else:
+        order = np.argsort(codes)
+        codes, weights = codes[order], weights[order]
+    if not len(codes):
+        return codes, np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    if weights is None:
+        return codes[starts], np.diff(np.append(starts, len(codes)))
+    return codes[starts], np.add.reduceat(weights, starts)
+
+
+def _incidence(store) -> tuple:
+    """Returns (offsets, role ids) as int64 arrays, with roles sorted and de-duplicated per user."""
+    offsets, role_ids = store.role_assignments()
+    offsets = np.frombuffer(offsets, dtype=np.uint32).astype(np.int64)
+    role_ids = np.frombuffer(role_ids, dtype=np.uint32).astype(np.int64)
+    role_count = max(len(store.roles), 1)
+
+    users = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    codes, _ = _group_sum(users * role_count + role_ids)
+    users, role_ids = np.divmod(codes, role_count)
+    offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=len(offsets) - 1), out=offsets[1:])
+    return offsets, role_ids
+
+
+def _pair_blocks(offsets: np.ndarray, role_ids: np.ndarray, role_count: int):
+    """Yields encoded (left * role_count + right) role pairs, left < right, block by block."""
+    # For each assignment: how many later assignments of the same user it pairs with
+    segment_ends = np.repeat(offsets[1:], np.diff(offsets))
+    partners = segment_ends - np.arange(len(role_ids)) - 1
+    pair_ends = np.cumsum(partners)
+
+    start = 0
+    while start < len(role_ids):
+        first_pair = pair_ends[start - 1] if start else 0
+        stop = int(np.searchsorted(pair_ends, first_pair + PAIRS_PER_BLOCK, side='right'))
+        stop = min(max(stop, start + 1), len(role_ids))
+
+        counts = partners[start:stop]
+        total = int(counts.sum())
+        if total:
+            left = np.repeat(np.arange(start, stop), counts)
+            block_starts = np.repeat(np.cumsum(counts) - counts, counts)
+            right = left + 1 + (np.arange(total) - block_starts)
+            yield role_ids[left] * role_count + role_ids[right]
+        start = stop
+
+
+def role_cooccurrence(store, incidence: tuple = None) -> tuple:
+    """
+    Counts the users holding each pair of distinct roles.
+
+    Returns:
+        (left, right, users) arrays for every pair with left < right (indexes
+        into `store.roles`); a role's own size is `len(store.members(role))`
+    """
+    offsets, role_ids = incidence or _incidence(store)
+    role_count = max(len(store.roles), 1)
+
+    if role_count * role_count <= MAX_DENSE_CELLS:
+        matrix = np.zeros(role_count * role_count, dtype=np.int64)
+        for codes in _pair_blocks(offsets, role_ids, role_count):
+            matrix += np.bincount(codes, minlength=role_count * role_count)
+        codes = np.flatnonzero(matrix)
+        counts = matrix[codes]
+    else:
+        blocks = [_group_sum(codes) for codes in _pair_blocks(offsets, role_ids, role_count)]
+        if blocks:
+            codes, counts = _group_sum(np.concatenate([codes for codes, _ in blocks]),
+                                       np.concatenate([counts for _, counts in blocks]))
+        else:
+            codes = counts = np.zeros(0, dtype=np.int64)
+
+    left, right = np.divmod(codes, role_count)
+    return left, right, counts
+
+
+def sod_violations(store, rules: list, sample_size: int = DEFAULT_SAMPLE_SIZE) -> list:
+    """
+    Finds the users holding every role of each SoD rule.
+
+    Returns:
+        One dict per rule with name, description, roles, user_count and
+        sample_users (identity attribute of the first violators)
+    """
+    violations = []
+    for rule in rules:
+        members = sorted((np.frombuffer(store.members(role), dtype=np.uint32) for role in set(rule['roles'])), key=len)
+        violators = members[0]
+        for other in members[1:]:
+            if not len(violators):
+                break
+            violators = np.intersect1d(violators, other, assume_unique=True)
+        violations.append({
+            "name": rule['name'],
+            "description": rule.get('description', ''),
+            "roles": rule['roles'],
+            "user_count": int(len(violators)),
+            "sample_users": [store.value(int(row), IDENTITY_ATTRIBUTE) for row in violators[:sample_size]]
+        })
+    return violations
+
+
+def _bucket_label(low: int, high: int) -> str:
+    if high - low == 1:
+        return str(low)
+    return f"{low}-{high - 1}"
+
+
+def role_size_distribution(store) -> dict:
+    """Member count statistics and a log-scale histogram over all roles."""
+    sizes = np.array([len(store.members(role)) for role in store.roles], dtype=np.int64)
+    if not len(sizes):
+        return {"roles": 0}
+
+    edges = ROLE_SIZE_BUCKETS + [max(int(sizes.max()) + 1, ROLE_SIZE_BUCKETS[-1] + 1)]
+    histogram, _ = np.histogram(sizes, bins=edges)
+    labels = [_bucket_label(low, high) for low, high in zip(edges[:-2], edges[1:-1])] + [f"{edges[-2]}+"]
+    return {
+        "roles": int(len(sizes)),
+        "min": int(sizes.min()),
+        "median": float(np.median(sizes)),
+        "p90": float(np.percentile(sizes, 90)),
+        "max": int(sizes.max()),
+        "histogram": {label: int(count) for label, count in zip(labels, histogram) if count}
+    }
+
+
+def roles_per_user_distribution(offsets: np.ndarray) -> dict:
+    """Statistics and histogram of the number of distinct roles each user holds."""
+    per_user = np.diff(offsets)
+    if not len(per_user):
+        return {"users": 0}
+
+    counts = np.bincount(per_user)
+    histogram = {str(k): int(n) for k, n in enumerate(counts[:MAX_LISTED_ROLES_PER_USER + 1]) if n}
+    if len(counts) > MAX_LISTED_ROLES_PER_USER + 1:
+        histogram[f"{MAX_LISTED_ROLES_PER_USER + 1}+"] = int(counts[MAX_LISTED_ROLES_PER_USER + 1:].sum())
+    return {
+        "users": int(len(per_user)),
+        "mean": round(float(per_user.mean()), 2),
+        "max": int(per_user.max()),
+        "users_without_roles": int(counts[0]),
+        "multi_role_users": int((per_user > 1).sum()),
+        "histogram": histogram
+    }
+
+
+def _sod_summary(violations: list) -> str:
+    if not violations:
+        return "No - no SoD rules are defined"
+    conflicting = [violation for violation in violations if violation['user_count']]
+    if not conflicting:
+        return f"Yes - {len(violations)} SoD rules checked, no user holds a conflicting role combination"
+    details = '; '.join(f"{v['name']} ({' + '.join(v['roles'])}): {v['user_count']} users" for v in conflicting)
+    return f"Yes - {len(violations)} SoD rules defined, {len(conflicting)} violated: {details}"
+
+
+def _multiple_roles_summary(per_user: dict) -> str:
+    if per_user.get('multi_role_users'):
+        return f"Yes - {per_user['multi_role_users']} of {per_user['users']} users hold more than one role (up to {per_user['max']})"
+    return "No - every user holds at most one role"
+
+
+def analyze_entitlements(store, rules: list = (), top_pairs: int = DEFAULT_TOP_PAIRS,
+                         sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+    """
+    Runs every analysis over `store`.
+
+    Args:
+        store: `UserStore` with the users to analyze
+        rules: SoD rules (see `load_sod_rules`)
+        top_pairs: Number of most frequent role pairs to return
+        sample_size: Number of violating users listed per SoD rule
+
+    Returns:
+        Dictionary with role_sizes, roles_per_user, top_role_pairs, sod_violations
+        and the questionnaire answers sod_summary and multiple_roles_summary
+    """
+    with span('analytics.cooccurrence'):
+        incidence = _incidence(store)
+        left, right, counts = role_cooccurrence(store, incidence)
+        top = np.argsort(-counts, kind='stable')[:top_pairs]
+    roles = store.roles
+
+    per_user = roles_per_user_distribution(incidence[0])
+    with span('analytics.sod'):
+        violations = sod_violations(store, rules, sample_size)
+    return {
+        "status": "success",
+        "user_count": len(store),
+        "role_count": len(roles),
+        "role_sizes": role_size_distribution(store),
+        "roles_per_user": per_user,
+        "cooccurring_role_pairs": int(len(counts)),
+        "top_role_pairs": [{"roles": [roles[left[i]], roles[right[i]]], "users": int(counts[i])} for i in top],
+        "sod_violations": violations,
+        "sod_summary": _sod_summary(violations),
+        "multiple_roles_summary": _multiple_roles_summary(per_user)
+    }
+
+
+def analyze_user_store(client, rules_path=None, top_pairs: int = DEFAULT_TOP_PAIRS) -> dict:
+    """
+    Runs `analyze_entitlements` over the cached user store for the client's MCP endpoint.
+
+    The analysis is cached with the store and rules it was computed from, so
+    it is only recomputed once the store is rebuilt or the rules change.
+
+    Returns:
+        The analysis, or an error status and message
+    """
+    try:
+        rules = load_sod_rules(rules_path)
+        store = get_user_store(client, fields=ANALYTICS_FIELDS)
+        key = (client.query_url, rules_path, top_pairs)
+        with _analyses_lock:
+            cached = _analyses.get(key)
+        if cached is not None and cached[0] is store and cached[1] == rules:
+            return dict(cached[2])
+        analysis = analyze_entitlements(store, rules, top_pairs)
+        with _analyses_lock:
+            _analyses[key] = (store, rules, analysis)
+        return dict(analysis)
+    except requests.exceptions.RequestException as e:
+        return {
+            "status": "error",
+            "message": f"Failed to fetch user data: {str(e)}"
+        }
+    except (OSError, ValueError) as e:
+        return {
+            "status": "error",
+            "message": f"Failed to load SoD rules: {str(e)}"
+        }
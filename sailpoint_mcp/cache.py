@@ -0,0 +1,115 @@
+"""Query result cache for the MCP client.
+
+Entries are kept in LRU order up to `max_entries` and are served without any
+network traffic for `ttl` seconds. Expired entries are not dropped straight
+away: their ETag is sent back as `If-None-Match`, and a `304 Not Modified`
+from the server renews the entry without transferring the body again.
+Concurrent identical queries are collapsed into one request (single-flight).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_TTL = float(os.environ.get('MCP_CACHE_TTL', '300'))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('MCP_CACHE_SIZE', '128'))
+
+
+class _Entry:
+    __slots__ = ('value', 'etag', 'expires_at')
+
+    def __init__(self, value, etag, expires_at):
+        self.value = value
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class _Flight:
+    """A load in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    TTL + LRU cache with single-flight loading and ETag revalidation.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'shared': 0, 'evictions': 0}
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for `key`, loading it if needed.
+
+        Args:
+            key: Hashable cache key
+            loader: Callable taking the cached ETag (or None) and returning
+                (value, etag); a value of None means the server answered 304
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry.value
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self._stats['shared'] += 1
+            return flight.value
+
+        try:
+            value, etag = loader(entry.etag if entry is not None else None)
+            with self._lock:
+                if value is None and entry is not None:
+                    value, etag = entry.value, entry.etag
+                    self._stats['revalidated'] += 1
+                else:
+                    self._stats['misses'] += 1
+                self._store(key, value, etag)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def _store(self, key, value, etag):
+        self._entries[key] = _Entry(value, etag, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
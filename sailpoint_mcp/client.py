@@ -0,0 +1,290 @@
+"""Pooled HTTP client for the MCP server's `/mcp/query` endpoint.
+
+One `MCPClient` per query URL is shared by every tool call in the process (see
+`get_client`), so requests reuse keep-alive connections from a bounded pool.
+Each call has connect/read timeouts, retries transient failures with jittered
+exponential backoff, and goes through a circuit breaker so a dead MCP pod fails
+fast instead of stalling every agent turn. Non-streaming query results are
+cached (see `cache.QueryCache`) and revalidated with ETags.
+
+Responses are negotiated as MessagePack when the `msgpack` package is
+installed (`MCP_ENCODING=json` forces JSON) and compressed with any content
+coding urllib3 can decode (gzip and deflate, plus br and zstd when `brotli`
+and `zstandard` are installed). Streams are decoded incrementally as chunks
+arrive.
+"""
+import os
+import json
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import msgpack
+except ImportError:  # optional: responses are requested as JSON without it
+    msgpack = None
+
+from agent_tracing import span
+
+from .cache import QueryCache
+
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get('MCP_CONNECT_TIMEOUT', '5'))
+DEFAULT_READ_TIMEOUT = float(os.environ.get('MCP_READ_TIMEOUT', '60'))
+DEFAULT_MAX_RETRIES = int(os.environ.get('MCP_MAX_RETRIES', '3'))
+DEFAULT_POOL_SIZE = int(os.environ.get('MCP_POOL_SIZE', '10'))
+DEFAULT_ENCODING = os.environ.get('MCP_ENCODING', 'msgpack' if msgpack is not None else 'json')
+
+MSGPACK_TYPE = 'application/x-msgpack'
+# Bytes read from the socket per step when decoding a stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Status codes worth retrying: the request may succeed against a healthy pod
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Queries whose results are small aggregates and safe to keep in the query cache
+CACHEABLE_QUERIES = {'get_user_count', 'get_role_counts', 'get_attribute_keys', 'get_user_summary'}
+
+
+class MCPError(requests.exceptions.RequestException):
+    """Raised when an MCP query fails after all retries."""
+
+
+class CircuitOpenError(MCPError):
+    """Raised without contacting the server while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls are
+    rejected for `reset_timeout` seconds. After that a single call is let
+    through as a probe while every other caller is still rejected: success
+    closes the circuit, failure re-opens it. A probe that never reports back
+    is replaced by a new one after another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        # When the half-open probe in flight was let through, None without one
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """Whether a call may go to the server; in the half-open state only the probe may."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class MCPClient:
+    """Connection-pooled MCP query client with timeouts, retries and metrics."""
+
+    def __init__(self, query_url: str,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 breaker: CircuitBreaker = None,
+                 cache: QueryCache = None,
+                 encoding: str = DEFAULT_ENCODING):
+        if encoding not in ('json', 'msgpack'):
+            raise ValueError(f"Unknown MCP encoding '{encoding}', expected 'json' or 'msgpack'")
+        if encoding == 'msgpack' and msgpack is None:
+            raise ValueError("MCP encoding 'msgpack' needs the msgpack package")
+        self.query_url = query_url
+        self.encoding = encoding
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache
+
+        # Retries are handled here rather than by urllib3 so they share the breaker and metrics
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if encoding == 'msgpack':
+            self.session.headers['Accept'] = f'{MSGPACK_TYPE}, application/json;q=0.5'
+
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def query(self, name: str, **params):
+        """Runs a query and returns the decoded JSON body, from the cache when possible."""
+        with span(f"mcp.{name}"):
+            if self.cache is None or name not in CACHEABLE_QUERIES:
+                return self._decode(self._post(name, params))
+            key = (name, json.dumps(params, sort_keys=True))
+            return self.cache.get_or_load(key, lambda etag: self.conditional_query(name, etag, **params))
+
+    def conditional_query(self, name: str, etag: str = None, **params):
+        """
+        Runs a query with `If-None-Match: etag`.
+
+        Returns:
+            (body, etag) tuple; body is None when the server answered 304 Not Modified
+        """
+        headers = {'If-None-Match': etag} if etag else None
+        response = self._post(name, params, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        return self._decode(response), response.headers.get('ETag')
+
+    def stream(self, name: str, **params):
+        """Runs a streaming query and yields each document as it is decoded (NDJSON or MessagePack)."""
+        # Times the request up to the response headers; decoding is the caller's stage
+        with span(f"mcp.{name}"):
+            response = self._post(name, params, stream=True)
+        with response:
+            if self._is_msgpack(response):
+                unpacker = msgpack.Unpacker()
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    unpacker.feed(chunk)
+                    yield from unpacker
+                return
+            for line in response.iter_lines(STREAM_CHUNK_SIZE):
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def _is_msgpack(response: requests.Response) -> bool:
+        return response.headers.get('Content-Type', '').startswith(MSGPACK_TYPE)
+
+    def _decode(self, response: requests.Response):
+        if self._is_msgpack(response):
+            return msgpack.unpackb(response.content)
+        return response.json()
+
+    def metrics(self) -> dict:
+        """Returns per-query call counts and latencies, the breaker state and cache stats."""
+        with self._metrics_lock:
+            queries = {name: dict(stats) for name, stats in self._metrics.items()}
+        for stats in queries.values():
+            stats['avg_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+            for key in ('total_ms', 'max_ms', 'last_ms', 'avg_ms'):
+                stats[key] = round(stats[key], 2)
+        return {
+            "query_url": self.query_url,
+            "circuit": self.breaker.state,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "queries": queries
+        }
+
+    def close(self):
+        self.session.close()
+
+    def _post(self, name: str, params: dict, stream: bool = False, headers: dict = None) -> requests.Response:
+        payload = dict(params, query=name)
+        attempt = 0
+
+        while True:
+            if not self.breaker.allow():
+                self._record(name, 0.0, error=True)
+                raise CircuitOpenError(f"MCP circuit open for {self.query_url}; not sending '{name}'")
+
+            start = time.perf_counter()
+            try:
+                response = self.session.post(self.query_url, json=payload, headers=headers,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # The server answered, so it is healthy even if it rejected the query
+                    self.breaker.record_success()
+                    self._record(name, time.perf_counter() - start, error=response.status_code >= 400)
+                    try:
+                        response.raise_for_status()
+                    except requests.exceptions.HTTPError:
+                        # A streamed response would hold its pooled connection until collected
+                        response.close()
+                        raise
+                    return response
+                response.close()
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} from MCP server", response=response)
+
+            self.breaker.record_failure()
+            self._record(name, time.perf_counter() - start, error=True)
+            if attempt >= self.max_retries:
+                raise MCPError(f"MCP query '{name}' failed after {attempt + 1} attempts: {error}") from error
+            self._sleep_before_retry(name, attempt)
+            attempt += 1
+
+    def _sleep_before_retry(self, name: str, attempt: int):
+        # Full jitter keeps many agents from retrying against a recovering pod in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        with self._metrics_lock:
+            self._metrics[name]['retries'] += 1
+        time.sleep(delay)
+
+    def _record(self, name: str, elapsed: float, error: bool = False):
+        elapsed_ms = elapsed * 1000
+        with self._metrics_lock:
+            stats = self._metrics.setdefault(name, {
+                'calls': 0, 'errors': 0, 'retries': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0
+            })
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['last_ms'] = elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            if error:
+                stats['errors'] += 1
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(query_url: str) -> MCPClient:
+    """
+    Returns the process-wide client for `query_url`, creating it on first use.
+
+    The client and its query cache outlive individual tool calls and agent
+    sessions, so repeated lookups within the cache TTL cost no round trip.
+    """
+    with _clients_lock:
+        client = _clients.get(query_url)
+        if client is None:
+            client = _clients[query_url] = MCPClient(query_url, cache=QueryCache())
+        return client
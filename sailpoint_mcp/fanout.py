@@ -0,0 +1,137 @@
+"""asyncio fan-out over many MCP endpoints.
+
+Onboarding dozens of applications means querying dozens of MCP servers.
+`AsyncMCPClient` runs queries for any number of endpoints concurrently under
+a global limit and a per-host limit, so the total time approaches that of the
+slowest endpoint instead of the sum. Each call goes through the process-wide
+pooled `MCPClient` for its URL (see `get_client`) on a dedicated thread pool,
+keeping its timeouts, retries, circuit breaker and query cache.
+
+`discover_endpoints` uses it to collect the count, schema and entitlements
+of every endpoint in a list and consolidates them into one result.
+"""
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from .aggregates import fetch_user_summary
+from .client import get_client
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get('MCP_MAX_CONCURRENCY', '32'))
+DEFAULT_MAX_PER_HOST = int(os.environ.get('MCP_MAX_PER_HOST', '4'))
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class AsyncMCPClient:
+    """
+    Awaitable MCP queries with bounded concurrency, globally and per host.
+
+    Use as an async context manager, or call `close` when done, to release
+    the worker threads.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='mcp-fanout')
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts = {}
+
+    async def __aenter__(self) -> 'AsyncMCPClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _host_limit(self, query_url: str) -> asyncio.Semaphore:
+        host = urlsplit(query_url).netloc
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def call(self, query_url: str, fn, *args, **kwargs):
+        """Runs `fn(client, *args, **kwargs)` with the pooled client for `query_url`, within the limits."""
+        async with self._host_limit(query_url), self._global:
+            loop = asyncio.get_running_loop()
+            # Like asyncio.to_thread, run in a copy of the task's context so the call is traced as part of it
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, context.run,
+                                              lambda: fn(get_client(query_url), *args, **kwargs))
+
+    async def query(self, query_url: str, name: str, **params):
+        """Runs one MCP query and returns the decoded JSON body."""
+        return await self.call(query_url, lambda client: client.query(name, **params))
+
+
+def _endpoint(endpoint) -> dict:
+    if isinstance(endpoint, str):
+        return {"name": urlsplit(endpoint).netloc or endpoint, "mcp_url": endpoint}
+    return {"name": endpoint.get("name") or urlsplit(endpoint["mcp_url"]).netloc, "mcp_url": endpoint["mcp_url"]}
+
+
+async def _discover(client: AsyncMCPClient, endpoint: dict) -> dict:
+    start = time.perf_counter()
+    try:
+        summary = await client.call(endpoint["mcp_url"], fetch_user_summary)
+    except requests.exceptions.RequestException as e:
+        return {**endpoint, "status": "error", "elapsed_ms": _elapsed_ms(start),
+                "message": f"Failed to fetch user data: {str(e)}"}
+    except Exception as e:
+        # A malformed answer from one endpoint must not cost the others' results
+        return {**endpoint, "status": "error", "elapsed_ms": _elapsed_ms(start),
+                "message": f"Invalid response from MCP server: {type(e).__name__}: {str(e)}"}
+    return {**endpoint, **summary, "elapsed_ms": _elapsed_ms(start)}
+
+
+async def discover_endpoints(endpoints: list, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                             max_per_host: int = DEFAULT_MAX_PER_HOST) -> dict:
+    """
+    Discovers the user count, schema and entitlements of many MCP endpoints concurrently.
+
+    Args:
+        endpoints: MCP query URLs, or dicts with mcp_url and an optional name
+        max_concurrency: Queries in flight across all endpoints
+        max_per_host: Queries in flight per MCP host
+
+    Returns:
+        Dictionary with status (success, partial or error), totals across the
+        endpoints that answered, elapsed_ms and slowest_ms, and one result per
+        endpoint in input order
+    """
+    endpoints = [_endpoint(endpoint) for endpoint in endpoints]
+    start = time.perf_counter()
+    async with AsyncMCPClient(max_concurrency, max_per_host) as client:
+        results = await asyncio.gather(*(_discover(client, endpoint) for endpoint in endpoints))
+
+    succeeded = [result for result in results if result["status"] == "success"]
+    role_endpoints = {}
+    for result in succeeded:
+        for role in result["entitlements"]:
+            role_endpoints[role] = role_endpoints.get(role, 0) + 1
+    failed = len(results) - len(succeeded)
+
+    return {
+        "status": "success" if not failed else "error" if not succeeded else "partial",
+        "endpoints": len(results),
+        "succeeded": len(succeeded),
+        "failed": failed,
+        "total_users": sum(result["user_count"] for result in succeeded),
+        "distinct_roles": len(role_endpoints),
+        "shared_roles": sorted(role for role, count in role_endpoints.items() if count > 1),
+        "elapsed_ms": _elapsed_ms(start),
+        "slowest_ms": max((result["elapsed_ms"] for result in results), default=0.0),
+        "results": results
+    }
@@ -0,0 +1,141 @@
+"""The SailPoint onboarding data both agents and the headless job runner produce.
+
+`fetch_form_data` is what the Excel questionnaire is filled from, and
+`build_onboarding_form` the JSON onboarding form. Both are deterministic, so
+they run the same with or without a model deciding to call them.
+"""
+import os
+
+from agent_tracing import span
+
+from .analytics import analyze_user_store
+from .users import fetch_user_data, profile_user_schema
+
+# Users profiled for the form's schema mapping (0 profiles every user)
+PROFILE_SAMPLE_SIZE = int(os.environ.get('MCP_PROFILE_SAMPLE_SIZE', '10000'))
+
+# Connection details of the MongoDB application being onboarded
+MONGODB_CONNECTION = {
+    "host": "34.172.211.78",
+    "port": 27017,
+    "database": "app_auth",
+    "connection_string": "mongodb://34.172.211.78:27017/app_auth"
+}
+
+
+def connection_details(connection_info: dict) -> dict:
+    """
+    The form's connection_details section for an application's database.
+
+    Args:
+        connection_info: host, port and database, plus connection_string
+            (defaults to mongodb://host:port/database)
+    """
+    connection_string = (connection_info.get("connection_string")
+                         or f"mongodb://{connection_info['host']}:{connection_info['port']}/{connection_info['database']}")
+    return {
+        "connector_type": "JDBC Connector",
+        "host": connection_info["host"],
+        "port": connection_info["port"],
+        "database": connection_info["database"],
+        "jdbc_url": connection_string,
+        "authentication": "No authentication (development environment)"
+    }
+
+
+def fetch_form_data(client) -> dict:
+    """
+    Returns the summary the Excel form needs plus entitlement analytics (SoD, role counts per user).
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+
+    Returns:
+        The `fetch_user_data` summary with an `analytics` entry, or an error status and message
+    """
+    data = fetch_user_data(client, include_users=False)
+    if data["status"] == "error":
+        return data
+    analytics = analyze_user_store(client)
+    if analytics["status"] == "error":
+        return analytics
+    return {**data, "analytics": analytics}
+
+
+def build_onboarding_form(client, connection_info: dict = None, sample_size: int = None) -> dict:
+    """
+    Generates the complete SailPoint application onboarding form with all required fields.
+
+    The schema mapping comes from a profile of a random sample of users, so
+    the form costs the same whatever the size of the collection.
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+        connection_info: host, port, database and optionally connection_string
+            of the application's database (defaults to MONGODB_CONNECTION)
+        sample_size: Users to profile (defaults to PROFILE_SAMPLE_SIZE; 0 profiles every user)
+
+    Returns:
+        Dictionary with status and sailpoint_onboarding_form, or an error status and message
+    """
+    connection_info = connection_info or MONGODB_CONNECTION
+    with span('fetch_user_data'):
+        user_data = fetch_user_data(client, include_users=False)
+    if user_data["status"] == "error":
+        return user_data
+
+    with span('profile_schema'):
+        sample_size = PROFILE_SAMPLE_SIZE if sample_size is None else sample_size
+        profile = profile_user_schema(client, sample_size=sample_size or None)
+    if profile["status"] == "error":
+        return profile
+    entitlement_profile = profile["attributes"].get(profile["entitlement_attribute"], {})
+
+    sailpoint_form = {
+        "application_details": {
+            "application_name": "MongoDB Authorization App",
+            "application_owner": "IT Security Team",
+            "description": "Application using MongoDB for user authorization and role management",
+            "application_type": "Directly Connected"
+        },
+        "connection_details": connection_details(connection_info),
+        "schema_mapping": {
+            "identity_attribute": profile["identity_attribute"],
+            "display_attribute": profile["display_attribute"],
+            "account_attributes": list(profile["attributes"]),
+            "attribute_types": {
+                name: {
+                    "types": list(attribute["types"]),
+                    "multi_valued": attribute["multi_valued"],
+                    "null_rate": attribute["null_rate"],
+                    "approx_distinct": attribute["distinct"]
+                }
+                for name, attribute in profile["attributes"].items()
+            },
+            "entitlement_attribute": profile["entitlement_attribute"]
+        },
+        "entitlements": {
+            "discovered_roles": user_data["entitlements"],
+            "role_member_counts": user_data.get("role_counts", {}),
+            "entitlement_type": "Multi-valued attribute" if entitlement_profile.get("multi_valued") else "Single-valued attribute"
+        },
+        "account_correlation": {
+            "correlation_rule": f"Match by {profile['display_attribute']}",
+            "correlation_attribute": profile["display_attribute"]
+        },
+        "provisioning_policy": {
+            "create_account": "Enabled",
+            "update_account": "Enabled",
+            "delete_account": "Enabled",
+            "manage_entitlements": "Enabled"
+        },
+        "aggregation_info": {
+            "total_accounts": user_data["user_count"],
+            "sample_accounts": user_data["sample_users"]
+        }
+    }
+
+    return {
+        "status": "success",
+        "sailpoint_onboarding_form": sailpoint_form
+    }
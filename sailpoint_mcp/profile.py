@@ -0,0 +1,267 @@
+"""Single-pass, bounded-memory schema profiling of user documents.
+
+`SchemaProfiler` looks at every document once (or at a reservoir sample of
+them) and keeps, per attribute:
+
+- how many documents have it and how many of those are null
+- the JSON types observed (str, int, float, bool, list, dict, null)
+- whether it is multi-valued (a list) and the longest list seen
+- the number of distinct values (list elements for multi-valued
+  attributes): exact up to EXACT_DISTINCT_LIMIT values, then estimated by a
+  HyperLogLog sketch of 2**HLL_PRECISION registers (about 0.8% error)
+- how many string values look like email addresses, and a few examples
+
+Memory per attribute is a few kilobytes regardless of the number of users.
+`choose_attributes` picks the identity, display and entitlement attributes
+for the SailPoint schema mapping from the profile.
+"""
+import math
+import random
+
+from .stream import DISPLAY_ATTRIBUTE, IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE
+
+HLL_PRECISION = 14
+EXACT_DISTINCT_LIMIT = 1024
+MAX_EXAMPLES = 3
+
+# Share of profiled users that must have a non-null, distinct value for an
+# attribute to qualify as the identity attribute (leaves room for sketch error)
+IDENTITY_MIN_COVERAGE = 0.95
+
+IDENTITY_HINTS = ('userid', 'username', 'login', 'uid', 'employeeid', 'accountid', 'samaccountname', 'id')
+DISPLAY_HINTS = ('email', 'mail', 'displayname', 'name')
+ENTITLEMENT_HINTS = ('roles', 'role', 'groups', 'entitlements', 'permissions', 'memberof')
+
+_MASK64 = (1 << 64) - 1
+
+
+def _json_type(kind: type) -> str:
+    return 'null' if kind is type(None) else kind.__name__
+
+
+def _hash64(value) -> int:
+    # hash() is stable within a process, which is all a single-pass sketch needs
+    if type(value) is str:
+        # SipHash output is already uniform
+        return hash(value) & _MASK64
+    if not isinstance(value, (int, float, bool, type(None))):
+        value = repr(value)
+    # The type name keeps 1, 1.0 and True apart from each other and from strings
+    h = hash((type(value).__name__, value)) & _MASK64
+    # splitmix64 finalizer spreads the tuple hash over all 64 bits
+    h = ((h ^ (h >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    h = ((h ^ (h >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return h ^ (h >> 31)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch with 2**precision one-byte registers."""
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add_hash(self, h: int) -> None:
+        index = h >> (64 - self.precision)
+        rest = (h << self.precision) & _MASK64
+        # Position of the first 1 bit after the index bits
+        rank = 65 - rest.bit_length() if rest else 65 - self.precision
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value) -> None:
+        self.add_hash(_hash64(value))
+
+    def __len__(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class _DistinctCounter:
+    """Exact distinct count while small, HyperLogLog estimate after EXACT_DISTINCT_LIMIT values."""
+
+    __slots__ = ('_exact', '_sketch')
+
+    def __init__(self):
+        self._exact = set()
+        self._sketch = None
+
+    def add(self, value) -> None:
+        h = _hash64(value)
+        if self._sketch is not None:
+            self._sketch.add_hash(h)
+            return
+        self._exact.add(h)
+        if len(self._exact) > EXACT_DISTINCT_LIMIT:
+            self._sketch = HyperLogLog()
+            for known in self._exact:
+                self._sketch.add_hash(known)
+            self._exact = None
+
+    @property
+    def exact(self) -> bool:
+        return self._sketch is None
+
+    def __len__(self) -> int:
+        return len(self._exact) if self._sketch is None else len(self._sketch)
+
+
+class _AttributeProfile:
+    __slots__ = ('present', 'nulls', 'types', 'lists', 'max_values', 'distinct', 'emails', 'examples')
+
+    def __init__(self):
+        self.present = 0
+        self.nulls = 0
+        self.types = {}
+        self.lists = 0
+        self.max_values = 0
+        self.distinct = _DistinctCounter()
+        self.emails = 0
+        self.examples = []
+
+    def add(self, value) -> None:
+        self.present += 1
+        kind = type(value)
+        self.types[kind] = self.types.get(kind, 0) + 1
+        if kind is list:
+            self.lists += 1
+            if len(value) > self.max_values:
+                self.max_values = len(value)
+            for item in value:
+                self._add_value(repr(item) if isinstance(item, (list, dict)) else item)
+        elif value is None:
+            self.nulls += 1
+        else:
+            self._add_value(repr(value) if kind is dict else value)
+
+    def _add_value(self, value) -> None:
+        self.distinct.add(value)
+        if type(value) is str and '@' in value:
+            self.emails += 1
+        if len(self.examples) < MAX_EXAMPLES and value not in self.examples:
+            self.examples.append(value)
+
+    def result(self, profiled: int) -> dict:
+        return {
+            "present": self.present,
+            "presence_rate": round(self.present / profiled, 4) if profiled else 0.0,
+            "null_rate": round(self.nulls / self.present, 4) if self.present else 0.0,
+            "types": {_json_type(kind): count for kind, count in sorted(self.types.items(), key=lambda item: -item[1])},
+            "multi_valued": self.lists > 0,
+            "max_values": self.max_values,
+            "distinct": len(self.distinct),
+            "distinct_exact": self.distinct.exact,
+            "email_like": self.emails > 0 and self.emails >= (self.present - self.nulls) // 2,
+            "examples": self.examples
+        }
+
+
+class SchemaProfiler:
+    """
+    Accumulates an attribute profile over user documents in one pass.
+
+    With `sample_size`, only a uniform reservoir sample of that many documents
+    is profiled (Algorithm R), so memory stays bounded by the sample; the
+    total number of documents seen is still reported.
+    """
+
+    def __init__(self, sample_size: int = None, seed: int = None):
+        self.sample_size = sample_size
+        self.seen = 0
+        self._attributes = {}
+        self._reservoir = [] if sample_size else None
+        self._random = random.Random(seed)
+
+    def add(self, user: dict) -> None:
+        self.seen += 1
+        if self._reservoir is None:
+            self._profile(user)
+        elif len(self._reservoir) < self.sample_size:
+            self._reservoir.append(user)
+        else:
+            position = self._random.randrange(self.seen)
+            if position < self.sample_size:
+                self._reservoir[position] = user
+
+    def add_all(self, users) -> 'SchemaProfiler':
+        for user in users:
+            self.add(user)
+        return self
+
+    def _profile(self, user: dict) -> None:
+        for attribute, value in user.items():
+            profile = self._attributes.get(attribute)
+            if profile is None:
+                profile = self._attributes[attribute] = _AttributeProfile()
+            profile.add(value)
+
+    def result(self) -> dict:
+        """
+        Returns:
+            Dictionary with user_count (documents seen), profiled, sampled,
+            attributes ({name: profile}, in first-seen order) and the chosen
+            identity, display and entitlement attributes
+        """
+        if self._reservoir is not None:
+            for user in self._reservoir:
+                self._profile(user)
+            self._reservoir = []
+        profiled = min(self.seen, self.sample_size) if self.sample_size else self.seen
+        attributes = {name: profile.result(profiled) for name, profile in self._attributes.items()}
+        return {
+            "user_count": self.seen,
+            "profiled": profiled,
+            "sampled": profiled < self.seen,
+            "attributes": attributes,
+            **choose_attributes(attributes, profiled)
+        }
+
+
+def _hint_rank(name: str, hints: tuple) -> int:
+    key = name.lower().replace('_', '')
+    return hints.index(key) if key in hints else len(hints)
+
+
+def choose_attributes(attributes: dict, profiled: int) -> dict:
+    """
+    Picks the SailPoint schema attributes from attribute profiles.
+
+    - identity: a scalar present, non-null and distinct on (nearly) every user,
+      preferring id-like names over `_id`
+    - display: an email-like attribute, else a display-like name, else identity
+    - entitlement: a multi-valued string attribute, preferring role/group-like names
+
+    Falls back to the defaults (userId, email, roles) when nothing qualifies.
+    """
+    def coverage(profile):
+        return min(profile['distinct'], profile['present'] * (1 - profile['null_rate'])) / profiled if profiled else 0.0
+
+    scalar = {name: p for name, p in attributes.items() if not p['multi_valued'] and set(p['types']) <= {'str', 'int'}}
+    unique = [name for name, p in scalar.items() if coverage(p) >= IDENTITY_MIN_COVERAGE]
+    identity = min(unique, key=lambda name: (name == '_id', scalar[name]['email_like'], _hint_rank(name, IDENTITY_HINTS))) if unique else None
+    if identity is None:
+        identity = IDENTITY_ATTRIBUTE
+
+    emails = [name for name, p in scalar.items() if p['email_like'] and name != identity]
+    named = [name for name in scalar if name != identity and _hint_rank(name, DISPLAY_HINTS) < len(DISPLAY_HINTS)]
+    display = min(emails or named, key=lambda name: _hint_rank(name, DISPLAY_HINTS)) if emails or named else None
+    if display is None:
+        display = DISPLAY_ATTRIBUTE if DISPLAY_ATTRIBUTE in attributes or not attributes else identity
+
+    multi = [name for name, p in attributes.items()
+             if p['multi_valued'] and set(p['types']) <= {'list', 'str', 'null'}]
+    entitlement = min(multi, key=lambda name: _hint_rank(name, ENTITLEMENT_HINTS)) if multi else ROLE_ATTRIBUTE
+
+    return {
+        "identity_attribute": identity,
+        "display_attribute": display,
+        "entitlement_attribute": entitlement
+    }
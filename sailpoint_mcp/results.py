@@ -0,0 +1,258 @@
+"""Size-budgeted agent tool results with paging handles.
+
+Everything a tool returns is serialized into the model's context, so a
+result listing every user makes each turn slow and, past a few thousand
+users, fails outright. `budgeted` wraps a tool so its result fits
+`TOOL_RESULT_BUDGET` bytes of JSON (roughly 4 bytes per token):
+
+- results within the budget are returned unchanged
+- otherwise the largest collections (lists, dicts, `LazyItems`) are cut to
+  a head that fits, largest first, until the whole result fits
+- each cut collection is kept in process under a handle, and the result
+  gets a `truncated` entry per cut collection:
+  {"users": {"total": 5000, "returned": 40, "handle": "res_1a2b3c4d5e6f",
+  "next_offset": 40}}
+
+`result_page(handle, offset)` (the `get_result_page` tool) returns the next
+items of a handle, again within the budget. Handles expire after
+`TOOL_RESULT_HANDLE_TTL` seconds; the least recently used are dropped beyond
+`TOOL_RESULT_HANDLES`.
+"""
+import os
+import json
+import time
+import inspect
+import secrets
+import functools
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from agent_tracing import span
+
+DEFAULT_BUDGET = int(os.environ.get('TOOL_RESULT_BUDGET', '24000'))
+DEFAULT_HANDLE_TTL = float(os.environ.get('TOOL_RESULT_HANDLE_TTL', '1800'))
+DEFAULT_MAX_HANDLES = int(os.environ.get('TOOL_RESULT_HANDLES', '64'))
+
+# Collections with at most this many items are never cut
+MIN_PAGED_ITEMS = 5
+# Bytes kept free for the truncated entries added to a shaped result
+TRUNCATION_RESERVE = 512
+
+
+class LazyItems(Sequence):
+    """
+    Read-only sequence whose items are produced on access, e.g. users rebuilt
+    from a `UserStore`. A shaped result materializes only the returned head.
+    """
+
+    def __init__(self, length: int, item):
+        self._length = length
+        self._item = item
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._item(index)
+
+
+def _size(value) -> int:
+    return len(json.dumps(value, default=lambda item: [] if isinstance(item, LazyItems) else str(item)))
+
+
+class ResultPages:
+    """Handles for collections cut from tool results, in LRU order with a TTL."""
+
+    def __init__(self, ttl: float = DEFAULT_HANDLE_TTL, max_handles: int = DEFAULT_MAX_HANDLES):
+        self.ttl = ttl
+        self.max_handles = max_handles
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, collection) -> str:
+        handle = f"res_{secrets.token_hex(6)}"
+        with self._lock:
+            self._entries[handle] = (collection, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_handles:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: str):
+        """The collection behind `handle`, or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[handle]
+                return None
+            self._entries.move_to_end(handle)
+            return entry[0]
+
+
+_pages = ResultPages()
+
+
+def _head(collection, offset: int, max_bytes: int, limit: int = None) -> tuple:
+    """
+    Returns (head, count): the items from `offset` whose JSON fits `max_bytes`
+    (at least one), as the collection's own type, and how many were taken.
+    """
+    items = list(collection.items()) if isinstance(collection, dict) else collection
+    end = len(items) if limit is None else min(len(items), offset + limit)
+    used = 2
+    # Kept as measured, so `LazyItems` are not built a second time
+    head = []
+    for index in range(offset, end):
+        item = items[index]
+        used += _size(dict([item]) if isinstance(collection, dict) else item) + 2
+        if used > max_bytes and head:
+            break
+        head.append(item)
+    return (dict(head) if isinstance(collection, dict) else head), len(head)
+
+
+def _collections(value: dict, path=()):
+    """
+    Yields (path, container, key, collection) for every pageable collection in
+    `value`, descending into nested dicts but not into list items.
+    """
+    for key, child in value.items():
+        if isinstance(child, (dict, list, LazyItems)) and len(child) > MIN_PAGED_ITEMS:
+            yield path + (key,), value, key, child
+        if isinstance(child, dict):
+            yield from _collections(child, path + (key,))
+
+
+def _copy(value):
+    """Copies the dicts and lists of a result, so cutting never touches the tool's own data."""
+    if isinstance(value, dict):
+        return {key: _copy(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [_copy(child) for child in value]
+    if isinstance(value, LazyItems) and len(value) <= MIN_PAGED_ITEMS:
+        return list(value)
+    return value
+
+
+def _has_lazy(value) -> bool:
+    if isinstance(value, LazyItems):
+        return True
+    children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    return any(_has_lazy(child) for child in children)
+
+
+def shape_result(result: dict, budget: int = None) -> dict:
+    """
+    Cuts the largest collections in `result` until its JSON fits `budget` bytes.
+
+    `LazyItems` are always cut, since materializing them is what they avoid;
+    they get whatever the rest of the result leaves of the budget.
+
+    Returns:
+        `result` itself when nothing had to be cut, otherwise a shaped copy with
+        a `truncated` entry ({path: total, returned, handle, next_offset}) and
+        `budget_exceeded` when even the cut result does not fit
+    """
+    budget = budget or DEFAULT_BUDGET
+    if not _has_lazy(result) and _size(result) <= budget:
+        return result
+
+    shaped = _copy(result)
+    truncated = {}
+    while True:
+        # Sizes count uncut LazyItems as empty
+        total = _size(shaped)
+        reserve = TRUNCATION_RESERVE * (len(truncated) + 1)
+        candidates = [(path, container, key, collection)
+                      for path, container, key, collection in _collections(shaped)
+                      if '.'.join(map(str, path)) not in truncated]
+        lazy = [candidate for candidate in candidates if isinstance(candidate[3], LazyItems)]
+        if lazy:
+            path, container, key, collection = lazy[0]
+            allowed = max(budget - total - reserve, budget // 8)
+        elif candidates and total > budget - reserve + TRUNCATION_RESERVE:
+            path, container, key, collection = max(candidates, key=lambda candidate: _size(candidate[3]))
+            allowed = max(_size(collection) - (total - budget) - reserve, budget // 8)
+        else:
+            break
+        head, count = _head(collection, 0, allowed)
+        container[key] = head
+        truncated['.'.join(map(str, path))] = {
+            "total": len(collection),
+            "returned": count,
+            "handle": _pages.register(collection),
+            "next_offset": count if count < len(collection) else None
+        }
+
+    if truncated:
+        shaped["truncated"] = truncated
+    if _size(shaped) > budget:
+        shaped["budget_exceeded"] = True
+    return shaped
+
+
+def result_page(handle: str, offset: int = 0, limit: int = None, budget: int = None) -> dict:
+    """
+    Returns items of a collection cut from an earlier tool result.
+
+    Args:
+        handle: Handle from the result's `truncated` entry
+        offset: Index of the first item to return (the entry's next_offset)
+        limit: Maximum number of items; as many as fit the budget when None
+        budget: Byte budget for the page (TOOL_RESULT_BUDGET when None)
+
+    Returns:
+        Dictionary with status, handle, offset, total, items and next_offset
+        (None after the last item), or an error status and message
+    """
+    collection = _pages.get(handle)
+    if collection is None:
+        return {
+            "status": "error",
+            "message": f"Unknown or expired result handle: {handle}"
+        }
+    if not 0 <= offset <= len(collection):
+        return {
+            "status": "error",
+            "message": f"Offset {offset} is outside the {len(collection)} items of {handle}"
+        }
+    items, count = _head(collection, offset, (budget or DEFAULT_BUDGET) - TRUNCATION_RESERVE, limit)
+    return {
+        "status": "success",
+        "handle": handle,
+        "offset": offset,
+        "total": len(collection),
+        "items": items,
+        "next_offset": offset + count if offset + count < len(collection) else None
+    }
+
+
+def budgeted(tool):
+    """
+    Decorates an agent tool (sync or async) so its result is shaped by `shape_result`.
+
+    Apply it outside `agent_tracing.traced`, so the budget also covers the
+    timings (and profiles) tracing adds to the result.
+    """
+    if inspect.iscoroutinefunction(tool):
+        @functools.wraps(tool)
+        async def wrapper(*args, **kwargs):
+            result = await tool(*args, **kwargs)
+            with span('shape_result'):
+                return shape_result(result)
+    else:
+        @functools.wraps(tool)
+        def wrapper(*args, **kwargs):
+            result = tool(*args, **kwargs)
+            with span('shape_result'):
+                return shape_result(result)
+    return wrapper
+
@@ -0,0 +1,168 @@
+"""Deterministic fast path for the agents' canonical requests.
+
+Requests like "fill the Excel form" always end in the same tool call with no
+arguments, yet each one costs at least one model round trip to get there.
+An `IntentRouter` runs in front of the agent (as its ADK
+`before_agent_callback`): it matches the user's whole message against each
+route's patterns and, on a match, calls the route's tool and answers with its
+result directly. Anything else, including canonical requests with extra
+qualifiers ("fill the form using template X"), goes to the model unchanged.
+
+Patterns are matched case-insensitively against the complete message after
+polite wrapping ("please", "can you", trailing punctuation) is removed, so a
+match is never a guess. Named groups are passed to the handler as keyword
+arguments. Every request is counted per intent, or as "model" on fallback;
+`stats()` reports the hit rate, and the counts are exported with the tool
+metrics (see `agent_tracing/export.py`).
+"""
+import re
+import json
+import threading
+from collections import Counter
+
+from agent_tracing import add_collector
+
+# Intent recorded for requests left to the model
+MODEL_INTENT = 'model'
+
+# Canonical requests named in the agents' instructions
+FILL_FORM = (r"(fill|complete|populate)( out| in)?( the| an?| my)?( sailpoint)?( onboarding)?( excel)?"
+             r"( form| questionnaire| spreadsheet| workbook)( out| in)?")
+_READ_FORM = r"(read|show|open|display|load)( me)?( the)?( filled)?( excel)?( onboarding)?( form| file| workbook)?( at| from| in)? "
+# A path with spaces has to be quoted
+READ_FORM = (_READ_FORM + r"(?P<file_path>\S+\.xls[xm])",
+             _READ_FORM + r"[\"'`](?P<file_path>[^\"'`]+\.xls[xm])[\"'`]")
+RAW_DATA = (r"(show|get|fetch|give)( me)?( the| all)?( raw)?( mongodb| user| sailpoint| mcp)?( data| users)"
+            r"( and( the)? schema( information)?)?( from( the)? (mcp|mongodb)( server)?)?")
+ONBOARDING_FORM = (r"(generate|prepare|create|produce|build)( me)?( the| an?)?( complete)?( sailpoint)?"
+                   r"( application)? onboarding form")
+CONNECTION_INFO = r"what are the( mongodb| database)? connection details( for the( mongodb)? database)?"
+
+POLITE_PREFIX_RE = re.compile(r"^((please|kindly|can you|could you|would you)\s+)+", re.IGNORECASE)
+POLITE_SUFFIX_RE = re.compile(r"(\s+(please|for me|now))+$", re.IGNORECASE)
+TRAILING_PUNCTUATION_RE = re.compile(r"[\s.!?]+$")
+
+
+def normalize_request(text: str) -> str:
+    """The request with whitespace collapsed and polite wrapping and trailing punctuation removed."""
+    text = TRAILING_PUNCTUATION_RE.sub('', ' '.join(str(text).split()))
+    text = POLITE_SUFFIX_RE.sub('', POLITE_PREFIX_RE.sub('', text))
+    return TRAILING_PUNCTUATION_RE.sub('', text)
+
+
+def format_response(result) -> str:
+    """Renders a tool result as the agent's reply: its message, then the result as JSON."""
+    if not isinstance(result, dict):
+        return str(result)
+    if result.get("status") == "error":
+        return f"Error: {result.get('message', 'the request failed')}"
+    body = json.dumps({key: value for key, value in result.items() if key != "message"}, indent=2, default=str)
+    message = result.get("message")
+    return f"{message}\n\n```json\n{body}\n```" if message else f"```json\n{body}\n```"
+
+
+class Route:
+    """An intent: its name, the patterns of its canonical requests and the handler that answers them."""
+
+    def __init__(self, intent: str, patterns, handler):
+        self.intent = intent
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in
+                         ([patterns] if isinstance(patterns, str) else patterns)]
+        self.handler = handler
+
+    def match(self, text: str):
+        """Returns the keyword arguments of the handler when `text` is a canonical request, else None."""
+        for pattern in self.patterns:
+            match = pattern.fullmatch(text)
+            if match:
+                return {key: value for key, value in match.groupdict().items() if value is not None}
+        return None
+
+
+_routers = []
+_routers_lock = threading.Lock()
+
+
+class IntentRouter:
+    """Answers canonical requests by calling their tool directly; counts hits per intent."""
+
+    def __init__(self, agent_name: str, routes: list):
+        self.agent_name = agent_name
+        self.routes = routes
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        with _routers_lock:
+            _routers.append(self)
+
+    def _count(self, intent: str) -> None:
+        with self._lock:
+            self._counts[intent] += 1
+
+    def route(self, text: str):
+        """
+        Handles `text` when it is a canonical request.
+
+        Returns:
+            (intent, tool result), or None when the model should answer
+        """
+        normalized = normalize_request(text or '')
+        for route in self.routes:
+            kwargs = route.match(normalized)
+            if kwargs is None:
+                continue
+            try:
+                result = route.handler(**kwargs)
+            except Exception:
+                # The model can still answer, with the tools it would have used anyway
+                break
+            self._count(route.intent)
+            return route.intent, result
+        self._count(MODEL_INTENT)
+        return None
+
+    def before_agent_callback(self, callback_context):
+        """
+        ADK `before_agent_callback`: answers canonical requests without invoking the model.
+
+        Returns:
+            The reply as `google.genai.types.Content`, or None to let the agent run
+        """
+        content = getattr(callback_context, 'user_content', None)
+        text = ''.join(part.text or '' for part in (content.parts or [])) if content is not None else ''
+        routed = self.route(text)
+        if routed is None:
+            return None
+        from google.genai import types
+        return types.Content(role='model', parts=[types.Part(text=format_response(routed[1]))])
+
+    def stats(self) -> dict:
+        """Requests seen, requests answered by the fast path, the hit rate and hits per intent."""
+        with self._lock:
+            counts = dict(self._counts)
+        requests = sum(counts.values())
+        hits = requests - counts.get(MODEL_INTENT, 0)
+        return {
+            "requests": requests,
+            "hits": hits,
+            "hit_rate": round(hits / requests, 4) if requests else 0.0,
+            "intents": {intent: count for intent, count in counts.items() if intent != MODEL_INTENT}
+        }
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+def _prometheus_lines() -> list:
+    with _routers_lock:
+        routers = list(_routers)
+    lines = ['# HELP agent_fastpath_requests_total User requests by the intent that answered them '
+             f'("{MODEL_INTENT}" when the model was called).',
+             '# TYPE agent_fastpath_requests_total counter']
+    for router in routers:
+        for intent, count in sorted(router.counts().items()):
+            lines.append(f'agent_fastpath_requests_total{{agent="{router.agent_name}",intent="{intent}"}} {count}')
+    return lines
+
+
+add_collector(_prometheus_lines)
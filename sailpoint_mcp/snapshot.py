@@ -0,0 +1,295 @@
+"""Local on-disk snapshot of the MCP users collection, kept current by delta sync.
+
+Re-streaming every user on each run costs time proportional to the collection
+size even when nothing changed. `UserSnapshot` keeps the users in a SQLite
+file per MCP endpoint (under `MCP_SNAPSHOT_DIR`) together with a watermark,
+and `sync` only transfers what changed since then:
+
+1. `stream_user_changes` returns the users inserted after the newest known
+   `_id` or with `updatedAt` at or after the newest known `updatedAt`
+2. the changes are upserted; per-role and per-attribute user counts are
+   adjusted by the difference between the old and new document, so the
+   summary never needs a scan
+3. `get_sync_state` returns the server's user count. A mismatch means users
+   were deleted (or inserted with out-of-order ids), and only then are the
+   ids compared via `stream_user_ids` and the difference fetched or dropped
+
+A sync that changes nothing therefore costs two small round trips. Updates
+are only seen if the writer maintains `updatedAt` (a Date) on user documents.
+
+The first sync copies every user document, which costs far more than the
+aggregate queries a one-off summary needs, so snapshots are opt-in: set
+`MCP_SNAPSHOT_DIR` (or pass `--snapshot-dir` to `onboarding_jobs.py`) where
+the same endpoints are read repeatedly.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from pathlib import Path
+
+import requests
+
+from agent_tracing import span
+
+from .stream import DEFAULT_SAMPLE_SIZE, DISPLAY_ATTRIBUTE, IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE
+
+# Empty (the default) disables the snapshot: summaries come from aggregate queries
+# and user lists are streamed
+DEFAULT_SNAPSHOT_DIR = os.environ.get('MCP_SNAPSHOT_DIR', '')
+
+ID_ATTRIBUTE = '_id'
+UPDATED_ATTRIBUTE = 'updatedAt'
+
+# Ids per stream_user_changes request when fetching missing users
+FETCH_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS roles (role TEXT PRIMARY KEY, users INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS attributes (name TEXT PRIMARY KEY, users INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _is_object_id(value) -> bool:
+    return isinstance(value, str) and len(value) == 24 and all(c in '0123456789abcdef' for c in value)
+
+
+def _user_roles(user: dict) -> set:
+    roles = user.get(ROLE_ATTRIBUTE)
+    if isinstance(roles, str):
+        return {roles}
+    return set(roles or ())
+
+
+class UserSnapshot:
+    """SQLite copy of one MCP endpoint's users with incrementally maintained counts."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _meta(self, key: str, default=None):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    @property
+    def version(self) -> int:
+        """Incremented by every sync that changed the snapshot."""
+        return self._meta('version', 0)
+
+    @property
+    def watermark(self) -> dict:
+        """{'after_id', 'since'}: the newest `_id` and `updatedAt` in the snapshot."""
+        return self._meta('watermark', {'after_id': None, 'since': None})
+
+    @property
+    def last_sync(self) -> dict:
+        """Statistics of the most recent sync."""
+        return self._meta('last_sync', {})
+
+    def __len__(self) -> int:
+        return self._meta('user_count', 0)
+
+    def _apply(self, users, deltas: dict, watermark: dict) -> int:
+        """Upserts `users`, accumulating role/attribute count changes into `deltas`."""
+        changed = 0
+        for user in users:
+            user_id = user.get(ID_ATTRIBUTE)
+            if user_id is None:
+                continue
+            user_id = str(user_id)
+            doc = json.dumps(user, separators=(',', ':'))
+            row = self._conn.execute('SELECT doc FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is not None and row[0] == doc:
+                continue
+
+            old = json.loads(row[0]) if row is not None else {}
+            self._conn.execute('INSERT INTO users (id, doc) VALUES (?, ?) '
+                               'ON CONFLICT(id) DO UPDATE SET doc = excluded.doc', (user_id, doc))
+            self._count(deltas, old, -1)
+            self._count(deltas, user, 1)
+            if row is None:
+                deltas['users'] += 1
+            changed += 1
+
+            if _is_object_id(user_id) and (watermark['after_id'] is None or user_id > watermark['after_id']):
+                watermark['after_id'] = user_id
+            updated = user.get(UPDATED_ATTRIBUTE)
+            if isinstance(updated, str) and (watermark['since'] is None or updated > watermark['since']):
+                watermark['since'] = updated
+        return changed
+
+    @staticmethod
+    def _count(deltas: dict, user: dict, sign: int) -> None:
+        for role in _user_roles(user):
+            deltas['roles'][role] += sign
+        for attribute in user:
+            deltas['attributes'][attribute] += sign
+
+    def _delete(self, user_ids, deltas: dict) -> int:
+        deleted = 0
+        for user_id in user_ids:
+            row = self._conn.execute('SELECT doc FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is None:
+                continue
+            self._conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            self._count(deltas, json.loads(row[0]), -1)
+            deltas['users'] -= 1
+            deleted += 1
+        return deleted
+
+    def _write_counts(self, deltas: dict) -> None:
+        for table, key in (('roles', 'role'), ('attributes', 'name')):
+            changes = [(name, delta) for name, delta in deltas[table].items() if delta]
+            self._conn.executemany(f'INSERT INTO {table} ({key}, users) VALUES (?, ?) '
+                                   f'ON CONFLICT({key}) DO UPDATE SET users = users + excluded.users', changes)
+            self._conn.execute(f'DELETE FROM {table} WHERE users <= 0')
+        self._set_meta('user_count', len(self) + deltas['users'])
+
+    def sync(self, client) -> dict:
+        """
+        Brings the snapshot up to date with the client's MCP endpoint.
+
+        All changes of one sync are committed in a single transaction, so an
+        interrupted sync leaves the previous snapshot intact.
+
+        Returns:
+            Dictionary with changed, deleted and fetched user counts, whether
+            ids had to be reconciled, the user count and elapsed_ms
+        """
+        start = time.perf_counter()
+        with self._lock, self._conn:
+            state = client.query('get_sync_state')
+            watermark = dict(self.watermark)
+            deltas = {'users': 0, 'roles': Counter(), 'attributes': Counter()}
+            params = {key: value for key, value in watermark.items() if value}
+
+            changed = self._apply(client.stream('stream_user_changes', **params), deltas, watermark)
+            deleted = fetched = 0
+            reconciled = len(self) + deltas['users'] != state['count']
+            if reconciled:
+                remote = {str(user[ID_ATTRIBUTE]) for user in client.stream('stream_user_ids')}
+                local = {row[0] for row in self._conn.execute('SELECT id FROM users')}
+                deleted = self._delete(local - remote, deltas)
+                missing = sorted(remote - local)
+                for position in range(0, len(missing), FETCH_BATCH):
+                    fetched += self._apply(
+                        client.stream('stream_user_changes', ids=missing[position:position + FETCH_BATCH]),
+                        deltas, watermark)
+
+            self._write_counts(deltas)
+            self._set_meta('watermark', watermark)
+            if changed or deleted or fetched:
+                self._set_meta('version', self.version + 1)
+            stats = {
+                "changed": changed,
+                "deleted": deleted,
+                "fetched": fetched,
+                "reconciled": reconciled,
+                "user_count": len(self),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+            }
+            self._set_meta('last_sync', stats)
+        return stats
+
+    def iter_users(self, fields=None):
+        """Yields the stored user documents in first-inserted order, optionally only `fields`."""
+        # A separate read connection, so a concurrent sync never shares this cursor
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            for (doc,) in conn.execute('SELECT doc FROM users ORDER BY rowid'):
+                user = json.loads(doc)
+                if fields is not None:
+                    user = {field: user[field] for field in fields if field in user}
+                yield user
+        finally:
+            conn.close()
+
+    def role_counts(self) -> dict:
+        """{role: member count}, largest roles first (ties by name, as the server orders them)."""
+        with self._lock:
+            return dict(self._conn.execute('SELECT role, users FROM roles ORDER BY users DESC, role').fetchall())
+
+    def summary(self, sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+        """
+        The `fetch_user_summary` result for the snapshot, read from the
+        maintained counts instead of a scan.
+        """
+        role_counts = self.role_counts()
+        with self._lock:
+            user_count = len(self)
+            attributes = [name for (name,) in self._conn.execute('SELECT name FROM attributes ORDER BY name')]
+            sample_users = [json.loads(doc) for (doc,) in self._conn.execute(
+                'SELECT doc FROM users ORDER BY rowid LIMIT ?', (sample_size,))]
+        schema = {}
+        if user_count:
+            schema = {
+                'identityAttribute': IDENTITY_ATTRIBUTE,
+                'displayAttribute': DISPLAY_ATTRIBUTE,
+                'attributes': attributes
+            }
+        return {
+            "status": "success",
+            "user_count": user_count,
+            "schema": schema,
+            "entitlements": list(role_counts),
+            "role_counts": role_counts,
+            "sample_users": sample_users
+        }
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(query_url: str, directory: str = None):
+    """
+    Returns the process-wide snapshot for `query_url`, or None when snapshots
+    are disabled (`MCP_SNAPSHOT_DIR` unset or empty).
+    """
+    directory = DEFAULT_SNAPSHOT_DIR if directory is None else directory
+    if not directory:
+        return None
+    path = Path(directory) / f"users_{hashlib.sha1(query_url.encode('utf-8')).hexdigest()[:16]}.sqlite"
+    with _snapshots_lock:
+        snapshot = _snapshots.get(path)
+        if snapshot is None:
+            snapshot = _snapshots[path] = UserSnapshot(path)
+        return snapshot
+
+
+def sync_snapshot(client):
+    """
+    Delta-syncs the snapshot for the client's MCP endpoint.
+
+    Returns:
+        The up-to-date `UserSnapshot`, or None when snapshots are disabled or
+        the MCP server predates the sync queries (it answers 400)
+    """
+    snapshot = get_snapshot(client.query_url)
+    if snapshot is None:
+        return None
+    try:
+        with span('snapshot.sync'):
+            snapshot.sync(client)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 400:
+            raise
+        return None
+    return snapshot
@@ -0,0 +1,374 @@
+"""Compact in-process store for the users streamed from the MCP server.
+
+A list of user dicts costs several hundred bytes per user before any values.
+`UserStore` keeps users column-wise instead:
+
+- every scalar attribute is a dictionary-encoded column: the distinct values
+  once, plus one 4-byte code per user in an `array`; mostly-unique string
+  columns (ids, emails) are packed into a single UTF-8 buffer instead
+- role names are interned once; each user's roles are kept as role ids in a
+  flat array with per-user offsets (CSR layout)
+- each role has a sorted array of member row ids, so per-role counts and
+  member lists need no scan
+
+The store is built incrementally from the NDJSON stream, one user at a time,
+and `get_user_store` keeps one per MCP endpoint and field set for
+`MCP_USER_STORE_TTL` seconds so repeated questions about the same users cost
+no refetch. With a
+local snapshot (see `snapshot`), an expired store is only rebuilt, from disk,
+when the delta sync found changes.
+"""
+import os
+import sys
+import json
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from agent_tracing import span
+
+from .snapshot import sync_snapshot
+from .stream import DEFAULT_SAMPLE_SIZE, DISPLAY_ATTRIBUTE, IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE, iter_users
+
+DEFAULT_STORE_TTL = float(os.environ.get('MCP_USER_STORE_TTL', '300'))
+
+# Code of a row that does not have the column's attribute
+MISSING = -1
+
+# A string column with at least this many distinct values, making up more than
+# this share of its rows, is packed into one buffer instead of interned
+PACK_MIN_DISTINCT = 4096
+PACK_MIN_DISTINCT_RATIO = 0.5
+
+
+def _intern_key(value):
+    # bool, int and float hash alike (True == 1 == 1.0), and lists/dicts are not hashable
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return ('json', json.dumps(value, sort_keys=True, default=str))
+    return (type(value).__name__, value)
+
+
+class _Column:
+    """
+    One attribute for every row.
+
+    Columns start dictionary-encoded: the distinct values once, plus a code
+    per row. A string column whose values are mostly unique (ids, emails)
+    gains nothing from that, so past PACK_MIN_DISTINCT distinct values it is
+    repacked as one UTF-8 buffer with per-row offsets; the odd non-string
+    value in a packed column is kept aside by row.
+    """
+
+    __slots__ = ('values', 'codes', '_index', '_all_strings', '_data', '_offsets', '_missing', '_others')
+
+    def __init__(self, rows: int):
+        self.values = []
+        self.codes = array('i', [MISSING]) * rows
+        self._index = {}
+        self._all_strings = True
+        self._data = None
+
+    @property
+    def packed(self) -> bool:
+        return self._data is not None
+
+    def append(self, value) -> None:
+        if self._data is not None:
+            self._append_packed(value)
+            return
+
+        key = _intern_key(value)
+        code = self._index.get(key)
+        if code is None:
+            code = self._index[key] = len(self.values)
+            self.values.append(value)
+            self._all_strings = self._all_strings and isinstance(value, str)
+        self.codes.append(code)
+
+        if (self._all_strings and len(self.values) >= PACK_MIN_DISTINCT
+                and len(self.values) > len(self.codes) * PACK_MIN_DISTINCT_RATIO):
+            self._pack()
+
+    def append_missing(self) -> None:
+        if self._data is not None:
+            self._append_packed(None, missing=True)
+        else:
+            self.codes.append(MISSING)
+
+    def _pack(self) -> None:
+        codes, values = self.codes, self.values
+        self._data = bytearray()
+        self._offsets = array('Q', [0])
+        self._missing = bytearray()
+        self._others = {}
+        self.values, self.codes, self._index = [], array('i'), {}
+        for code in codes:
+            if code == MISSING:
+                self._append_packed(None, missing=True)
+            else:
+                self._append_packed(values[code])
+
+    def _append_packed(self, value, missing: bool = False) -> None:
+        if isinstance(value, str):
+            self._data += value.encode('utf-8')
+        elif not missing:
+            self._others[len(self._missing)] = value
+        self._offsets.append(len(self._data))
+        self._missing.append(missing)
+
+    def __len__(self) -> int:
+        return len(self._missing) if self._data is not None else len(self.codes)
+
+    def has(self, row: int) -> bool:
+        """Whether the row has the attribute at all (its value may still be None)."""
+        return not self._missing[row] if self._data is not None else self.codes[row] != MISSING
+
+    def get(self, row: int):
+        if self._data is None:
+            code = self.codes[row]
+            return self.values[code] if code != MISSING else None
+        if self._missing[row]:
+            return None
+        if row in self._others:
+            return self._others[row]
+        return self._data[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+
+    def counts(self) -> dict:
+        """{intern key: (value, number of rows)} for the rows that have the attribute."""
+        if self._data is None:
+            counts = Counter(code for code in self.codes if code != MISSING)
+            return {_intern_key(self.values[code]): (self.values[code], count) for code, count in counts.items()}
+        counts = {}
+        for row in range(len(self._missing)):
+            if not self._missing[row]:
+                value = self.get(row)
+                key = _intern_key(value)
+                counts[key] = (value, counts[key][1] + 1 if key in counts else 1)
+        return counts
+
+    def nbytes(self) -> int:
+        if self._data is not None:
+            return (len(self._data) + self._offsets.itemsize * len(self._offsets) + len(self._missing)
+                    + sum(sys.getsizeof(value) for value in self._others.values()))
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self._index)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+class UserStore:
+    """Column-oriented user collection with interned roles and per-role member indexes."""
+
+    def __init__(self):
+        self._rows = 0
+        # Attribute names in first-seen order, including ROLE_ATTRIBUTE
+        self._attributes = {}
+        self._columns = {}
+
+        self._role_ids = {}
+        self._roles = []
+        self._members = []
+        self._has_roles = bytearray()
+        self._role_offsets = array('I', [0])
+        self._user_roles = array('I')
+
+    @classmethod
+    def from_users(cls, users) -> 'UserStore':
+        """Builds a store from an iterable of user documents, e.g. `iter_users(client)`."""
+        store = cls()
+        for user in users:
+            store.add(user)
+        return store
+
+    def add(self, user: dict) -> None:
+        """Appends one user document."""
+        row = self._rows
+
+        for attribute, value in user.items():
+            self._attributes.setdefault(attribute, None)
+            if attribute == ROLE_ATTRIBUTE:
+                continue
+            column = self._columns.get(attribute)
+            if column is None:
+                column = self._columns[attribute] = _Column(row)
+            column.append(value)
+        for column in self._columns.values():
+            if len(column) == row:
+                column.append_missing()
+
+        roles = user.get(ROLE_ATTRIBUTE)
+        self._has_roles.append(ROLE_ATTRIBUTE in user)
+        if isinstance(roles, str):
+            roles = [roles]
+        for role in roles or ():
+            role_id = self._role_ids.get(role)
+            if role_id is None:
+                role_id = self._role_ids[role] = len(self._roles)
+                self._roles.append(role)
+                self._members.append(array('I'))
+            members = self._members[role_id]
+            # A role listed twice for one user is one membership, and one role of the user
+            if members and members[-1] == row:
+                continue
+            members.append(row)
+            self._user_roles.append(role_id)
+        self._role_offsets.append(len(self._user_roles))
+        self._rows += 1
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def attributes(self) -> list:
+        """Every attribute seen on any user, in first-seen order."""
+        return list(self._attributes)
+
+    @property
+    def roles(self) -> list:
+        """Distinct roles in first-seen order."""
+        return list(self._roles)
+
+    def role_count(self, role: str) -> int:
+        """Number of users with `role` (0 for unknown roles)."""
+        role_id = self._role_ids.get(role)
+        return len(self._members[role_id]) if role_id is not None else 0
+
+    def role_counts(self) -> dict:
+        """{role: member count}, most common first."""
+        counts = {role: len(members) for role, members in zip(self._roles, self._members)}
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def members(self, role: str) -> array:
+        """Sorted row ids of the users with `role`."""
+        role_id = self._role_ids.get(role)
+        return self._members[role_id] if role_id is not None else array('I')
+
+    def has_role(self, row: int, role: str) -> bool:
+        members = self.members(role)
+        position = bisect_left(members, row)
+        return position < len(members) and members[position] == row
+
+    def user_roles(self, row: int) -> list:
+        return [self._roles[role_id] for role_id in self._user_roles[self._role_offsets[row]:self._role_offsets[row + 1]]]
+
+    def role_assignments(self) -> tuple:
+        """
+        Returns the raw (offsets, role ids) arrays: user `row` holds the role ids
+        `role_ids[offsets[row]:offsets[row + 1]]`, indexes into `roles`.
+        The arrays are the store's own and must not be modified.
+        """
+        return self._role_offsets, self._user_roles
+
+    def value(self, row: int, attribute: str):
+        """One attribute of one user, or None if the user does not have it."""
+        if attribute == ROLE_ATTRIBUTE:
+            return self.user_roles(row) if self._has_roles[row] else None
+        column = self._columns.get(attribute)
+        return column.get(row) if column is not None else None
+
+    def value_counts(self, attribute: str) -> dict:
+        """{value: number of users} for a scalar attribute, most common first."""
+        column = self._columns.get(attribute)
+        if column is None:
+            return {}
+        counts = sorted(column.counts().items(), key=lambda item: -item[1][1])
+        # List and dict values (and values equal to another type's, like True and 1) are keyed by their text
+        result = {}
+        for key, (value, count) in counts:
+            if isinstance(value, (list, dict)) or value in result:
+                value = key[1] if isinstance(value, (list, dict)) else repr(value)
+            result[value] = count
+        return result
+
+    def user(self, row: int) -> dict:
+        """Rebuilds the user document at `row` (attributes in first-seen order)."""
+        user = {}
+        for attribute in self._attributes:
+            if attribute == ROLE_ATTRIBUTE:
+                if self._has_roles[row]:
+                    user[attribute] = self.user_roles(row)
+                continue
+            column = self._columns[attribute]
+            if column.has(row):
+                user[attribute] = column.get(row)
+        return user
+
+    def users(self, rows=None):
+        """Yields user documents, for every row or for the given row ids."""
+        for row in range(self._rows) if rows is None else rows:
+            yield self.user(row)
+
+    def role_members(self, role: str, attribute: str = IDENTITY_ATTRIBUTE, limit: int = None) -> list:
+        """Values of `attribute` for the users with `role`, in row order."""
+        members = self.members(role)
+        if limit is not None:
+            members = members[:limit]
+        column = self._columns.get(attribute)
+        return [column.get(row) if column is not None else None for row in members]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the store's arrays and interned values."""
+        size = sum(column.nbytes() for column in self._columns.values())
+        size += sum(members.itemsize * len(members) + sys.getsizeof(role) for role, members in zip(self._roles, self._members))
+        size += len(self._has_roles) + 4 * (len(self._role_offsets) + len(self._user_roles))
+        return size
+
+    def summary(self, sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+        """The `summarize_users` result for the stored users, plus role_counts."""
+        schema = {}
+        if self._rows:
+            schema = {
+                'identityAttribute': IDENTITY_ATTRIBUTE,
+                'displayAttribute': DISPLAY_ATTRIBUTE,
+                'attributes': list(self._attributes)
+            }
+        return {
+            "status": "success",
+            "user_count": self._rows,
+            "schema": schema,
+            "entitlements": list(self._roles),
+            "sample_users": list(self.users(range(min(sample_size, self._rows)))),
+            "role_counts": self.role_counts()
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(client, fields=None, max_age: float = DEFAULT_STORE_TTL, refresh: bool = False) -> UserStore:
+    """
+    Returns the user store for the client's MCP endpoint, building it on first use.
+
+    With `fields`, the store only holds those attributes (one store is kept
+    per field set). They are projected by the MCP server when streaming, so
+    other attributes never cross the network, or locally from the snapshot.
+
+    A store older than `max_age` seconds (or any store, with `refresh`) is
+    revalidated: with a local snapshot, by a delta sync that only rebuilds the
+    store when users changed; otherwise (or if the server predates the sync
+    queries) by streaming every user again. Concurrent callers wait for a
+    single build.
+    """
+    fields = tuple(fields) if fields is not None else None
+    with _stores_lock:
+        entry = _stores.get((client.query_url, fields))
+        if entry is None:
+            entry = _stores[(client.query_url, fields)] = {'lock': threading.Lock(), 'store': None,
+                                                           'built_at': 0.0, 'version': None}
+
+    with entry['lock']:
+        if refresh or entry['store'] is None or time.monotonic() - entry['built_at'] > max_age:
+            snapshot = sync_snapshot(client)
+            if snapshot is None:
+                with span('store.build'):
+                    entry['store'] = UserStore.from_users(iter_users(client, fields=fields))
+                entry['version'] = None
+            elif entry['store'] is None or entry['version'] != snapshot.version:
+                with span('store.build'):
+                    entry['store'] = UserStore.from_users(snapshot.iter_users(fields))
+                entry['version'] = snapshot.version
+            entry['built_at'] = time.monotonic()
+        return entry['store']
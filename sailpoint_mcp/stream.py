@@ -0,0 +1,111 @@
+"""Incremental user fetch from the MCP server.
+
+The `stream_user_data` query returns one JSON document per line (NDJSON) and
+`get_user_page` returns cursor-paginated batches, so callers can process very
+large `users` collections without holding the whole array in memory.
+"""
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_SAMPLE_SIZE = 3
+
+ROLE_ATTRIBUTE = 'roles'
+IDENTITY_ATTRIBUTE = 'userId'
+DISPLAY_ATTRIBUTE = 'email'
+
+
+def query_options(fields=None, filter=None, limit: int = None) -> dict:
+    """
+    Builds the optional projection, filter and limit parameters of the user document queries.
+
+    Args:
+        fields: Attribute names to return (`_id` only if listed); None returns whole documents
+        filter: {attribute: value} or {attribute: {operator: value}} with $eq, $ne,
+            $in, $nin, $exists, $gt, $gte, $lt or $lte
+        limit: Maximum number of users
+    """
+    options = {}
+    if fields is not None:
+        options['fields'] = list(fields)
+    if filter:
+        options['filter'] = filter
+    if limit is not None:
+        options['limit'] = limit
+    return options
+
+
+def iter_users(client, batch_size: int = DEFAULT_PAGE_SIZE, fields=None, filter=None, limit: int = None):
+    """Yields user documents one at a time from the NDJSON stream query (see `query_options`)."""
+    yield from client.stream('stream_user_data', batch_size=batch_size, **query_options(fields, filter, limit))
+
+
+def iter_user_sample(client, size: int, batch_size: int = DEFAULT_PAGE_SIZE):
+    """Yields a uniform random sample of `size` user documents, drawn by the server."""
+    yield from client.stream('stream_user_sample', size=size, batch_size=batch_size)
+
+
+def iter_user_pages(client, page_size: int = DEFAULT_PAGE_SIZE, fields=None, filter=None):
+    """Yields lists of user documents, following the server's page cursor; `_id` is always included."""
+    cursor = None
+    while True:
+        params = {'limit': page_size, **query_options(fields, filter)}
+        if cursor:
+            params['cursor'] = cursor
+
+        page = client.query('get_user_page', **params)
+        if page['users']:
+            yield page['users']
+
+        cursor = page.get('next_cursor')
+        if not cursor:
+            return
+
+
+def summarize_users(users, keep_users: bool = False, sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+    """
+    Computes the user count, schema and entitlements in a single pass.
+
+    Args:
+        users: Iterable of user documents, typically from `iter_users`
+        keep_users: Also return every user document (memory grows with the collection)
+        sample_size: Number of leading users to keep as sample accounts
+
+    Returns:
+        Dictionary in the shape the agent tools return
+    """
+    user_count = 0
+    attributes = {}
+    entitlements = {}
+    sample_users = []
+    kept_users = [] if keep_users else None
+
+    for user in users:
+        user_count += 1
+
+        # dict keeps first-seen order, which makes the attribute and role lists stable between runs
+        for attribute in user:
+            attributes[attribute] = None
+        for role in user.get(ROLE_ATTRIBUTE, []):
+            entitlements[role] = None
+
+        if len(sample_users) < sample_size:
+            sample_users.append(user)
+        if kept_users is not None:
+            kept_users.append(user)
+
+    schema = {}
+    if user_count:
+        schema = {
+            'identityAttribute': IDENTITY_ATTRIBUTE,
+            'displayAttribute': DISPLAY_ATTRIBUTE,
+            'attributes': list(attributes)
+        }
+
+    result = {
+        "status": "success",
+        "user_count": user_count,
+        "schema": schema,
+        "entitlements": list(entitlements),
+        "sample_users": sample_users
+    }
+    if kept_users is not None:
+        result["users"] = kept_users
+    return result
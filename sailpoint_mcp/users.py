@@ -0,0 +1,173 @@
+"""User data fetch shared by the agent tools."""
+import threading
+from itertools import islice
+
+import requests
+
+from agent_tracing import span
+
+from .aggregates import fetch_attribute_keys, fetch_user_count, fetch_user_summary
+from .profile import SchemaProfiler
+from .results import LazyItems
+from .snapshot import sync_snapshot
+from .store import IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE, get_user_store
+from .stream import iter_user_sample, iter_users
+
+DEFAULT_QUERY_LIMIT = 100
+
+# Attributes needed for role counts and role membership answers
+ROLE_FIELDS = (IDENTITY_ATTRIBUTE, ROLE_ATTRIBUTE)
+
+# {(query url, sample size): (snapshot version, profile)}
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def fetch_user_data(client, include_users: bool = True) -> dict:
+    """
+    Fetches user data from the MCP server and returns the agent tool result.
+
+    Without `include_users` the summary is read from the local snapshot's
+    incrementally maintained counts after a delta sync, or computed server-side
+    by aggregate queries when snapshots are disabled; with it, every user is
+    loaded into the process-wide columnar `UserStore` and the summary and user
+    list are produced from there. The user list is a `LazyItems` view that
+    rebuilds documents on access, so a size-budgeted tool result (see
+    `results.shape_result`) only materializes the users it returns.
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+        include_users: Whether to return every user document in addition to the summary
+
+    Returns:
+        Dictionary with status, user_count, schema, entitlements, sample_users and
+        role_counts (plus users), or an error status and message
+    """
+    try:
+        if not include_users:
+            snapshot = sync_snapshot(client)
+            return snapshot.summary() if snapshot is not None else fetch_user_summary(client)
+        store = get_user_store(client)
+        result = store.summary()
+        result["users"] = LazyItems(len(store), store.user)
+        return result
+    
+    except requests.exceptions.RequestException as e:
+        return {
+            "status": "error",
+            "message": f"Failed to fetch user data: {str(e)}"
+        }
+
+
+def query_user_store(client, role: str = None, attribute: str = None, limit: int = DEFAULT_QUERY_LIMIT) -> dict:
+    """
+    Answers count, role and membership questions from the cached `UserStore`.
+
+    The store only holds the attributes the question needs: the identity and
+    roles, plus `attribute` for value counts.
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+        role: Return the members of this role (their identity attribute)
+        attribute: Return the distinct values of this attribute with user counts
+        limit: Maximum number of members or values to return
+
+    Returns:
+        Dictionary with status, user_count and role_count, plus role_counts and
+        attributes, or the role's members, or the attribute's value counts
+    """
+    fields = ROLE_FIELDS if attribute is None or role is not None else tuple(dict.fromkeys((attribute, ROLE_ATTRIBUTE)))
+    try:
+        store = get_user_store(client, fields=fields)
+        attributes = fetch_attribute_keys(client) if role is None and attribute is None else None
+    except requests.exceptions.RequestException as e:
+        return {
+            "status": "error",
+            "message": f"Failed to fetch user data: {str(e)}"
+        }
+
+    result = {
+        "status": "success",
+        "user_count": len(store),
+        "role_count": len(store.roles)
+    }
+    if role is not None:
+        result.update({
+            "role": role,
+            "member_count": store.role_count(role),
+            "members": store.role_members(role, IDENTITY_ATTRIBUTE, limit=limit)
+        })
+    elif attribute is not None:
+        value_counts = store.value_counts(attribute)
+        result.update({
+            "attribute": attribute,
+            "distinct_values": len(value_counts),
+            "value_counts": dict(islice(value_counts.items(), limit))
+        })
+    else:
+        result.update({
+            "role_counts": store.role_counts(),
+            "attributes": attributes,
+            "store_bytes": store.nbytes()
+        })
+    return result
+
+
+def _profile_server_sample(client, sample_size: int):
+    """Profiles a sample the server draws, or returns None when the server can't draw one."""
+    user_count = fetch_user_count(client)
+    if user_count <= sample_size:
+        return None
+    try:
+        with span('profile.scan'):
+            profile = SchemaProfiler().add_all(iter_user_sample(client, sample_size)).result()
+    except requests.exceptions.HTTPError as e:
+        # MCP servers without stream_user_sample answer 400
+        if e.response is None or e.response.status_code != 400:
+            raise
+        return None
+    return {**profile, "user_count": user_count, "sampled": profile["profiled"] < user_count}
+
+
+def profile_user_schema(client, sample_size: int = None) -> dict:
+    """
+    Profiles every user's attributes in one bounded-memory pass (see `profile.SchemaProfiler`).
+
+    Users are read from the delta-synced local snapshot when available, and
+    the profile is kept until the snapshot changes. Otherwise a sample is
+    drawn by the MCP server, so only `sample_size` users cross the network;
+    servers that can't sample stream every user.
+
+    Args:
+        client: `MCPClient` for the MCP server to query
+        sample_size: Profile a uniform random sample of this many users instead of all
+
+    Returns:
+        Dictionary with status, user_count, profiled, sampled, per-attribute
+        profiles and the chosen identity, display and entitlement attributes,
+        or an error status and message
+    """
+    try:
+        snapshot = sync_snapshot(client)
+        if snapshot is None:
+            profile = _profile_server_sample(client, sample_size) if sample_size else None
+            if profile is None:
+                with span('profile.scan'):
+                    profile = SchemaProfiler(sample_size).add_all(iter_users(client)).result()
+            return {"status": "success", **profile}
+
+        key = (client.query_url, sample_size)
+        version = snapshot.version
+        with _profiles_lock:
+            cached = _profiles.get(key)
+        if cached is None or cached[0] != version:
+            with span('profile.scan'):
+                cached = (version, SchemaProfiler(sample_size).add_all(snapshot.iter_users()).result())
+            with _profiles_lock:
+                _profiles[key] = cached
+        return {"status": "success", **cached[1]}
+    except requests.exceptions.RequestException as e:
+        return {
+            "status": "error",
+            "message": f"Failed to fetch user data: {str(e)}"
+        }
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The shared packages live at the project root, as the agents import them
+PROJECT_ROOT = Path(__file__).parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
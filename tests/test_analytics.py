@@ -0,0 +1,27 @@
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+from benchmarks.synthetic import iter_synthetic_users
+from sailpoint_mcp import analytics, role_cooccurrence
+from sailpoint_mcp.store import UserStore
+
+
+def _expected_pairs(users: list) -> Counter:
+    pairs = Counter()
+    for user in users:
+        pairs.update(combinations(sorted(set(user['roles'])), 2))
+    return pairs
+
+
+@pytest.mark.parametrize('max_dense_cells, pairs_per_block', [(1 << 20, 1 << 22), (0, 1 << 22), (0, 64)])
+def test_cooccurrence_counts_every_role_pair(monkeypatch, max_dense_cells, pairs_per_block):
+    monkeypatch.setattr(analytics, 'MAX_DENSE_CELLS', max_dense_cells)
+    monkeypatch.setattr(analytics, 'PAIRS_PER_BLOCK', pairs_per_block)
+    users = list(iter_synthetic_users(2000, roles=40, max_roles_per_user=6))
+    store = UserStore.from_users(users)
+
+    left, right, counts = role_cooccurrence(store)
+    pairs = {tuple(sorted((store.roles[a], store.roles[b]))): int(count) for a, b, count in zip(left, right, counts)}
+    assert pairs == _expected_pairs(users)
@@ -0,0 +1,153 @@
+import time
+import threading
+
+import pytest
+import requests
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from sailpoint_mcp.cache import QueryCache
+from sailpoint_mcp.client import CircuitBreaker, MCPClient
+
+
+def _opened_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    breaker.record_failure()
+    return breaker
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = _opened_breaker()
+    # As if reset_timeout had passed since the circuit opened
+    breaker._opened_at -= breaker.reset_timeout
+    return breaker
+
+
+def test_breaker_rejects_calls_while_open():
+    breaker = _opened_breaker()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = _half_open_breaker()
+    assert breaker.state == 'half-open'
+    allowed = []
+    barrier = threading.Barrier(8)
+
+    def call():
+        barrier.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == 1
+
+
+def test_probe_success_closes_the_breaker():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_probe_failure_reopens_the_breaker():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_error_response_is_closed_before_raising(monkeypatch):
+    closed = []
+    original_close = requests.Response.close
+
+    def close(response):
+        closed.append(response.status_code)
+        original_close(response)
+
+    monkeypatch.setattr(requests.Response, 'close', close)
+    with MCPStandIn(synthetic_users(10)) as server:
+        client = MCPClient(server.query_url, max_retries=0, encoding='json')
+        with pytest.raises(requests.exceptions.HTTPError):
+            list(client.stream('no_such_query'))
+        client.close()
+    assert closed and closed[0] >= 400
+
+
+def _requests(server, query: str) -> int:
+    return server.stats()["queries"].get(query, {}).get("requests", 0)
+
+
+def test_concurrent_identical_queries_share_one_request():
+    with MCPStandIn(synthetic_users(200)) as server:
+        role_counts = server._query_get_role_counts
+
+        def slow_role_counts(request, body):
+            # Keeps the first request in flight while the others arrive
+            time.sleep(0.2)
+            role_counts(request, body)
+
+        server._query_get_role_counts = slow_role_counts
+        client = MCPClient(server.query_url, cache=QueryCache())
+        results = []
+        barrier = threading.Barrier(8)
+
+        def call():
+            barrier.wait()
+            results.append(client.query('get_role_counts'))
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+
+        assert len(results) == 8 and all(result == results[0] for result in results)
+        assert _requests(server, 'get_role_counts') == 1
+        assert client.cache.stats()["shared"] == 7
+
+
+def test_fresh_entries_cost_no_request():
+    with MCPStandIn(synthetic_users(200)) as server:
+        client = MCPClient(server.query_url, cache=QueryCache(ttl=60))
+        first = client.query('get_role_counts')
+        assert client.query('get_role_counts') == first
+        client.close()
+        assert _requests(server, 'get_role_counts') == 1
+
+
+def test_expired_entry_is_revalidated_without_a_body():
+    with MCPStandIn(synthetic_users(200)) as server:
+        client = MCPClient(server.query_url, cache=QueryCache(ttl=0))
+        first = client.query('get_role_counts')
+        first_bytes = server.stats()["bytes_sent"]
+        assert client.query('get_role_counts') == first
+        client.close()
+
+        assert _requests(server, 'get_role_counts') == 2
+        assert server.stats()["bytes_sent"] == first_bytes
+        assert client.cache.stats()["revalidated"] == 1
+
+
+def test_full_cache_evicts_the_least_recently_used_entry():
+    with MCPStandIn(synthetic_users(200)) as server:
+        client = MCPClient(server.query_url, cache=QueryCache(ttl=60, max_entries=2))
+        client.query('get_user_count')
+        client.query('get_role_counts')
+        client.query('get_user_count')
+        client.query('get_attribute_keys')
+        assert client.cache.stats()["evictions"] == 1
+
+        client.query('get_user_count')
+        assert _requests(server, 'get_user_count') == 1
+        client.query('get_role_counts')
+        assert _requests(server, 'get_role_counts') == 2
+        client.close()
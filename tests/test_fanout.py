@@ -0,0 +1,44 @@
+import time
+import asyncio
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from sailpoint_mcp import discover_endpoints, get_client
+
+DELAY = 0.4
+
+
+def _delayed(server, query: str, body=None) -> None:
+    answer = getattr(server, f"_query_{query}")
+
+    def delayed(request, request_body):
+        time.sleep(DELAY)
+        if body is None:
+            answer(request, request_body)
+        else:
+            request.send_body(query, body)
+
+    setattr(server, f"_query_{query}", delayed)
+
+
+def test_failed_endpoints_leave_the_others_results():
+    with MCPStandIn(synthetic_users(100)) as healthy, MCPStandIn(synthetic_users(50)) as malformed, \
+            MCPStandIn([]) as dead:
+        dead_url = dead.query_url
+        dead.stop()
+        # Fail on the first connection error instead of backing off between retries
+        get_client(dead_url).max_retries = 0
+        _delayed(healthy, 'get_user_summary')
+        _delayed(malformed, 'get_user_summary', body={"roles": []})
+
+        start = time.perf_counter()
+        result = asyncio.run(discover_endpoints([healthy.query_url, {"name": "malformed", "mcp_url": malformed.query_url},
+                                                 dead_url]))
+        elapsed = time.perf_counter() - start
+
+    assert (result["status"], result["succeeded"], result["failed"]) == ("partial", 1, 2)
+    assert result["total_users"] == 100
+    assert [endpoint["status"] for endpoint in result["results"]] == ["success", "error", "error"]
+    assert "KeyError" in result["results"][1]["message"]
+    # The two delayed endpoints answer concurrently
+    assert elapsed < DELAY * 1.75
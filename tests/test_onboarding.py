@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from sailpoint_mcp import analytics, build_onboarding_form, get_client, profile_user_schema, snapshot, users as user_data
+from sailpoint_mcp.analytics import ANALYTICS_FIELDS, analyze_user_store
+from sailpoint_mcp.store import get_user_store
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    """The stores `analyze_entitlements` was computed over."""
+    stores = []
+    analyze_entitlements = analytics.analyze_entitlements
+
+    def counted(store, *args, **kwargs):
+        stores.append(store)
+        return analyze_entitlements(store, *args, **kwargs)
+
+    monkeypatch.setattr(analytics, 'analyze_entitlements', counted)
+    return stores
+
+
+def _rules(path, *roles) -> str:
+    path.write_text(json.dumps({"rules": [{"name": "separation", "roles": list(roles)}]}), encoding='utf-8')
+    return str(path)
+
+
+def test_entitlement_analysis_is_reused_for_an_unchanged_store(tmp_path, analyses):
+    rules_path = _rules(tmp_path / 'rules.json', 'admin', 'auditor')
+    with MCPStandIn(synthetic_users(500)) as server:
+        client = get_client(server.query_url)
+        first = analyze_user_store(client, rules_path)
+        server.reset_stats()
+        second = analyze_user_store(client, rules_path)
+
+        assert first == second
+        assert len(analyses) == 1
+        assert server.stats()["bytes_sent"] == 0
+
+
+def test_entitlement_analysis_follows_store_and_rule_changes(tmp_path, analyses):
+    users = synthetic_users(500)
+    rules_path = _rules(tmp_path / 'rules.json', 'admin', 'auditor')
+    with MCPStandIn(users) as server:
+        client = get_client(server.query_url)
+        before = analyze_user_store(client, rules_path)
+
+        _rules(tmp_path / 'rules.json', 'admin', 'approver')
+        changed_rules = analyze_user_store(client, rules_path)
+        assert changed_rules["sod_violations"] != before["sod_violations"]
+
+        users.append(dict(users[0], _id='f' * 24, userId='added_user', updatedAt='2099-01-01T00:00:00.000Z'))
+        get_user_store(client, fields=ANALYTICS_FIELDS, refresh=True)
+        changed_users = analyze_user_store(client, rules_path)
+        assert changed_users["user_count"] == before["user_count"] + 1
+        assert len(analyses) == 3
+
+
+def _schema_mapping(form: dict) -> dict:
+    mapping = form["sailpoint_onboarding_form"]["schema_mapping"]
+    return {key: mapping[key] for key in ('identity_attribute', 'display_attribute', 'entitlement_attribute')}
+
+
+def test_onboarding_form_profiles_a_server_drawn_sample(monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', '')
+    with MCPStandIn(synthetic_users(3000)) as server:
+        client = get_client(server.query_url)
+        full = build_onboarding_form(client, sample_size=0)
+        full_bytes = server.stats()["bytes_sent"]
+        server.reset_stats()
+        sampled = build_onboarding_form(client, sample_size=200)
+
+        assert sampled["status"] == "success"
+        assert _schema_mapping(sampled) == _schema_mapping(full)
+        assert server.stats()["queries"]["stream_user_sample"]["requests"] == 1
+        assert "stream_user_data" not in server.stats()["queries"]
+        assert server.stats()["bytes_sent"] < full_bytes / 5
+
+
+def test_sampled_profile_reports_the_collection_size(monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', '')
+    with MCPStandIn(synthetic_users(1000)) as server:
+        profile = profile_user_schema(get_client(server.query_url), sample_size=100)
+    assert (profile["user_count"], profile["profiled"], profile["sampled"]) == (1000, 100, True)
+
+
+def test_snapshot_profile_is_kept_until_the_snapshot_changes(monkeypatch):
+    scans = []
+    schema_profiler = user_data.SchemaProfiler
+
+    def counted(*args, **kwargs):
+        scans.append(args)
+        return schema_profiler(*args, **kwargs)
+
+    monkeypatch.setattr(user_data, 'SchemaProfiler', counted)
+    users = synthetic_users(500)
+    with MCPStandIn(users) as server:
+        client = get_client(server.query_url)
+        first = profile_user_schema(client)
+        assert profile_user_schema(client) == first
+        assert len(scans) == 1
+
+        users.append(dict(users[0], _id='f' * 24, userId='added_user', updatedAt='2099-01-01T00:00:00.000Z'))
+        assert profile_user_schema(client)["user_count"] == first["user_count"] + 1
+        assert len(scans) == 2
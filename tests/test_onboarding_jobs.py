@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import onboarding_jobs
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from onboarding_jobs import JobError, load_jobs, run_jobs
+from sailpoint_mcp import snapshot
+
+HR_DATABASE = {"host": "10.0.0.6", "port": 27017, "database": "hr_auth"}
+PAYMENTS_DATABASE = {"host": "10.0.0.7", "port": 27018, "database": "payments",
+                     "connection_string": "mongodb://10.0.0.7:27018/payments?replicaSet=rs0"}
+
+# The template carries an extension openpyxl drops on load
+pytestmark = pytest.mark.filterwarnings('ignore:Unknown extension:UserWarning')
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot(monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', '')
+
+
+def _write_jobs(path, content) -> str:
+    path.write_text(json.dumps(content), encoding='utf-8')
+    return str(path)
+
+
+def test_load_jobs_applies_defaults_and_resolves_paths(tmp_path):
+    (tmp_path / 'jobs').mkdir()
+    jobs = load_jobs(_write_jobs(tmp_path / 'jobs' / 'jobs.json', {
+        "defaults": {"mcp_url": "http://mcp-a/mcp/query", "mapping_path": "mapping.json"},
+        "applications": [{"name": "payments"}, {"name": "hr", "mcp_url": "http://mcp-b/mcp/query"}]
+    }))
+    assert [job["mcp_url"] for job in jobs] == ["http://mcp-a/mcp/query", "http://mcp-b/mcp/query"]
+    assert {job["mapping_path"] for job in jobs} == {str(tmp_path / 'jobs' / 'mapping.json')}
+
+
+@pytest.mark.parametrize('content, error', [
+    ({"jobs": []}, "expected a list of applications"),
+    (["payments"], "every application must be an object"),
+])
+def test_load_jobs_rejects_malformed_files(tmp_path, content, error):
+    with pytest.raises(JobError, match=error):
+        load_jobs(_write_jobs(tmp_path / 'jobs.json', content))
+
+
+@pytest.mark.parametrize('jobs, error', [
+    ([{"name": "hr", "form": "pdf"}], "form must be one of"),
+    ([{"name": "hr"}, {"name": "hr"}], "is also written by"),
+    ([{"name": "hr", "form": "json", "mcp_url": "http://mcp-b/mcp/query"}], "need a connection"),
+    ([{"name": "hr", "form": "json", "mcp_url": "http://mcp-b/mcp/query", "connection": {"host": "db"}}],
+     "connection needs host, port, database"),
+])
+def test_invalid_jobs_fail_before_anything_runs(tmp_path, jobs, error):
+    with pytest.raises(JobError, match=error):
+        run_jobs(jobs, tmp_path / 'forms')
+    assert not list((tmp_path / 'forms').iterdir())
+
+
+def test_run_jobs_over_two_endpoints(tmp_path, monkeypatch):
+    with MCPStandIn(synthetic_users(300, seed=1)) as hr, MCPStandIn(synthetic_users(120, seed=2)) as payments:
+        # The agents' MONGODB_CONNECTION belongs to the default endpoint
+        monkeypatch.setattr(onboarding_jobs, 'MCP_QUERY_URL', hr.query_url)
+        jobs = [
+            {"name": "hr", "form": "excel"},
+            {"name": "hr", "form": "json", "output": "hr_default.json"},
+            {"name": "hr", "form": "json", "output": "hr.json", "connection": HR_DATABASE},
+            {"name": "payments", "form": "json", "mcp_url": payments.query_url, "connection": PAYMENTS_DATABASE},
+            {"name": "payments", "form": "excel", "mcp_url": payments.query_url, "output": "payments.xlsx"},
+        ]
+        summary = run_jobs(jobs, tmp_path, max_workers=1)
+
+    assert (summary["status"], summary["succeeded"]) == ("success", 5), summary
+    assert [result["form"] for result in summary["results"]] == ['excel', 'json', 'json', 'json', 'excel']
+    assert (tmp_path / 'hr.xlsx').exists() and (tmp_path / 'payments.xlsx').exists()
+
+    def form(name):
+        return json.loads((tmp_path / name).read_text(encoding='utf-8'))
+
+    assert form('hr_default.json')["connection_details"]["host"] == "34.172.211.78"
+    hr_form, payments_form = form('hr.json'), form('payments.json')
+    assert hr_form["connection_details"]["database"] == "hr_auth"
+    assert hr_form["connection_details"]["jdbc_url"] == "mongodb://10.0.0.6:27017/hr_auth"
+    assert payments_form["connection_details"]["jdbc_url"] == PAYMENTS_DATABASE["connection_string"]
+    assert hr_form["aggregation_info"]["total_accounts"] == 300
+    assert payments_form["aggregation_info"]["total_accounts"] == 120
+    # Forms for one endpoint differ only in the database they report
+    assert {key: value for key, value in hr_form.items() if key != "connection_details"} == \
+        {key: value for key, value in form('hr_default.json').items() if key != "connection_details"}
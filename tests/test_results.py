@@ -0,0 +1,103 @@
+import pytest
+
+from agent_tracing import spans, traced
+from sailpoint_mcp import LazyItems, budgeted, result_page, results, shape_result
+from sailpoint_mcp.results import ResultPages, _size
+
+BUDGET = 4000
+
+
+def _users(count: int) -> list:
+    return [{"userId": f"user{number:05d}", "email": f"user{number:05d}@example.com", "roles": ["admin", "viewer"]}
+            for number in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def pages(monkeypatch):
+    pages = ResultPages()
+    monkeypatch.setattr(results, '_pages', pages)
+    return pages
+
+
+def _page_through(truncated: dict, head: list) -> list:
+    items = list(head)
+    offset = truncated["next_offset"]
+    while offset is not None:
+        page = result_page(truncated["handle"], offset=offset, budget=BUDGET)
+        assert page["status"] == "success" and _size(page) <= BUDGET
+        assert page["items"]
+        items.extend(page["items"])
+        offset = page["next_offset"]
+    return items
+
+
+def test_results_within_the_budget_are_unchanged():
+    result = {"status": "success", "users": _users(3)}
+    assert shape_result(result, BUDGET) is result
+
+
+def test_largest_list_is_cut_and_paged_to_exhaustion():
+    users = _users(200)
+    result = {"status": "success", "user_count": 200, "users": users, "roles": {"admin": 200, "viewer": 200}}
+    shaped = shape_result(result, BUDGET)
+
+    assert _size(shaped) <= BUDGET and "budget_exceeded" not in shaped
+    assert result["users"] is users and len(users) == 200
+    assert set(shaped["truncated"]) == {"users"}
+    truncated = shaped["truncated"]["users"]
+    assert (truncated["total"], truncated["returned"]) == (200, len(shaped["users"]))
+    assert truncated["next_offset"] == len(shaped["users"]) < 200
+    assert shaped["roles"] == result["roles"]
+    assert _page_through(truncated, shaped["users"]) == users
+
+
+def test_nested_collections_are_reported_by_path():
+    shaped = shape_result({"status": "success", "report": {"rows": _users(200)}}, BUDGET)
+    assert set(shaped["truncated"]) == {"report.rows"}
+    assert _page_through(shaped["truncated"]["report.rows"], shaped["report"]["rows"]) == _users(200)
+
+
+def test_lazy_items_are_only_built_for_the_returned_head():
+    built = []
+    users = _users(500)
+
+    def item(index):
+        built.append(index)
+        return users[index]
+
+    shaped = shape_result({"status": "success", "users": LazyItems(500, item)}, BUDGET)
+    returned = shaped["truncated"]["users"]["returned"]
+    assert shaped["users"] == users[:returned]
+    assert len(built) <= returned + 1
+
+
+def test_page_limit_and_offset_checks():
+    handle = shape_result({"users": _users(200)}, BUDGET)["truncated"]["users"]["handle"]
+    page = result_page(handle, offset=10, limit=3, budget=BUDGET)
+    assert (page["items"], page["next_offset"]) == (_users(200)[10:13], 13)
+    assert result_page(handle, offset=201, budget=BUDGET)["status"] == "error"
+
+
+def test_expired_and_evicted_handles_are_reported(monkeypatch):
+    monkeypatch.setattr(results, '_pages', ResultPages(ttl=0))
+    handle = shape_result({"users": _users(200)}, BUDGET)["truncated"]["users"]["handle"]
+    expired = result_page(handle, offset=1, budget=BUDGET)
+    assert expired == {"status": "error", "message": f"Unknown or expired result handle: {handle}"}
+
+    monkeypatch.setattr(results, '_pages', ResultPages(max_handles=1))
+    first = shape_result({"users": _users(200)}, BUDGET)["truncated"]["users"]["handle"]
+    second = shape_result({"users": _users(200)}, BUDGET)["truncated"]["users"]["handle"]
+    assert result_page(first, budget=BUDGET)["status"] == "error"
+    assert result_page(second, budget=BUDGET)["status"] == "success"
+
+
+def test_budget_covers_the_timings_tracing_adds(monkeypatch):
+    monkeypatch.setattr(results, 'DEFAULT_BUDGET', BUDGET)
+    monkeypatch.setattr(spans, 'TRACE_PROFILE', {'cprofile'})
+
+    def list_users() -> dict:
+        return {"status": "success", "users": _users(200)}
+
+    result = budgeted(traced(list_users))()
+    assert "profile" in result["timings"]
+    assert _size(result) <= BUDGET and "budget_exceeded" not in result
@@ -0,0 +1,90 @@
+import pytest
+
+from sailpoint_mcp import IntentRouter, Route, format_response, normalize_request
+from sailpoint_mcp.router import CONNECTION_INFO, FILL_FORM, MODEL_INTENT, ONBOARDING_FORM, RAW_DATA, READ_FORM
+
+
+def _router(calls: list) -> IntentRouter:
+    """Every route of both agents, with handlers that record their calls."""
+    def handler(intent):
+        return lambda **kwargs: calls.append((intent, kwargs)) or {"status": "success", "intent": intent}
+
+    return IntentRouter('test_agent', [Route(intent, patterns, handler(intent)) for intent, patterns in (
+        ('fill_form', FILL_FORM), ('read_form', READ_FORM), ('raw_data', RAW_DATA),
+        ('onboarding_form', ONBOARDING_FORM), ('connection_info', CONNECTION_INFO))])
+
+
+@pytest.mark.parametrize('text, intent, kwargs', [
+    ("fill the form", 'fill_form', {}),
+    ("Fill the Excel form.", 'fill_form', {}),
+    ("Please fill out the SailPoint onboarding questionnaire", 'fill_form', {}),
+    ("can you complete the form for me?", 'fill_form', {}),
+    ("populate the spreadsheet now!", 'fill_form', {}),
+    ("fill in the form", 'fill_form', {}),
+    ("read SailPoint_Onboarding_Filled.xlsx", 'read_form', {"file_path": "SailPoint_Onboarding_Filled.xlsx"}),
+    ("open the filled form at /tmp/forms/hr.xlsm", 'read_form', {"file_path": "/tmp/forms/hr.xlsm"}),
+    ("show me the form 'My Forms/hr form.xlsx'", 'read_form', {"file_path": "My Forms/hr form.xlsx"}),
+    ("show me the raw data", 'raw_data', {}),
+    ("get all user data and schema information from the MCP server", 'raw_data', {}),
+    ("fetch the users", 'raw_data', {}),
+    ("Generate the SailPoint onboarding form", 'onboarding_form', {}),
+    ("could you prepare a complete application onboarding form please", 'onboarding_form', {}),
+    ("What are the MongoDB connection details?", 'connection_info', {}),
+    ("what are the connection details for the mongodb database", 'connection_info', {}),
+])
+def test_canonical_requests_are_routed(text, intent, kwargs):
+    calls = []
+    routed = _router(calls).route(text)
+    assert routed is not None and routed[0] == intent
+    assert calls == [(intent, kwargs)]
+
+
+@pytest.mark.parametrize('text', [
+    "how do I fill the form?",
+    "don't fill the form yet",
+    "please don't fill the form",
+    "should I fill the form?",
+    "fill the form using template v3.xlsx",
+    "fill the form later",
+    "fill the form for the payments application",
+    "what happens when you fill the form",
+    "read the form",
+    "read C:/My Forms/hr form.xlsx",
+    "read notes.txt",
+    "show me the admin users",
+    "show me users with the admin role",
+    "how many users are there",
+    "generate the onboarding form for payments",
+    "don't generate an onboarding form",
+    "what are the connection details for the payments database",
+    "",
+    "   ",
+])
+def test_other_requests_fall_through_to_the_model(text):
+    calls = []
+    router = _router(calls)
+    assert router.route(text) is None
+    assert calls == []
+    assert router.counts() == {MODEL_INTENT: 1}
+
+
+def test_failing_handler_leaves_the_request_to_the_model():
+    def fail():
+        raise RuntimeError("tool unavailable")
+
+    router = IntentRouter('test_agent', [Route('fill_form', FILL_FORM, fail)])
+    assert router.route("fill the form") is None
+    assert router.stats() == {"requests": 1, "hits": 0, "hit_rate": 0.0, "intents": {}}
+
+
+@pytest.mark.parametrize('text, normalized', [
+    ("  Please   fill the form for me!! ", "fill the form"),
+    ("Can you please fill the form now?", "fill the form"),
+])
+def test_normalize_request(text, normalized):
+    assert normalize_request(text) == normalized
+
+
+def test_format_response():
+    assert format_response({"status": "error", "message": "no template"}) == "Error: no template"
+    assert format_response({"status": "success", "message": "Done", "rows": 3}).startswith("Done\n\n```json\n")
@@ -0,0 +1,101 @@
+import pytest
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from sailpoint_mcp import fetch_user_data, fetch_user_summary, snapshot, sync_snapshot
+from sailpoint_mcp.client import MCPClient
+
+NEWER = '2099-01-01T00:00:00.000Z'
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+
+
+@pytest.fixture
+def served():
+    """(users, client) of a stand-in server; mutating `users` changes what it serves."""
+    users = synthetic_users(300)
+    with MCPStandIn(users) as server:
+        client = MCPClient(server.query_url, max_retries=0)
+        yield users, client
+        client.close()
+
+
+def _sync(client) -> dict:
+    stats = sync_snapshot(client).last_sync
+    return {key: stats[key] for key in ('changed', 'deleted', 'fetched', 'reconciled')}
+
+
+def _assert_matches_server(client) -> None:
+    local, remote = sync_snapshot(client).summary(), fetch_user_summary(client)
+    assert local["user_count"] == remote["user_count"]
+    assert local["role_counts"] == remote["role_counts"]
+    assert local["entitlements"] == remote["entitlements"]
+    assert local["schema"] == remote["schema"]
+
+
+def test_cold_then_unchanged_sync(snapshot_dir, served):
+    users, client = served
+    assert _sync(client) == {"changed": len(users), "deleted": 0, "fetched": 0, "reconciled": False}
+    version = sync_snapshot(client).version
+    assert _sync(client) == {"changed": 0, "deleted": 0, "fetched": 0, "reconciled": False}
+    assert sync_snapshot(client).version == version
+    _assert_matches_server(client)
+
+
+def test_update_adjusts_role_and_attribute_counts(snapshot_dir, served):
+    users, client = served
+    _sync(client)
+    users[10] = dict(users[10], roles=['auditor', 'brand_new_role'], badge='B-10', updatedAt=NEWER)
+    del users[20]['department']
+    users[20]['updatedAt'] = NEWER
+
+    assert _sync(client) == {"changed": 2, "deleted": 0, "fetched": 0, "reconciled": False}
+    summary = sync_snapshot(client).summary()
+    assert summary["role_counts"]["brand_new_role"] == 1
+    assert 'badge' in summary["schema"]["attributes"]
+    _assert_matches_server(client)
+
+
+def test_delete_reconciles_ids(snapshot_dir, served):
+    users, client = served
+    _sync(client)
+    removed = [users.pop(5), users.pop(50)]
+
+    assert _sync(client) == {"changed": 0, "deleted": len(removed), "fetched": 0, "reconciled": True}
+    assert len(sync_snapshot(client)) == len(users)
+    _assert_matches_server(client)
+
+
+def test_insert_below_the_watermark_is_fetched(snapshot_dir, served):
+    users, client = served
+    _sync(client)
+    # Older _id and updatedAt than the watermark, so only the id comparison finds it
+    users.insert(0, dict(users[0], _id='0' * 24, userId='late_user', roles=['late_role'],
+                         updatedAt='2000-01-01T00:00:00.000Z'))
+
+    assert _sync(client) == {"changed": 0, "deleted": 0, "fetched": 1, "reconciled": True}
+    assert sync_snapshot(client).summary()["role_counts"]["late_role"] == 1
+    _assert_matches_server(client)
+
+
+def test_servers_without_sync_queries_fall_back_to_aggregates(snapshot_dir):
+    with MCPStandIn(synthetic_users(300)) as server:
+        # Answered with 400 Unknown query, like an MCP server that predates the sync queries
+        server._query_get_sync_state = None
+        client = MCPClient(server.query_url, max_retries=0)
+        assert sync_snapshot(client) is None
+        assert fetch_user_data(client, include_users=False) == fetch_user_summary(client)
+        client.close()
+        assert 'stream_user_changes' not in server.stats()["queries"]
+
+
+def test_summary_without_a_snapshot_dir_is_one_aggregate_query(monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', '')
+    with MCPStandIn(synthetic_users(300)) as server:
+        client = MCPClient(server.query_url, max_retries=0)
+        assert fetch_user_data(client, include_users=False)["user_count"] == 300
+        client.close()
+        assert list(server.stats()["queries"]) == ['get_user_summary']
@@ -0,0 +1,56 @@
+import pytest
+
+from benchmarks.standin import MCPStandIn
+from benchmarks.synthetic import synthetic_users
+from sailpoint_mcp import fetch_role_counts, get_client, snapshot
+from sailpoint_mcp.store import PACK_MIN_DISTINCT, ROLE_ATTRIBUTE, UserStore, get_user_store
+
+FIELDS = ('userId', 'email', 'department', 'roles')
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot(monkeypatch):
+    monkeypatch.setattr(snapshot, 'DEFAULT_SNAPSHOT_DIR', '')
+
+
+def _users() -> list:
+    # Enough distinct ids and emails for those columns to be packed
+    users = synthetic_users(PACK_MIN_DISTINCT + 500, extra_attributes=2)
+    users[3]['roles'] = ['admin', 'viewer', 'admin']
+    users[4]['department'] = None
+    del users[5]['email']
+    users[6]['roles'] = []
+    del users[7]['roles']
+    return users
+
+
+def _projected(user: dict, fields) -> dict:
+    projected = {field: user[field] for field in fields if field in user}
+    if ROLE_ATTRIBUTE in projected:
+        projected[ROLE_ATTRIBUTE] = list(dict.fromkeys(projected[ROLE_ATTRIBUTE]))
+    return projected
+
+
+@pytest.mark.parametrize('fields', [None, FIELDS])
+def test_store_round_trips_the_served_users(fields):
+    users = _users()
+    with MCPStandIn(users) as server:
+        client = get_client(server.query_url)
+        store = get_user_store(client, fields=fields, refresh=True)
+        role_counts = fetch_role_counts(client)
+
+    attributes = fields or list(users[0])
+    assert len(store) == len(users)
+    for row, user in enumerate(users):
+        assert store.user(row) == _projected(user, attributes)
+    assert store.role_counts() == role_counts
+
+
+def test_duplicate_role_counts_once_per_user():
+    store = UserStore.from_users([{"userId": "a", "roles": ['admin', 'viewer', 'admin']},
+                                  {"userId": "b", "roles": 'admin'}])
+    offsets, role_ids = store.role_assignments()
+    assert store.user_roles(0) == ['admin', 'viewer']
+    assert list(offsets) == [0, 2, 3]
+    assert store.role_counts() == {'admin': 2, 'viewer': 1}
+    assert list(store.members('admin')) == [0, 1]
@@ -0,0 +1,236 @@
+import io
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.utils.cell import get_column_letter
+
+from xlsx_forms import TemplateCache, fill_form, get_plan, read_form, read_form_openpyxl, templates, write_patched
+from xlsx_forms.patch import _copy_compressed
+
+PROJECT_ROOT = Path(__file__).parent.parent
+TEMPLATE = PROJECT_ROOT / 'SailPoint_Onboarding_Application_Questionnaire_v2.xlsx'
+MAPPING = PROJECT_ROOT / 'excel-form-filler-agent' / 'sailpoint_field_mapping.json'
+
+# The template carries an extension openpyxl drops on load
+pytestmark = pytest.mark.filterwarnings('ignore:Unknown extension:UserWarning')
+
+GENERAL = 'Application General Information'
+ROLES = 'Roles'
+# Top-left cell of the merged range H38:I38, which the mapping below writes through I38
+MERGED_TOP_LEFT = 'H38'
+# Rows 3 to 6 of the Roles sheet per sheet, so ten roles spill onto two continuation sheets
+ROLES_MAX_ROW = 6
+
+
+def _data(role_count: int) -> dict:
+    return {
+        "user_count": 1234,
+        "entitlements": [f"role_{number:02d}" for number in range(1, role_count + 1)],
+        "analytics": {"multiple_roles_summary": "Yes - 40% of users hold more than one role",
+                      "sod_summary": "2 users violate 1 separation-of-duties rule"}
+    }
+
+
+@pytest.fixture
+def mapping_path(tmp_path):
+    """The shipped mapping, plus a field written into a merged range and a short Roles table."""
+    mapping = json.loads(MAPPING.read_text(encoding='utf-8'))
+    for sheet in mapping["sheets"]:
+        if sheet["sheet"] == GENERAL:
+            sheet["fields"].append({"key": "merged_note", "description": "Written inside a merged range",
+                                    "cell": "I38", "value": "Written through a merged cell"})
+        for table in sheet.get("tables", []):
+            table["max_rows"] = ROLES_MAX_ROW
+    path = tmp_path / 'mapping.json'
+    path.write_text(json.dumps(mapping), encoding='utf-8')
+    return path
+
+
+def _fill(tmp_path, mapping_path, engine: str, role_count: int) -> tuple:
+    output_path = tmp_path / f'{engine}_{role_count}.xlsx'
+    result = fill_form(_data(role_count), TEMPLATE, output_path, mapping_path, engine=engine)
+    assert result["write_engine"] == engine
+    return output_path, result
+
+
+def _cells(path) -> dict:
+    """{sheet name: {coordinate: value}} of every non-empty cell, as openpyxl reads them."""
+    wb = load_workbook(path)
+    try:
+        return {ws.title: {cell.coordinate: cell.value for row in ws.iter_rows() for cell in row
+                           if cell.value is not None}
+                for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_patch_writer_matches_openpyxl(tmp_path, mapping_path):
+    patched_path, patched = _fill(tmp_path, mapping_path, 'patch', ROLES_MAX_ROW - 2)
+    reference_path, reference = _fill(tmp_path, mapping_path, 'openpyxl', ROLES_MAX_ROW - 2)
+
+    assert patched["write_failures"] == reference["write_failures"] == []
+    assert _cells(patched_path) == _cells(reference_path)
+
+
+def test_merged_cells_are_written_through_their_top_left_cell(tmp_path, mapping_path):
+    for engine in ('patch', 'openpyxl'):
+        output_path, _ = _fill(tmp_path, mapping_path, engine, 1)
+        sheet = _cells(output_path)[GENERAL]
+        assert sheet[MERGED_TOP_LEFT] == "Written through a merged cell"
+        assert 'I38' not in sheet
+
+
+def test_split_table_continues_on_copies_of_its_sheet(tmp_path, mapping_path):
+    patched_path, patched = _fill(tmp_path, mapping_path, 'patch', 10)
+    reference_path, _ = _fill(tmp_path, mapping_path, 'openpyxl', 10)
+
+    assert patched["write_failures"] == []
+    assert patched["filled_sheets"][-2:] == ['Roles (2)', 'Roles (3)']
+    patched_cells, reference_cells = _cells(patched_path), _cells(reference_path)
+    # The first chunk stays on the Roles sheet, as openpyxl writes it
+    assert {name: cells for name, cells in patched_cells.items() if name in reference_cells} == reference_cells
+
+    template_roles = _cells(TEMPLATE)[ROLES]
+    roles_per_sheet = ROLES_MAX_ROW - 2
+    for number, sheet_name in enumerate(['Roles (2)', 'Roles (3)'], start=1):
+        sheet = patched_cells[sheet_name]
+        # Headers and notes of the template sheet are copied with it
+        assert {ref: value for ref, value in sheet.items() if ref in template_roles} == template_roles
+        first = number * roles_per_sheet + 1
+        for row, index in enumerate(range(first, min(first + roles_per_sheet, 11)), start=3):
+            assert sheet[f'G{row}'] == index
+            assert sheet[f'H{row}'] == f"role_{index:02d}"
+            assert sheet[f'I{row}'] == f"role_{index:02d} permissions"
+
+
+def test_openpyxl_fallback_reports_continuation_rows_as_failures(tmp_path, mapping_path):
+    output_path, result = _fill(tmp_path, mapping_path, 'openpyxl', 10)
+
+    assert result["write_failures"] == [{
+        "sheet": ROLES, "cell": "entitlements",
+        "error": "6 rows need continuation sheets, which only the patch writer creates"
+    }]
+    assert set(_cells(output_path)) == set(_cells(TEMPLATE))
+
+
+@pytest.mark.parametrize('engine, role_count', [('patch', 3), ('patch', 10), ('openpyxl', 10)])
+def test_lexical_reader_matches_openpyxl(tmp_path, mapping_path, engine, role_count):
+    output_path, _ = _fill(tmp_path, mapping_path, engine, role_count)
+    plan = get_plan(TEMPLATE, mapping_path)
+
+    form = read_form(output_path, plan)
+    assert form == read_form_openpyxl(output_path, plan)
+    roles = form[ROLES]["roles"]
+    assert len(roles) == (role_count if engine == 'patch' else ROLES_MAX_ROW - 2)
+
+
+def _round_trips(original: zipfile.ZipFile, archive: bytes) -> None:
+    with zipfile.ZipFile(io.BytesIO(archive)) as copied:
+        assert copied.testzip() is None
+        for info in original.infolist():
+            assert copied.read(info.filename) == original.read(info.filename)
+
+
+def test_compressed_members_are_copied_raw():
+    # _copy_compressed writes through zipfile internals; this pins that it still
+    # produces a valid archive next to entries zipfile writes itself
+    template = TEMPLATE.read_bytes()
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(template)) as source:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+            for position, info in enumerate(source.infolist()):
+                if position == 1:
+                    target.writestr('extra/written.xml', b'<written/>')
+                if position == 2:
+                    with target.open(zipfile.ZipInfo('extra/streamed.xml'), 'w', force_zip64=True) as member:
+                        member.write(b'<streamed/>' * 1000)
+                assert _copy_compressed(source, target, info)
+        _round_trips(source, output.getvalue())
+    with zipfile.ZipFile(io.BytesIO(output.getvalue())) as copied:
+        assert copied.read('extra/streamed.xml') == b'<streamed/>' * 1000
+
+
+def test_patched_workbook_round_trips_untouched_members():
+    output = io.BytesIO()
+    rewritten = write_patched(TEMPLATE.read_bytes(), {GENERAL: {(12, 4): "Patched"}}, output)
+    with zipfile.ZipFile(TEMPLATE) as source:
+        untouched = [info.filename for info in source.infolist() if info.filename not in rewritten]
+        with zipfile.ZipFile(io.BytesIO(output.getvalue())) as patched:
+            assert patched.testzip() is None
+            for name in untouched:
+                assert patched.read(name) == source.read(name)
+
+
+def test_template_cache_parses_only_for_workbooks(monkeypatch):
+    parsed = []
+    load_template = templates.openpyxl.load_workbook
+
+    def counted(*args, **kwargs):
+        parsed.append(args)
+        return load_template(*args, **kwargs)
+
+    monkeypatch.setattr(templates.openpyxl, 'load_workbook', counted)
+    cache = TemplateCache()
+    raw, content_hash = cache.raw_bytes(TEMPLATE)
+    assert raw == TEMPLATE.read_bytes()
+    assert parsed == [] and cache.stats()["bytes"] == len(raw)
+
+    first, first_hash = cache.get(TEMPLATE)
+    second, _ = cache.get(TEMPLATE)
+    assert len(parsed) == 1 and first_hash == content_hash
+    assert second is not first and second.sheetnames == first.sheetnames
+    assert cache.stats()["bytes"] > len(raw)
+
+
+# Answer cells of the shipped mapping's label anchors: right of each question's merged label range
+LABEL_ANSWER_CELLS = {
+    (GENERAL, 'application_name'): 'D12',
+    (GENERAL, 'application_description'): 'D19',
+    (GENERAL, 'submitted_by'): 'D21',
+    (GENERAL, 'business_owner'): 'G25',
+    (GENERAL, 'development_type'): 'F29',
+    (GENERAL, 'total_active_users'): 'G34',
+    (GENERAL, 'total_roles'): 'G39',
+    (GENERAL, 'multiple_roles'): 'E40',
+    (GENERAL, 'sod_policies'): 'G44',
+    ('Application On-boarding Form', 'case_sensitive'): 'F13',
+    ('Application On-boarding Form', 'business_owner'): 'H20',
+}
+
+
+def test_label_anchors_resolve_to_answer_cells():
+    plan = get_plan(TEMPLATE, MAPPING)
+    resolved = {(name, spec["key"]): f"{get_column_letter(col)}{row}"
+                for name, cells, _, _ in plan.sheets for row, col, spec in cells if 'label' in spec}
+    assert {key: resolved.get(key) for key in LABEL_ANSWER_CELLS} == LABEL_ANSWER_CELLS
+
+    wb = load_workbook(TEMPLATE)
+    try:
+        for name, cells, _, _ in plan.sheets:
+            ws = wb[name]
+            for row, col, spec in cells:
+                if 'label' not in spec or 'offset' in spec:
+                    continue
+                # The question is the first cell of the row starting with the label...
+                label_cell = next(cell for cell in ws[row] if isinstance(cell.value, str)
+                                  and ' '.join(cell.value.split()).casefold().startswith(spec["label"].casefold()))
+                label_end = next((merged.max_col for merged in ws.merged_cells.ranges
+                                  if label_cell.coordinate in merged), label_cell.column)
+                # ...and the answer is the empty cell right after its merged range
+                assert (row, col) == (label_cell.row, label_end + 1), spec["key"]
+                assert ws.cell(row, col).value is None, spec["key"]
+    finally:
+        wb.close()
+
+
+def test_analysis_index_is_keyed_relative_to_the_project_root(tmp_path, monkeypatch):
+    import analyze_excel
+
+    monkeypatch.chdir(tmp_path)
+    output = tmp_path / 'analysis.json'
+    assert analyze_excel.main(['--workers', '1', '-o', str(output)]) == 0
+    committed = json.loads((analyze_excel.PROJECT_ROOT / 'excel_analysis.json').read_text(encoding='utf-8'))
+    assert list(json.loads(output.read_text(encoding='utf-8'))) == list(committed)
@@ -0,0 +1,10 @@
+"""Excel template helpers used to fill the SailPoint onboarding questionnaire."""
+from .cells import MergedCellIndex, get_merged_index, set_cells
+from .mapping import MappingError, WritePlan, compile_plan, evaluate, file_hash, get_write_plan, load_mapping, write_values
+from .patch import PatchError, patch_sheet_xml, write_patched
+from .templates import TemplateCache, get_template_cache
+from .fields import FieldIndex, detect_fields, get_field_index
+from .reader import ReadError, read_form, read_form_openpyxl
+from .filler import fill_form, get_plan
+from .batch import fill_forms
+from .analyze import analyze_templates, analyze_workbook
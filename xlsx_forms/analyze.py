@@ -0,0 +1,148 @@
+"""Structural analysis of onboarding templates, one parse per workbook.
+
+Each sheet is scanned once, row by row, with the lexical reader used for
+filled forms (openpyxl read-only mode as the fallback). That one pass yields
+everything the analysis reports: dimensions, the header row, a few sample
+rows and the empty cells per column. Sheets follow pandas' `read_excel`
+conventions, so the output matches the original `excel_analysis.json`: the
+first row is the header ("Unnamed: <i>" for empty header cells) and rows and
+columns run up to the last non-empty cell.
+
+`analyze_templates` spreads the workbooks of files and directories over a
+process pool and returns one index keyed by path.
+"""
+import os
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+from .patch import PatchError, sheet_parts
+from .reader import ReadError, SharedStrings, lexical_rows, openpyxl_rows
+
+DEFAULT_SAMPLE_ROWS = 3
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _column_names(header: dict, width: int) -> list:
+    """Header cell text per column, "Unnamed: <i>" when empty, with pandas' ".<n>" suffix on duplicates."""
+    names = []
+    seen = {}
+    for col in range(1, width + 1):
+        value = header.get(col)
+        name = f"Unnamed: {col - 1}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _analyze_sheet(rows, sample_rows: int) -> dict:
+    """Computes the analysis of one sheet from its (row number, row values) stream in one pass."""
+    header = {}
+    samples = {}
+    filled = {}
+    last_row = 0
+    width = 0
+    for row_number, values in rows:
+        cells = [(col, value) for col, value in values.items() if value is not None]
+        if not cells:
+            continue
+        last_row = row_number
+        width = max(width, cells[-1][0])
+        if row_number == 1:
+            header = dict(cells)
+            continue
+        if row_number - 1 <= sample_rows:
+            samples[row_number - 1] = dict(cells)
+        for col, _ in cells:
+            filled[col] = filled.get(col, 0) + 1
+
+    data_rows = max(last_row - 1, 0)
+    columns = _column_names(header, width)
+    return {
+        "dimensions": [data_rows, width],
+        "columns": columns,
+        "sample_data": [{name: samples.get(row, {}).get(col) for col, name in enumerate(columns, start=1)}
+                        for row in range(1, min(sample_rows, data_rows) + 1)],
+        "empty_cells": {name: data_rows - filled.get(col, 0) for col, name in enumerate(columns, start=1)}
+    }
+
+
+def analyze_workbook(path, sample_rows: int = DEFAULT_SAMPLE_ROWS) -> dict:
+    """
+    Analyzes every sheet of the workbook at `path`, parsing each sheet once.
+
+    Returns:
+        {sheet name: {dimensions, columns, sample_data, empty_cells}} in
+        workbook order, where dimensions is [data rows, columns]
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            strings = SharedStrings(archive)
+            return {name: _analyze_sheet(lexical_rows(archive, part, strings), sample_rows)
+                    for name, part in sheet_parts(archive).items()}
+    except (ReadError, PatchError, KeyError, IndexError, UnicodeDecodeError, ET.ParseError):
+        return analyze_workbook_openpyxl(path, sample_rows)
+
+
+def analyze_workbook_openpyxl(path, sample_rows: int = DEFAULT_SAMPLE_ROWS) -> dict:
+    """`analyze_workbook` using openpyxl's read-only, values-only mode."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return {name: _analyze_sheet(openpyxl_rows(wb[name]), sample_rows) for name in wb.sheetnames}
+    finally:
+        wb.close()
+
+
+def _analyze(path: str, sample_rows: int) -> dict:
+    start = time.perf_counter()
+    try:
+        sheets = analyze_workbook(path, sample_rows)
+    except Exception as e:
+        return {"status": "error", "message": f"Error analyzing workbook: {str(e)}", "parse_ms": _elapsed_ms(start)}
+    return {"status": "success", "sheets": sheets, "parse_ms": _elapsed_ms(start)}
+
+
+def find_workbooks(paths) -> list:
+    """Expands files and directories (searched recursively) into workbook paths, skipping Excel lock files."""
+    workbooks = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            workbooks.extend(sorted(candidate for candidate in path.rglob('*')
+                                    if candidate.suffix.lower() in WORKBOOK_SUFFIXES
+                                    and not candidate.name.startswith('~$')))
+        else:
+            workbooks.append(path)
+    return list(dict.fromkeys(str(workbook) for workbook in workbooks))
+
+
+def analyze_templates(paths, max_workers: int = None, sample_rows: int = DEFAULT_SAMPLE_ROWS) -> dict:
+    """
+    Analyzes many workbooks on a process pool.
+
+    Args:
+        paths: Workbook files and directories containing workbooks
+        max_workers: Analysis processes (defaults to the CPU count; 1 analyzes in-process)
+        sample_rows: Data rows to include as samples per sheet
+
+    Returns:
+        {workbook path: {status, sheets, parse_ms}} in input order, with a
+        message instead of sheets for workbooks that could not be analyzed
+    """
+    workbooks = find_workbooks(paths)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(workbooks)) or 1
+    executor = ThreadPoolExecutor(max_workers=1) if max_workers == 1 else ProcessPoolExecutor(max_workers=max_workers)
+    with executor:
+        results = executor.map(_analyze, workbooks, [sample_rows] * len(workbooks))
+        return dict(zip(workbooks, results))
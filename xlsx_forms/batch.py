@@ -0,0 +1,96 @@
+"""Fill onboarding forms for many applications in one call.
+
+MCP data is fetched concurrently on a thread pool (once per distinct
+endpoint), and each application's workbook is filled on a process pool as
+soon as its data arrives, so network waits and workbook CPU overlap. Every
+output is written atomically by `fill_form`.
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from .filler import fill_form
+
+DEFAULT_FETCH_WORKERS = int(os.environ.get('BATCH_FETCH_WORKERS', '16'))
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _fetch(fetch_data, mcp_url: str) -> tuple:
+    start = time.perf_counter()
+    try:
+        data = fetch_data(mcp_url)
+    except Exception as e:
+        data = {"status": "error", "message": f"Failed to fetch data from {mcp_url}: {str(e)}"}
+    return data, _elapsed_ms(start)
+
+
+def _fill(data: dict, template_path, output_path, mapping_path) -> dict:
+    start = time.perf_counter()
+    result = fill_form(data, template_path, output_path, mapping_path)
+    result["fill_ms"] = _elapsed_ms(start)
+    return result
+
+
+def _fill_executor(max_workers: int):
+    if max_workers == 1:
+        return ThreadPoolExecutor(max_workers=1)
+    # spawn rather than fork: the fetch threads are running while workers start
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def fill_forms(applications: list, fetch_data, max_workers: int = None,
+               fetch_workers: int = DEFAULT_FETCH_WORKERS) -> list:
+    """
+    Fills one form per application.
+
+    Args:
+        applications: Dicts with name, mcp_url, template_path, output_path and mapping_path
+        fetch_data: Callable taking an MCP query URL and returning the MCP data dict
+        max_workers: Fill processes (defaults to the CPU count; 1 fills in-process)
+        fetch_workers: Concurrent MCP fetches
+
+    Returns:
+        One result per application, in input order, with status, timings and
+        either the fill details or an error message
+    """
+    results = [None] * len(applications)
+    by_url = {}
+    for position, application in enumerate(applications):
+        by_url.setdefault(application['mcp_url'], []).append(position)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=min(fetch_workers, len(by_url)) or 1) as fetch_pool, \
+            _fill_executor(min(max_workers, len(applications)) or 1) as fill_pool:
+        fetches = {fetch_pool.submit(_fetch, fetch_data, url): url for url in by_url}
+        fills = {}
+
+        for future in as_completed(fetches):
+            data, fetch_ms = future.result()
+            for position in by_url[fetches[future]]:
+                application = applications[position]
+                if data.get("status") == "error":
+                    results[position] = dict(name=application['name'], status="error",
+                                             message=data.get("message"), fetch_ms=fetch_ms)
+                    continue
+                fill = fill_pool.submit(_fill, data, application['template_path'],
+                                        application['output_path'], application['mapping_path'])
+                fills[fill] = (position, fetch_ms)
+
+        for future in as_completed(fills):
+            position, fetch_ms = fills[future]
+            application = applications[position]
+            try:
+                fill = future.result()
+            except Exception as e:
+                results[position] = dict(name=application['name'], status="error",
+                                         message=f"Error filling Excel form: {str(e)}", fetch_ms=fetch_ms)
+                continue
+            results[position] = dict(name=application['name'], status="success",
+                                     output_file=str(application['output_path']),
+                                     fetch_ms=fetch_ms, **fill)
+
+    return results
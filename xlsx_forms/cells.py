@@ -0,0 +1,78 @@
+"""Merged-cell aware cell writes for openpyxl worksheets.
+
+openpyxl only lets you write to the top-left cell of a merged range. Rather
+than scanning `ws.merged_cells.ranges` on every write, `MergedCellIndex` maps
+each covered cell to its anchor once per worksheet, so each write resolves in
+O(1) no matter how many merged regions the template has.
+"""
+import weakref
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+
+
+class MergedCellIndex:
+    """Lookup from any cell inside a merged range to the range's top-left cell."""
+
+    def __init__(self, ws=None):
+        self._anchors = {}
+        for merged_range in ws.merged_cells.ranges if ws is not None else ():
+            self._add(merged_range.min_row, merged_range.min_col, merged_range.max_row, merged_range.max_col)
+
+    @classmethod
+    def from_ranges(cls, refs) -> 'MergedCellIndex':
+        """Builds the index from range references such as "B2:D4", e.g. a sheet's `<mergeCell>` elements."""
+        index = cls()
+        for ref in refs:
+            min_col, min_row, max_col, max_row = range_boundaries(ref)
+            index._add(min_row, min_col, max_row, max_col)
+        return index
+
+    def _add(self, min_row: int, min_col: int, max_row: int, max_col: int) -> None:
+        anchor = (min_row, min_col)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                self._anchors[(row, col)] = anchor
+
+    def __len__(self):
+        return len(self._anchors)
+
+    def resolve(self, cell_ref: str) -> tuple:
+        """Returns the (row, column) that holds the value for `cell_ref`."""
+        return self.resolve_position(*coordinate_to_tuple(cell_ref))
+
+    def resolve_position(self, row: int, col: int) -> tuple:
+        """`resolve` for a (row, column) position."""
+        return self._anchors.get((row, col), (row, col))
+
+
+# Indexes are built lazily on first write and live as long as their worksheet
+_indexes = weakref.WeakKeyDictionary()
+
+
+def get_merged_index(ws) -> MergedCellIndex:
+    """Returns the merged-cell index for `ws`, building it on first use."""
+    index = _indexes.get(ws)
+    if index is None:
+        index = _indexes[ws] = MergedCellIndex(ws)
+    return index
+
+
+def set_cells(ws, values: dict) -> list:
+    """
+    Writes several cells, redirecting merged cells to their top-left anchor.
+
+    Args:
+        ws: Worksheet to write to
+        values: Mapping of cell reference (e.g. 'C12') to value
+
+    Returns:
+        List of failed writes, each a dict with sheet, cell and error; empty on success
+    """
+    index = get_merged_index(ws)
+    failures = []
+    for cell_ref, value in values.items():
+        try:
+            row, col = index.resolve(cell_ref)
+            ws.cell(row=row, column=col).value = value
+        except Exception as e:
+            failures.append({"sheet": ws.title, "cell": cell_ref, "error": str(e)})
+    return failures
@@ -0,0 +1,233 @@
+"""Label index of a template's form fields, built once per template version.
+
+Mappings anchor fields by label text ("Total number of active users")
+rather than by address, so that template versions which move rows only need
+a new index, not a new mapping. `detect_fields` reads every sheet once,
+straight from the sheet XML: it does not load the workbook and is aware of
+merged cells. Each text cell becomes a label whose value cell is the first
+cell to its right, past the label's merged range. A label whose value cell
+is empty is reported as a form field.
+
+`FieldIndex.find` resolves a label (the text or a prefix of a longer
+question) by binary search over the sheet's sorted labels instead of
+scanning the sheet. `get_field_index` keeps indexes in memory and as
+JSON files named by template content hash under `XLSX_FIELD_INDEX_DIR`, so
+each template version is scanned once, ever.
+"""
+import io
+import os
+import re
+import json
+import bisect
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from collections import OrderedDict
+from openpyxl import load_workbook
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter
+
+from .cells import MergedCellIndex, get_merged_index
+from .patch import PatchError, sheet_parts
+from .reader import ReadError, SharedStrings, lexical_rows, openpyxl_rows
+
+FIELD_INDEX_DIR = os.environ.get('XLSX_FIELD_INDEX_DIR', str(Path.home() / '.cache' / 'xlsx_forms'))
+MAX_CACHED_INDEXES = 32
+INDEX_FORMAT_VERSION = 1
+
+# Longer text is a heading or instructions rather than a field label
+MAX_LABEL_LENGTH = 200
+
+MERGE_CELL_RE = re.compile(r'<mergeCell\b[^>]*\bref="([^"]+)"')
+
+
+def normalize_label(text) -> str:
+    """Label text compared case-insensitively, with runs of whitespace collapsed."""
+    return ' '.join(str(text).split()).casefold()
+
+
+def _cell_ref(position: tuple) -> str:
+    return f"{get_column_letter(position[1])}{position[0]}"
+
+
+def _index_sheet(rows, merged: MergedCellIndex) -> list:
+    """
+    Returns [label, label cell, value cell, value cell empty] for every text
+    cell of a sheet, in row-major order, from its (row number, row values) stream.
+    """
+    labels = []
+    anchors = []
+    filled = set()
+    for row_number, values in rows:
+        for col, value in sorted(values.items()):
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            filled.add((row_number, col))
+            if not isinstance(value, str):
+                continue
+            value_col = col + 1
+            while merged.resolve_position(row_number, value_col) == (row_number, col):
+                value_col += 1
+            labels.append([value, _cell_ref((row_number, col)), _cell_ref((row_number, value_col)), None])
+            anchors.append(merged.resolve_position(row_number, value_col))
+
+    # The value cell may be merged into a range anchored on an earlier row
+    for label, anchor in zip(labels, anchors):
+        label[3] = anchor not in filled
+    return labels
+
+
+class FieldIndex:
+    """Per sheet, label text -> value cell, for one template version."""
+
+    def __init__(self, template_hash: str, sheets: dict):
+        self.template_hash = template_hash
+        self.sheets = sheets
+        self._positions = {}
+        self._sorted = {}
+        for sheet_name, labels in sheets.items():
+            # First position of each normalized label in the sheet
+            positions = {}
+            for position, (label, _, _, _) in enumerate(labels):
+                positions.setdefault(normalize_label(label), position)
+            self._positions[sheet_name] = positions
+            self._sorted[sheet_name] = sorted(positions)
+
+    def find(self, sheet_name: str, label: str):
+        """
+        Returns the (row, col) of the value cell for the first label in the sheet
+        that equals or starts with `label` (normalized), or None.
+        """
+        positions = self._positions.get(sheet_name)
+        if positions is None:
+            return None
+        wanted = normalize_label(label)
+        keys = self._sorted[sheet_name]
+        # Labels starting with `wanted` are a contiguous run of the sorted labels
+        start = end = bisect.bisect_left(keys, wanted)
+        while end < len(keys) and keys[end].startswith(wanted):
+            end += 1
+        if start == end:
+            return None
+        # Earliest in the sheet among them, as a row-major scan would find
+        position = min(positions[key] for key in keys[start:end])
+        return coordinate_to_tuple(self.sheets[sheet_name][position][2])
+
+    def fields(self, sheet_name: str = None) -> dict:
+        """
+        Detected form fields: {sheet name: {label: value cell}} for labels of at
+        most MAX_LABEL_LENGTH characters whose value cell is empty.
+        """
+        names = [sheet_name] if sheet_name is not None else list(self.sheets)
+        return {name: {' '.join(label.split()): value_cell
+                       for label, _, value_cell, empty in self.sheets.get(name, [])
+                       if empty and len(label) <= MAX_LABEL_LENGTH}
+                for name in names}
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "template_hash": self.template_hash,
+            "sheets": {name: [{"label": label, "label_cell": label_cell, "value_cell": value_cell, "empty": empty}
+                              for label, label_cell, value_cell, empty in labels]
+                       for name, labels in self.sheets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FieldIndex':
+        return cls(data["template_hash"], {
+            name: [[entry["label"], entry["label_cell"], entry["value_cell"], entry["empty"]] for entry in labels]
+            for name, labels in data["sheets"].items()
+        })
+
+
+def detect_fields(template, template_hash: str = None) -> FieldIndex:
+    """
+    Scans every sheet of a template once and returns its `FieldIndex`.
+
+    Args:
+        template: Path to the template, or its zip bytes
+        template_hash: Content hash recorded in the index (see `mapping.file_hash`)
+    """
+    source = io.BytesIO(template) if isinstance(template, bytes) else template
+    try:
+        with zipfile.ZipFile(source) as archive:
+            strings = SharedStrings(archive)
+            sheets = {}
+            for name, part in sheet_parts(archive).items():
+                merged = MergedCellIndex.from_ranges(MERGE_CELL_RE.findall(archive.read(part).decode('utf-8')))
+                sheets[name] = _index_sheet(lexical_rows(archive, part, strings), merged)
+            return FieldIndex(template_hash, sheets)
+    except (ReadError, PatchError, KeyError, IndexError, UnicodeDecodeError, ET.ParseError):
+        if isinstance(source, io.BytesIO):
+            source.seek(0)
+        return detect_fields_openpyxl(source, template_hash)
+
+
+def detect_fields_openpyxl(template, template_hash: str = None) -> FieldIndex:
+    """`detect_fields` on a workbook loaded by openpyxl (read-only mode has no merged cells)."""
+    wb = load_workbook(template)
+    try:
+        return index_workbook(wb, template_hash)
+    finally:
+        wb.close()
+
+
+def index_workbook(wb, template_hash: str = None) -> FieldIndex:
+    """Returns the `FieldIndex` of an already loaded openpyxl workbook."""
+    return FieldIndex(template_hash, {ws.title: _index_sheet(openpyxl_rows(ws), get_merged_index(ws))
+                                      for ws in wb.worksheets})
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _index_path(template_hash: str, directory: str):
+    return Path(directory).expanduser() / f"{template_hash}.json" if directory and template_hash else None
+
+
+def get_field_index(template_hash: str, load_template, directory: str = None) -> FieldIndex:
+    """
+    Returns the field index of the template with `template_hash`.
+
+    Looked up in memory, then in `directory` (XLSX_FIELD_INDEX_DIR when None;
+    empty disables the files), and only detected when neither has it.
+
+    Args:
+        template_hash: Content hash of the template file
+        load_template: Callable returning the template's path or zip bytes,
+            only called when the index has to be detected
+        directory: Directory of the persisted indexes
+    """
+    with _lock:
+        index = _indexes.get(template_hash)
+        if index is not None:
+            _indexes.move_to_end(template_hash)
+            return index
+
+    path = _index_path(template_hash, FIELD_INDEX_DIR if directory is None else directory)
+    index = None
+    if path is not None and path.exists():
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            if data.get("version") == INDEX_FORMAT_VERSION and data.get("template_hash") == template_hash:
+                index = FieldIndex.from_dict(data)
+        except (OSError, ValueError, KeyError):
+            index = None
+    if index is None:
+        index = detect_fields(load_template(), template_hash)
+        if path is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                temporary.write_text(json.dumps(index.to_dict()), encoding='utf-8')
+                os.replace(temporary, path)
+            except OSError:
+                pass
+
+    with _lock:
+        _indexes[template_hash] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,100 @@
+"""Fill a template from MCP data and write the result.
+
+This is the workbook half of `fill_excel_form`, without the MCP fetch or the
+agent, so it can also run in batch worker processes.
+"""
+import os
+from pathlib import Path
+
+from agent_tracing import span
+
+from .fields import get_field_index
+from .mapping import continuation_sheet_name, get_write_plan, load_mapping, write_values
+from .patch import PatchError, write_patched
+from .templates import get_template_cache
+
+# 'patch' rewrites only the changed sheet parts of the template; 'openpyxl' re-saves the whole workbook
+WRITE_ENGINE = os.environ.get('XLSX_WRITE_ENGINE', 'patch')
+
+
+def get_plan(template_path, mapping_path):
+    """
+    Returns the write plan for the template and mapping, compiling it on first use.
+
+    Label anchors are resolved through the template's persisted field index,
+    so only the first process to see a template version scans it for labels.
+    """
+    template_cache = get_template_cache()
+    template_bytes, template_hash = template_cache.raw_bytes(template_path)
+    return get_write_plan(template_hash, load_mapping(mapping_path),
+                          lambda: template_cache.get(template_path)[0],
+                          lambda: get_field_index(template_hash, lambda: template_bytes))
+
+
+def _temporary_path(output_path: Path) -> Path:
+    return output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+
+
+def fill_form(data: dict, template_path, output_path, mapping_path, engine: str = None) -> dict:
+    """
+    Fills the template with `data` and writes it to `output_path`.
+
+    The workbook is written to a temporary file next to the output and moved
+    into place, so readers never see a partially written form.
+
+    Args:
+        data: MCP data (user_count, entitlements, ...) the mapping refers to
+        template_path: Path to the Excel template
+        output_path: Path for the filled workbook
+        mapping_path: Path to the field mapping file
+        engine: 'patch' or 'openpyxl' (defaults to XLSX_WRITE_ENGINE)
+
+    Returns:
+        Dictionary with filled_sheets, write_failures, write_engine and template_cache stats
+    """
+    template_cache = get_template_cache()
+    with span('xlsx.plan'):
+        template_bytes, _ = template_cache.raw_bytes(template_path)
+        plan = get_plan(template_path, mapping_path)
+    filled_sheets = plan.sheet_names
+
+    output_path = Path(output_path)
+    temporary_path = _temporary_path(output_path)
+    write_engine = engine or WRITE_ENGINE
+    try:
+        # Patch only the changed sheet parts into a copy of the template, streaming
+        # table rows, and fall back to a full openpyxl save if the template can't be patched
+        if write_engine == 'patch':
+            with span('xlsx.render'):
+                values, tables, write_failures = plan.render_streaming(data)
+            try:
+                with span('xlsx.patch'):
+                    write_patched(template_bytes, values, str(temporary_path), tables)
+                filled_sheets = filled_sheets + [
+                    continuation_sheet_name(sheet_name, number)
+                    for sheet_name, sheet_tables in tables.items()
+                    for number in range(2, max(table.sheet_count for table in sheet_tables) + 1)]
+            except PatchError:
+                write_engine = 'openpyxl'
+        if write_engine != 'patch':
+            write_engine = 'openpyxl'
+            with span('xlsx.render'):
+                values, write_failures = plan.render(data)
+            with span('xlsx.load_workbook'):
+                wb, _ = template_cache.get(template_path)
+            with span('xlsx.write_values'):
+                write_failures += write_values(wb, values)
+            with span('xlsx.save'):
+                wb.save(str(temporary_path))
+            wb.close()
+        os.replace(temporary_path, output_path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+    return {
+        "filled_sheets": filled_sheets,
+        "write_failures": write_failures,
+        "write_engine": write_engine,
+        "template_cache": template_cache.stats()
+    }
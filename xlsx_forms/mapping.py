@@ -0,0 +1,391 @@
+"""Declarative field mappings compiled into per-template write plans.
+
+A mapping file lists, per sheet, which cell receives which value:
+
+    {
+      "sheets": [
+        {
+          "sheet": "Application General Information",
+          "fields": [
+            {"label": "Application Name", "value": "MongoDB Authorization App"},
+            {"label": "Total number of active users", "template": "{user_count}"},
+            {"cell": "G13", "field": "hostname"}
+          ],
+          "tables": [
+            {"source": "entitlements", "start_row": 3,
+             "columns": {"G": {"field": "index"}, "H": {"field": "item"}}}
+          ]
+        }
+      ]
+    }
+
+A field is anchored either by `cell` or by `label` (the value goes in the first
+cell right of the first label in the sheet starting with that text, past any
+merged range; `offset` [rows, cols] moves it). Labels are resolved through
+the template's field index (see `fields.py`), so a template version that
+moves rows needs no mapping change.
+Its value is one of:
+
+- `value`: a literal
+- `field`: a (dotted) key looked up in the MCP data, written as-is
+- `template`: a `str.format` string over the MCP data; the extra conversions
+  `!n` (length) and `!j` (comma-joined list) are available, e.g.
+  "{entitlements!n} roles: {entitlements!j}"
+
+Tables write one row per item of the `source` list starting at `start_row`,
+with `item` and `index` (1-based) added to the data for each row. Table rows
+are evaluated lazily (`TableRows`), so the patch writer can stream very large
+tables into the sheet without holding them in memory. Rows past the sheet's
+row limit (or the table's `max_rows`) are not written unless the table sets
+`"split": true`, in which case they continue on copies of the sheet named
+"Roles (2)", "Roles (3)", ...
+
+`get_write_plan` compiles a mapping against a template once: sheets are
+grouped, label anchors looked up and merged cells resolved to their top-left
+cell. Plans are cached by template content hash, so filling many forms from
+the same template does no cell resolution at all.
+"""
+import json
+import string
+import hashlib
+import functools
+import threading
+from pathlib import Path
+from collections import ChainMap, OrderedDict
+from collections.abc import Sequence
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple, get_column_letter
+
+from .cells import MergedCellIndex
+
+MAX_CACHED_PLANS = 32
+
+# Rows per worksheet in Excel
+EXCEL_MAX_ROWS = 1048576
+MAX_SHEET_NAME_LENGTH = 31
+
+
+class MappingError(ValueError):
+    """Raised when a mapping file is malformed or cannot be resolved against a template."""
+
+
+class _ValueFormatter(string.Formatter):
+    """str.format restricted to data lookups, with !n (len) and !j (join) conversions."""
+
+    def get_field(self, field_name, args, kwargs):
+        return _lookup(kwargs, field_name), field_name
+
+    def convert_field(self, value, conversion):
+        if conversion == 'n':
+            return len(value)
+        if conversion == 'j':
+            return ', '.join(str(item) for item in value)
+        return super().convert_field(value, conversion)
+
+
+_formatter = _ValueFormatter()
+
+
+def _lookup(data, path):
+    value = data
+    for part in path.split('.'):
+        value = value[int(part)] if isinstance(value, (list, tuple)) else value[part]
+    return value
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_template(template: str):
+    """Splits a template into (literal, field, conversion, format spec) parts, or None if it needs vformat."""
+    parts = []
+    for literal, field_name, format_spec, conversion in _formatter.parse(template):
+        # Positional and nested replacement fields are left to string.Formatter
+        if field_name is not None and (not field_name or field_name.isdigit() or '{' in format_spec):
+            return None
+        parts.append((literal, field_name, conversion, format_spec))
+    return parts
+
+
+def _format(template: str, data) -> str:
+    parts = _parse_template(template)
+    if parts is None:
+        return _formatter.vformat(template, (), data)
+    out = []
+    for literal, field_name, conversion, format_spec in parts:
+        out.append(literal)
+        if field_name is not None:
+            value = _formatter.convert_field(_lookup(data, field_name), conversion)
+            out.append(format(value, format_spec))
+    return ''.join(out)
+
+
+def evaluate(spec: dict, data: dict):
+    """Returns the value a field spec produces for `data`."""
+    if 'value' in spec:
+        return spec['value']
+    if 'field' in spec:
+        return _lookup(data, spec['field'])
+    if 'template' in spec:
+        return _format(spec['template'], data)
+    raise MappingError(f"Field spec needs one of value, field or template: {spec}")
+
+
+def continuation_sheet_name(sheet_name: str, number: int) -> str:
+    """Returns the name of the `number`th sheet a split table continues on ("Roles (2)")."""
+    suffix = f" ({number})"
+    return sheet_name[:MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+
+
+class TableRows:
+    """
+    The rows one table renders for `data`, evaluated only while they are iterated.
+
+    Rows are grouped into per-sheet chunks of at most `rows_per_sheet`; chunk 0
+    goes to the table's own sheet and later chunks to its continuation sheets.
+    Failed cells are appended to `failures` as rows are produced.
+    """
+
+    def __init__(self, sheet_name: str, table: dict, index: MergedCellIndex, data: dict, failures: list):
+        self.sheet_name = sheet_name
+        self.table = table
+        self._index = index
+        self._data = data
+        self._failures = failures
+        self._columns = [(column_index_from_string(letter), letter, spec) for letter, spec in table['columns'].items()]
+        self.rows_per_sheet = table.get('max_rows', EXCEL_MAX_ROWS) - table['start_row'] + 1
+
+        try:
+            items = _lookup(data, table['source'])
+        except (KeyError, IndexError, TypeError) as e:
+            failures.append({"sheet": sheet_name, "cell": table['source'], "error": f"Missing table source: {e}"})
+            items = []
+        self._items = items if isinstance(items, Sequence) else list(items)
+
+        chunks = max(-(-len(self._items) // self.rows_per_sheet), 1)
+        self.sheet_count = chunks if table.get('split') else 1
+        if chunks > self.sheet_count:
+            dropped = len(self._items) - self.rows_per_sheet
+            failures.append({"sheet": sheet_name, "cell": table['source'],
+                             "error": f"{dropped} rows past the sheet's row limit were not written"})
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _bounds(self, chunk: int) -> tuple:
+        first = chunk * self.rows_per_sheet
+        return first, min(first + self.rows_per_sheet, len(self._items))
+
+    def extent(self, chunk: int = 0) -> list:
+        """Returns the top-left and bottom-right (row, col) a chunk can write, or [] if it is empty."""
+        first, stop = self._bounds(chunk)
+        if stop <= first:
+            return []
+        cols = [col for col, _, _ in self._columns]
+        start_row = self.table['start_row']
+        return [(start_row, min(cols)), (start_row + stop - first - 1, max(cols))]
+
+    def rows(self, chunk: int = 0):
+        """Yields (row number, {col: value}) for one chunk, in row order."""
+        first, stop = self._bounds(chunk)
+        start_row = self.table['start_row']
+        for offset in range(first, stop):
+            row_data = ChainMap({'item': self._items[offset], 'index': offset + 1}, self._data)
+            row_number = start_row + offset - first
+            values = {}
+            for column, letter, spec in self._columns:
+                try:
+                    row, col = self._index.resolve_position(row_number, column)
+                    if row != row_number:
+                        raise MappingError(f"Merged range at {letter}{row_number} spans several table rows")
+                    values[col] = evaluate(spec, row_data)
+                except Exception as e:
+                    self._failures.append({"sheet": self.sheet_name, "cell": f"{letter}{row_number}", "error": str(e)})
+            yield row_number, values
+
+
+class WritePlan:
+    """A mapping compiled against one template: resolved target cells grouped by sheet."""
+
+    def __init__(self, template_hash: str, sheets: list, missing_sheets: list):
+        self.template_hash = template_hash
+        # [(sheet name, [(row, col, spec)], [table spec], MergedCellIndex)]
+        self.sheets = sheets
+        self.missing_sheets = missing_sheets
+
+    @property
+    def sheet_names(self) -> list:
+        return [sheet[0] for sheet in self.sheets]
+
+    def render(self, data: dict) -> tuple:
+        """
+        Evaluates every planned value against `data` without touching a workbook.
+
+        Tables are materialized on their own sheet; rows a split table would
+        put on continuation sheets are reported as failures (only the patch
+        writer creates continuation sheets, see `render_streaming`).
+
+        Returns:
+            ({sheet name: {(row, col): value}}, failures) where each failure is a
+            dict with sheet, cell and error
+        """
+        values, tables, failures = self.render_streaming(data)
+        for sheet_name, sheet_tables in tables.items():
+            sheet_values = values[sheet_name]
+            for table in sheet_tables:
+                for row, row_values in table.rows():
+                    for col, value in row_values.items():
+                        sheet_values[(row, col)] = value
+                if table.sheet_count > 1:
+                    failures.append({"sheet": sheet_name, "cell": table.table['source'],
+                                     "error": f"{len(table) - table.rows_per_sheet} rows need continuation "
+                                              f"sheets, which only the patch writer creates"})
+        return values, failures
+
+    def render_streaming(self, data: dict) -> tuple:
+        """
+        Like `render`, but leaves tables unevaluated.
+
+        Returns:
+            ({sheet name: {(row, col): value}}, {sheet name: [TableRows]}, failures);
+            iterating the tables appends their failed cells to `failures`
+        """
+        values = {}
+        tables = {}
+        failures = []
+        for sheet_name, cells, sheet_tables, index in self.sheets:
+            sheet_values = values[sheet_name] = {}
+            for row, col, spec in cells:
+                try:
+                    sheet_values[(row, col)] = evaluate(spec, data)
+                except Exception as e:
+                    failures.append({"sheet": sheet_name, "cell": f"{get_column_letter(col)}{row}", "error": str(e)})
+            if sheet_tables:
+                tables[sheet_name] = [TableRows(sheet_name, table, index, data, failures) for table in sheet_tables]
+        return values, tables, failures
+
+    def apply(self, wb, data: dict) -> list:
+        """
+        Writes every planned value into `wb` (a workbook loaded from the planned template).
+
+        Returns:
+            List of failed writes, each a dict with sheet, cell and error
+        """
+        values, failures = self.render(data)
+        return failures + write_values(wb, values)
+
+
+def write_values(wb, values: dict) -> list:
+    """Writes rendered {sheet name: {(row, col): value}} into `wb`, returning failed writes."""
+    failures = []
+    for sheet_name, sheet_values in values.items():
+        ws = wb[sheet_name]
+        for (row, col), value in sheet_values.items():
+            try:
+                ws.cell(row=row, column=col).value = value
+            except Exception as e:
+                failures.append({"sheet": sheet_name, "cell": f"{get_column_letter(col)}{row}", "error": str(e)})
+    return failures
+
+
+def compile_plan(wb, mapping: dict, template_hash: str = None, fields=None) -> WritePlan:
+    """
+    Resolves every field of `mapping` against the sheets of `wb`.
+
+    Label anchors are looked up in `fields`, the template's `FieldIndex`,
+    which is built from `wb` when not given.
+    """
+    sheets = []
+    missing_sheets = []
+
+    for sheet_spec in mapping.get('sheets', []):
+        name = sheet_spec['sheet']
+        if name not in wb.sheetnames:
+            missing_sheets.append(name)
+            continue
+
+        ws = wb[name]
+        index = MergedCellIndex(ws)
+        cells = []
+        for field in sheet_spec.get('fields', []):
+            if 'cell' in field:
+                row, col = coordinate_to_tuple(field['cell'])
+            elif 'label' in field:
+                if fields is None:
+                    # fields imports the reader, which imports this module
+                    from .fields import index_workbook
+                    fields = index_workbook(wb, template_hash)
+                position = fields.find(name, field['label'])
+                if position is None:
+                    raise MappingError(f"Label not found in sheet '{name}': {field['label']!r}")
+                row, col = position
+            else:
+                raise MappingError(f"Field needs a cell or label anchor: {field}")
+            row_offset, col_offset = field.get('offset', (0, 0))
+            row, col = index.resolve(f"{get_column_letter(col + col_offset)}{row + row_offset}")
+            cells.append((row, col, field))
+
+        tables = sheet_spec.get('tables', [])
+        for table in tables:
+            if not table['start_row'] <= table.get('max_rows', EXCEL_MAX_ROWS) <= EXCEL_MAX_ROWS:
+                raise MappingError(f"Table max_rows must be between start_row and {EXCEL_MAX_ROWS}: {table}")
+        sheets.append((name, cells, tables, index))
+
+    return WritePlan(template_hash, sheets, missing_sheets)
+
+
+_mappings = {}
+_plans = OrderedDict()
+_lock = threading.Lock()
+
+
+def load_mapping(path) -> dict:
+    """Loads a mapping file, reusing the parsed copy while the file is unchanged."""
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    with _lock:
+        cached = _mappings.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    with open(path, encoding='utf-8') as f:
+        mapping = json.load(f)
+    with _lock:
+        _mappings[path] = (mtime, mapping)
+    return mapping
+
+
+def file_hash(path) -> str:
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_write_plan(template_hash: str, mapping: dict, load_template, load_fields=None) -> WritePlan:
+    """
+    Returns the compiled plan for `mapping` on the template with `template_hash`.
+
+    Args:
+        template_hash: Content hash of the template file (see `file_hash`)
+        mapping: Parsed mapping file
+        load_template: Callable returning a workbook loaded from the template,
+            only called when the plan is not cached yet
+        load_fields: Callable returning the template's `FieldIndex` (e.g. from
+            `get_field_index`); the index is built from the workbook when None
+
+    Returns:
+        The cached or newly compiled `WritePlan`
+    """
+    key = (template_hash, hashlib.sha256(json.dumps(mapping, sort_keys=True).encode()).hexdigest())
+    with _lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+
+    plan = compile_plan(load_template(), mapping, template_hash, load_fields() if load_fields else None)
+    with _lock:
+        _plans[key] = plan
+        while len(_plans) > MAX_CACHED_PLANS:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,420 @@
+"""Write filled forms by patching the template package instead of re-serializing it.
+
+`wb.save()` regenerates every part of the workbook (styles, shared strings,
+drawings, untouched sheets) even when only a few dozen cells changed.
+`write_patched` instead copies the template zip member by member: untouched
+members are copied as their already-compressed bytes, and only the sheet XML
+parts that receive values are rewritten. The rewrite is lexical and streams
+over the `<row>` elements of `<sheetData>`; rows without changes are copied
+verbatim, so namespace prefixes, extension lists and everything else Excel put
+in the part survive unchanged.
+
+Strings are written as inline strings (`t="inlineStr"`) so the shared string
+table never has to be rebuilt. Cells keep their existing style index.
+
+Table rows (`TableRows`) are streamed into the zip member as they are
+evaluated, so a Roles sheet with hundreds of thousands of entitlements is
+written in constant memory. Split tables get continuation sheets: copies of
+the template sheet appended to the workbook, each holding the next chunk of
+rows.
+
+Anything this writer does not understand raises `PatchError`; callers fall
+back to openpyxl, which remains the reference implementation.
+"""
+import io
+import re
+import copy
+import heapq
+import struct
+import zipfile
+import posixpath
+from xml.sax.saxutils import escape, quoteattr
+import xml.etree.ElementTree as ET
+from openpyxl.utils.cell import coordinate_to_tuple, get_column_letter
+
+from .mapping import continuation_sheet_name
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+SHEET_DATA_RE = re.compile(r'<sheetData\s*/>|<sheetData\b[^>]*>(.*?)</sheetData>', re.S)
+ROW_RE = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+CELL_RE = re.compile(r'<c\b([^>]*?)(?:/>|>.*?</c>)', re.S)
+ROW_NUMBER_RE = re.compile(r'\br="(\d+)"')
+CELL_REF_RE = re.compile(r'\br="([A-Z]+)(\d+)"')
+STYLE_RE = re.compile(r'\bs="(\d+)"')
+SPANS_RE = re.compile(r'\s+spans="[^"]*"')
+DIMENSION_RE = re.compile(r'<dimension\s+ref="([^"]+)"\s*/>')
+TAB_SELECTED_RE = re.compile(r'\s+tabSelected="[^"]*"')
+RELATIONSHIP_ELEMENT_RE = re.compile(r'<(\w+)\b[^>]*\br:id="[^"]*"[^>]*/>')
+RELATIONSHIP_ID_RE = re.compile(r'\bId="rId(\d+)"')
+SHEET_ID_RE = re.compile(r'\bsheetId="(\d+)"')
+ILLEGAL_XML_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Excel's limit on characters per cell; openpyxl truncates to it as well
+MAX_CELL_LENGTH = 32767
+
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_FLAG = 0x08
+CALC_CHAIN = 'xl/calcChain.xml'
+WORKSHEET_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+WORKSHEET_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet'
+
+# Characters buffered before a streamed sheet part is handed to the compressor
+STREAM_BUFFER_SIZE = 1 << 20
+
+
+class PatchError(Exception):
+    """Raised when a template cannot be patched and the openpyxl path should be used."""
+
+
+def sheet_parts(archive: zipfile.ZipFile) -> dict:
+    """Returns {sheet name: zip member name} from the workbook part and its relationships."""
+    try:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    except (KeyError, ET.ParseError) as e:
+        raise PatchError(f"Cannot read workbook part: {e}") from e
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship')}
+
+    parts = {}
+    for sheet in workbook.iter(f'{{{MAIN_NS}}}sheet'):
+        target = targets.get(sheet.get(f'{{{REL_NS}}}id'))
+        if target is None:
+            raise PatchError(f"Sheet {sheet.get('name')!r} has no relationship target")
+        if target.startswith('/'):
+            parts[sheet.get('name')] = target.lstrip('/')
+        else:
+            parts[sheet.get('name')] = posixpath.normpath(posixpath.join('xl', target))
+    return parts
+
+
+def _cell_xml(ref: str, value, style: str) -> str:
+    style_attr = f' s="{style}"' if style else ''
+    if value is None:
+        return f'<c r="{ref}"{style_attr}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+    if isinstance(value, str):
+        if ILLEGAL_XML_CHARS_RE.search(value):
+            raise PatchError(f"Cell {ref} value contains characters not allowed in XML")
+        value = value[:MAX_CELL_LENGTH]
+        return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    raise PatchError(f"Cell {ref}: unsupported value type {type(value).__name__}")
+
+
+def _patch_row(row_number: int, attrs: str, body: str, values: dict) -> str:
+    cells = {}
+    for match in CELL_RE.finditer(body or ''):
+        ref = CELL_REF_RE.search(match.group(1))
+        if ref is None:
+            raise PatchError(f"Row {row_number} has a cell without a reference")
+        cells[coordinate_to_tuple(ref.group(1) + ref.group(2))[1]] = match.group(0)
+
+    for col, value in values.items():
+        existing = cells.get(col)
+        style = STYLE_RE.search(existing) if existing else None
+        cells[col] = _cell_xml(f"{get_column_letter(col)}{row_number}", value, style.group(1) if style else None)
+
+    # spans is only an optimisation hint and may no longer cover the written cells
+    attrs = SPANS_RE.sub('', attrs)
+    return f'<row{attrs}>' + ''.join(cells[col] for col in sorted(cells)) + '</row>'
+
+
+def _expand_dimension(xml: str, positions) -> str:
+    match = DIMENSION_RE.search(xml)
+    if match is None or not positions:
+        return xml
+
+    bounds = match.group(1).split(':')
+    min_row, min_col = coordinate_to_tuple(bounds[0])
+    max_row, max_col = coordinate_to_tuple(bounds[-1])
+    for row, col in positions:
+        min_row, max_row = min(min_row, row), max(max_row, row)
+        min_col, max_col = min(min_col, col), max(max_col, col)
+
+    ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}"
+    return xml[:match.start()] + f'<dimension ref="{ref}"/>' + xml[match.end():]
+
+
+def _merge_rows(*sources):
+    """Merges (row number, {col: value}) streams sorted by row, combining rows that repeat."""
+    current, current_values = None, None
+    for row_number, values in heapq.merge(*sources, key=lambda row: row[0]):
+        if row_number != current:
+            if current is not None:
+                yield current, current_values
+            current, current_values = row_number, {}
+        current_values.update(values)
+    if current is not None:
+        yield current, current_values
+
+
+def _value_rows(values: dict) -> list:
+    rows = {}
+    for (row, col), value in values.items():
+        rows.setdefault(row, {})[col] = value
+    return sorted(rows.items())
+
+
+def write_sheet_xml(xml: str, rows, write, positions=()) -> None:
+    """
+    Streams the sheet XML with `rows` written into it to `write`.
+
+    Args:
+        xml: Template sheet part
+        rows: (row number, {col: value}) in ascending row order; rows that do not
+            exist in the template are inserted, template rows without changes
+            are copied verbatim
+        write: Callable receiving the output in pieces
+        positions: (row, col) cells the dimension must cover
+    """
+    sheet_data = SHEET_DATA_RE.search(xml)
+    if sheet_data is None:
+        raise PatchError("Sheet part has no sheetData element")
+
+    head = _expand_dimension(xml[:sheet_data.start()], positions)
+    write(head + '<sheetData>')
+
+    pending = iter(rows)
+    pending_row = next(pending, None)
+    for match in ROW_RE.finditer(sheet_data.group(1) or ''):
+        number = ROW_NUMBER_RE.search(match.group(1))
+        if number is None:
+            raise PatchError("Row without a row number")
+        row_number = int(number.group(1))
+
+        # New rows that sort before this one
+        while pending_row is not None and pending_row[0] < row_number:
+            write(_patch_row(pending_row[0], f' r="{pending_row[0]}"', '', pending_row[1]))
+            pending_row = next(pending, None)
+
+        if pending_row is not None and pending_row[0] == row_number:
+            write(_patch_row(row_number, match.group(1), match.group(2), pending_row[1]))
+            pending_row = next(pending, None)
+        else:
+            write(match.group(0))
+
+    while pending_row is not None:
+        write(_patch_row(pending_row[0], f' r="{pending_row[0]}"', '', pending_row[1]))
+        pending_row = next(pending, None)
+
+    write('</sheetData>' + xml[sheet_data.end():])
+
+
+def patch_sheet_xml(xml: str, values: dict) -> str:
+    """
+    Returns the sheet XML with `values` ({(row, col): value}) written into it.
+
+    Rows and cells that do not exist yet are inserted in order; rows without
+    changes are copied verbatim.
+    """
+    out = []
+    write_sheet_xml(xml, _value_rows(values), out.append, values.keys())
+    return ''.join(out)
+
+
+def _continuation_xml(xml: str, part: str) -> str:
+    # A copy must not claim the original's selection or its drawings, comments and printer settings
+    xml = TAB_SELECTED_RE.sub('', RELATIONSHIP_ELEMENT_RE.sub('', xml))
+    if 'r:id=' in xml:
+        raise PatchError(f"Sheet part {part} has relationships a continuation sheet cannot copy")
+    return xml
+
+
+def _add_sheets(source: zipfile.ZipFile, sheets: list) -> dict:
+    """
+    Registers new worksheet parts in the workbook, its relationships and the content types.
+
+    Args:
+        sheets: (sheet name, part name) pairs
+
+    Returns:
+        {member name: rewritten bytes}
+    """
+    workbook = source.read('xl/workbook.xml').decode('utf-8')
+    rels = source.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    content_types = source.read('[Content_Types].xml').decode('utf-8')
+    if '</sheets>' not in workbook or '</Relationships>' not in rels or '</Types>' not in content_types:
+        raise PatchError("Cannot add sheets to this workbook")
+
+    next_sheet_id = max(map(int, SHEET_ID_RE.findall(workbook)), default=0) + 1
+    next_rel_id = max(map(int, RELATIONSHIP_ID_RE.findall(rels)), default=0) + 1
+    new_sheets, new_rels, new_types = [], [], []
+    for offset, (sheet_name, part) in enumerate(sheets):
+        rel_id = f"rId{next_rel_id + offset}"
+        new_sheets.append(f'<sheet name={quoteattr(sheet_name)} sheetId="{next_sheet_id + offset}" r:id="{rel_id}"/>')
+        new_rels.append(f'<Relationship Id="{rel_id}" Type="{WORKSHEET_REL_TYPE}" '
+                        f'Target="{posixpath.relpath(part, "xl")}"/>')
+        new_types.append(f'<Override PartName="/{part}" ContentType="{WORKSHEET_CONTENT_TYPE}"/>')
+
+    return {
+        'xl/workbook.xml': workbook.replace('</sheets>', ''.join(new_sheets) + '</sheets>', 1).encode('utf-8'),
+        'xl/_rels/workbook.xml.rels': rels.replace('</Relationships>', ''.join(new_rels) + '</Relationships>', 1).encode('utf-8'),
+        '[Content_Types].xml': content_types.replace('</Types>', ''.join(new_types) + '</Types>', 1).encode('utf-8'),
+    }
+
+
+def _plan_continuations(source: zipfile.ZipFile, parts: dict, tables: dict) -> list:
+    """Returns (sheet name, part name, template part, chunk, [TableRows]) for every continuation sheet."""
+    names = set(source.namelist())
+    number = len(names)
+    continuations = []
+    for sheet_name, sheet_tables in tables.items():
+        for chunk in range(1, max(table.sheet_count for table in sheet_tables)):
+            continuation = continuation_sheet_name(sheet_name, chunk + 1)
+            if continuation in parts:
+                raise PatchError(f"Continuation sheet name already in use: {continuation}")
+            while f'xl/worksheets/sheet{number}.xml' in names:
+                number += 1
+            part = f'xl/worksheets/sheet{number}.xml'
+            names.add(part)
+            split = [table for table in sheet_tables if table.sheet_count > chunk]
+            continuations.append((continuation, part, parts[sheet_name], chunk, split))
+    return continuations
+
+
+def _drop_calc_chain(name: str, data: bytes) -> bytes:
+    # Overwritten formula cells would leave dangling calcChain entries; Excel rebuilds it
+    text = data.decode('utf-8')
+    if name == '[Content_Types].xml':
+        text = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', '', text)
+    else:
+        text = re.sub(r'<Relationship\b[^>]*Target="(?:/xl/)?calcChain\.xml"[^>]*/>', '', text)
+    return text.encode('utf-8')
+
+
+def _copy_compressed(source: zipfile.ZipFile, target: zipfile.ZipFile, info: zipfile.ZipInfo) -> bool:
+    """
+    Copies a member's compressed bytes without inflating and re-deflating them.
+
+    zipfile has no public API for this, so it writes the local header and data
+    itself and registers the entry the way `ZipFile.writestr` does. Returns
+    False when the member or this zipfile version is not suitable.
+    """
+    # Relies on ZipFile.fp, start_dir, filelist, NameToInfo and _didModify, which
+    # writestr and open('w') maintain the same way in CPython 3.9 through 3.13
+    # (checked on 3.9.18, 3.10.13, 3.11.7, 3.12.1 and 3.13.0). The hasattr check
+    # only catches renamed attributes; tests/test_xlsx_forms.py fails if copied
+    # archives stop opening or round-tripping.
+    if info.flag_bits & 0x01 or not all(hasattr(target, attr) for attr in ('fp', 'filelist', 'NameToInfo', 'start_dir')):
+        return False
+
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(LOCAL_HEADER_SIZE)
+    if header[:4] != b'PK\x03\x04':
+        return False
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+    data = source.fp.read(info.compress_size)
+
+    entry = copy.copy(info)
+    # Sizes and CRC are known up front, so no trailing data descriptor is written
+    entry.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    target.fp.seek(target.start_dir)
+    entry.header_offset = target.fp.tell()
+    target.fp.write(entry.FileHeader())
+    target.fp.write(data)
+    target.start_dir = target.fp.tell()
+    target.filelist.append(entry)
+    target.NameToInfo[entry.filename] = entry
+    target._didModify = True
+    return True
+
+
+def _stream_member(target: zipfile.ZipFile, name: str, date_time, write_xml) -> None:
+    entry = zipfile.ZipInfo(name, date_time=date_time)
+    entry.compress_type = zipfile.ZIP_DEFLATED
+    with target.open(entry, 'w', force_zip64=True) as member:
+        buffer, size = [], 0
+
+        def write(text):
+            nonlocal size
+            buffer.append(text)
+            size += len(text)
+            if size >= STREAM_BUFFER_SIZE:
+                member.write(''.join(buffer).encode('utf-8'))
+                buffer.clear()
+                size = 0
+
+        write_xml(write)
+        member.write(''.join(buffer).encode('utf-8'))
+
+
+def _read_sheet(source: zipfile.ZipFile, part: str) -> str:
+    try:
+        return source.read(part).decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise PatchError(f"Sheet part {part} is not UTF-8") from e
+
+
+def write_patched(template: bytes, values: dict, output, tables: dict = None) -> list:
+    """
+    Writes the template with cell values patched in.
+
+    Args:
+        template: Raw bytes of the template xlsx
+        values: {sheet name: {(row, col): value}} with merged cells already
+            resolved to their top-left cell (see `WritePlan.render`)
+        output: Path or binary file object for the filled workbook
+        tables: {sheet name: [TableRows]} streamed into their sheets (see
+            `WritePlan.render_streaming`)
+
+    Returns:
+        Names of the zip members that were rewritten or added
+    """
+    tables = tables or {}
+    with zipfile.ZipFile(io.BytesIO(template)) as source:
+        parts = sheet_parts(source)
+        # {part: (sheet values, [TableRows])}, written while the zip is copied
+        streamed = {}
+        for sheet_name in set(values) | set(tables):
+            sheet_values = values.get(sheet_name, {})
+            sheet_tables = tables.get(sheet_name, [])
+            if not sheet_values and not any(len(table) for table in sheet_tables):
+                continue
+            if sheet_name not in parts:
+                raise PatchError(f"Sheet not found in template: {sheet_name}")
+            streamed[parts[sheet_name]] = (sheet_values, sheet_tables)
+
+        continuations = _plan_continuations(source, parts, tables)
+        templates = {part: _read_sheet(source, part) for part in set(streamed) | {c[2] for c in continuations}}
+        continuation_xml = {template_part: _continuation_xml(templates[template_part], template_part)
+                            for _, _, template_part, _, _ in continuations}
+
+        rewritten = _add_sheets(source, [(name, part) for name, part, _, _, _ in continuations]) if continuations else {}
+        names = set(source.namelist())
+        has_calc_chain = CALC_CHAIN in names and bool(streamed)
+        if has_calc_chain:
+            for name in ('[Content_Types].xml', 'xl/_rels/workbook.xml.rels'):
+                if name in names:
+                    rewritten[name] = _drop_calc_chain(name, rewritten.get(name) or source.read(name))
+
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                if has_calc_chain and info.filename == CALC_CHAIN:
+                    continue
+                if info.filename in streamed:
+                    sheet_values, sheet_tables = streamed[info.filename]
+                    rows = _merge_rows(_value_rows(sheet_values), *(table.rows() for table in sheet_tables))
+                    positions = list(sheet_values) + [pos for table in sheet_tables for pos in table.extent()]
+                    _stream_member(target, info.filename, info.date_time,
+                                   lambda write: write_sheet_xml(templates[info.filename], rows, write, positions))
+                elif info.filename in rewritten:
+                    entry = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    entry.compress_type = zipfile.ZIP_DEFLATED
+                    entry.external_attr = info.external_attr
+                    target.writestr(entry, rewritten[info.filename])
+                elif not _copy_compressed(source, target, info):
+                    target.writestr(info, source.read(info.filename))
+
+            for _, part, template_part, chunk, split in continuations:
+                rows = _merge_rows(*(table.rows(chunk) for table in split))
+                positions = [pos for table in split for pos in table.extent(chunk)]
+                _stream_member(target, part, source.getinfo(template_part).date_time,
+                               lambda write: write_sheet_xml(continuation_xml[template_part], rows, write, positions))
+
+    return sorted(set(streamed) | set(rewritten) | {part for _, part, _, _, _ in continuations})
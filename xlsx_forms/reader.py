@@ -0,0 +1,227 @@
+"""Read filled forms back using the same write plan that filled them.
+
+Only the cells the plan writes are read. Sheets are scanned lexically, row by
+row, straight from the zip: no styles are loaded, shared strings are decoded
+only when a needed cell refers to them, and each sheet stops being parsed
+after the last row the plan needs. That is fast enough for audit sweeps over
+hundreds of forms. Files the lexical reader cannot handle are read with
+openpyxl in read-only, values-only mode instead.
+
+The row sources, `lexical_rows` over a `SharedStrings` table and
+`openpyxl_rows`, are shared with the template field index (`fields`) and the
+template analyzer (`analyze`).
+"""
+import re
+import html
+import zipfile
+import xml.etree.ElementTree as ET
+from openpyxl import load_workbook
+from openpyxl.utils.cell import column_index_from_string
+
+from .mapping import continuation_sheet_name
+from .patch import MAIN_NS, ROW_RE, CELL_RE, ROW_NUMBER_RE, CELL_REF_RE, PatchError, sheet_parts
+
+CELL_TYPE_RE = re.compile(r'\bt="(\w+)"')
+VALUE_RE = re.compile(r'<v>(.*?)</v>', re.S)
+TEXT_RE = re.compile(r'<t\b[^>]*>(.*?)</t>', re.S)
+INTEGER_RE = re.compile(r'-?\d+')
+
+
+class ReadError(Exception):
+    """Raised when a file cannot be read lexically and openpyxl should be used."""
+
+
+class SharedStrings:
+    """Shared string table, parsed on first access."""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        self._archive = archive
+        self._strings = None
+
+    def __getitem__(self, index: int) -> str:
+        if self._strings is None:
+            self._strings = []
+            if 'xl/sharedStrings.xml' in self._archive.namelist():
+                root = ET.fromstring(self._archive.read('xl/sharedStrings.xml'))
+                for item in root.iter(f'{{{MAIN_NS}}}si'):
+                    # Plain <t> or rich-text runs <r><t>; phonetic <rPh> hints are skipped
+                    texts = [item.find(f'{{{MAIN_NS}}}t')] + [run.find(f'{{{MAIN_NS}}}t') for run in item.iter(f'{{{MAIN_NS}}}r')]
+                    self._strings.append(''.join(t.text or '' for t in texts if t is not None))
+        return self._strings[index]
+
+
+def _decode_cell(cell_xml: str, attrs: str, strings: SharedStrings):
+    cell_type = CELL_TYPE_RE.search(attrs)
+    cell_type = cell_type.group(1) if cell_type else 'n'
+
+    if cell_type == 'inlineStr':
+        return html.unescape(''.join(TEXT_RE.findall(cell_xml)))
+
+    value = VALUE_RE.search(cell_xml)
+    if value is None:
+        return None
+    value = value.group(1)
+
+    if cell_type == 's':
+        return strings[int(value)]
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type in ('str', 'e'):
+        return html.unescape(value)
+    if INTEGER_RE.fullmatch(value):
+        return int(value)
+    try:
+        return float(value)
+    except ValueError:
+        raise ReadError(f"Unexpected numeric cell value {value!r}")
+
+
+class _LexicalRow:
+    """Cells of one row, decoded only when a value is asked for."""
+
+    __slots__ = ('_cells', '_strings')
+
+    def __init__(self, cells: dict, strings: SharedStrings):
+        self._cells = cells
+        self._strings = strings
+
+    def get(self, col: int):
+        cell = self._cells.get(col)
+        return _decode_cell(cell.group(0), cell.group(1), self._strings) if cell else None
+
+    def items(self):
+        """Yields (column, value) for every cell in the row, in column order."""
+        for col in sorted(self._cells):
+            cell = self._cells[col]
+            yield col, _decode_cell(cell.group(0), cell.group(1), self._strings)
+
+
+def lexical_rows(archive: zipfile.ZipFile, part: str, strings: SharedStrings, max_row: int = None):
+    """Yields (row number, row values by column) from a sheet part, stopping after `max_row`."""
+    xml = archive.read(part).decode('utf-8')
+    for row in ROW_RE.finditer(xml):
+        number = ROW_NUMBER_RE.search(row.group(1))
+        if number is None:
+            raise ReadError("Row without a row number")
+        row_number = int(number.group(1))
+        if max_row is not None and row_number > max_row:
+            return
+
+        cells = {}
+        for cell in CELL_RE.finditer(row.group(2) or ''):
+            ref = CELL_REF_RE.search(cell.group(1))
+            if ref is None:
+                raise ReadError(f"Row {row_number} has a cell without a reference")
+            cells[column_index_from_string(ref.group(1))] = cell
+        yield row_number, _LexicalRow(cells, strings)
+
+
+def openpyxl_rows(ws, max_row: int = None):
+    """Yields (row number, {column: value}) from a read-only openpyxl worksheet."""
+    for row in ws.iter_rows(max_row=max_row):
+        cells = [cell for cell in row if getattr(cell, 'value', None) is not None]
+        if cells:
+            yield cells[0].row, {cell.column: cell.value for cell in cells}
+
+
+def _field_key(spec: dict, fallback: str) -> str:
+    return spec.get('key') or spec.get('description') or fallback
+
+
+def _read_sheet(rows, cells: list, tables: list) -> dict:
+    """Collects the planned cells and table rows of one sheet from its row stream."""
+    wanted = {}
+    for row, col, spec in cells:
+        wanted.setdefault(row, []).append((col, spec))
+
+    # Per table: its columns, the rows read so far and the next row expected
+    table_states = []
+    for table in tables:
+        columns = [(column_index_from_string(letter), spec) for letter, spec in table['columns'].items()]
+        table_states.append({'table': table, 'columns': columns, 'rows': [], 'next_row': table['start_row']})
+
+    sheet = {}
+    for row_number, values in rows:
+        for col, spec in wanted.get(row_number, ()):
+            sheet[_field_key(spec, f"R{row_number}C{col}")] = values.get(col)
+
+        for state in table_states:
+            if state['next_row'] is None or row_number < state['next_row']:
+                continue
+            # A table ends at its first missing or empty row
+            if row_number != state['next_row'] or all(values.get(col) is None for col, _ in state['columns']):
+                state['next_row'] = None
+                continue
+            state['rows'].append({_field_key(spec, str(col)): values.get(col) for col, spec in state['columns']})
+            state['next_row'] += 1
+
+    for row, col, spec in cells:
+        sheet.setdefault(_field_key(spec, f"R{row}C{col}"), None)
+    for state in table_states:
+        sheet[_field_key(state['table'], state['table']['source'])] = state['rows']
+    return sheet
+
+
+def _max_row(cells: list, tables: list):
+    # Tables may run to the end of the sheet
+    if tables:
+        return None
+    return max((row for row, _, _ in cells), default=0)
+
+
+def _read_continuations(sheet: dict, sheet_name: str, tables: list, sheet_names, sheet_rows) -> None:
+    """Appends the rows split tables continued on "<sheet> (2)", "<sheet> (3)", ... to `sheet`."""
+    split = [table for table in tables if table.get('split')]
+    number = 2
+    while split and continuation_sheet_name(sheet_name, number) in sheet_names:
+        continued = _read_sheet(sheet_rows(continuation_sheet_name(sheet_name, number)), [], split)
+        for table in split:
+            key = _field_key(table, table['source'])
+            sheet[key] += continued[key]
+        number += 1
+
+
+def read_form(path, plan) -> dict:
+    """
+    Reads the cells `plan` fills from the workbook at `path`.
+
+    Args:
+        path: Path to a workbook filled from the plan's template
+        plan: `WritePlan` that describes where each value lives
+
+    Returns:
+        {sheet name: {key: value}}, where key is the mapping field's `key`
+        (or description) and each table is a list of row dicts
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            parts = sheet_parts(archive)
+            strings = SharedStrings(archive)
+            form = {}
+            for sheet_name, cells, tables, _ in plan.sheets:
+                if sheet_name not in parts:
+                    continue
+                rows = lexical_rows(archive, parts[sheet_name], strings, _max_row(cells, tables))
+                form[sheet_name] = _read_sheet(rows, cells, tables)
+                _read_continuations(form[sheet_name], sheet_name, tables, parts,
+                                    lambda name: lexical_rows(archive, parts[name], strings))
+            return form
+    except (ReadError, PatchError, KeyError, IndexError, UnicodeDecodeError, ET.ParseError):
+        return read_form_openpyxl(path, plan)
+
+
+def read_form_openpyxl(path, plan) -> dict:
+    """`read_form` using openpyxl's read-only, values-only mode."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        form = {}
+        for sheet_name, cells, tables, _ in plan.sheets:
+            if sheet_name not in wb.sheetnames:
+                continue
+            rows = openpyxl_rows(wb[sheet_name], _max_row(cells, tables))
+            form[sheet_name] = _read_sheet(rows, cells, tables)
+            _read_continuations(form[sheet_name], sheet_name, tables, wb.sheetnames,
+                                lambda name: openpyxl_rows(wb[name]))
+        return form
+    finally:
+        wb.close()
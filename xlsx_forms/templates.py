@@ -0,0 +1,139 @@
+"""In-memory cache of parsed Excel templates.
+
+`openpyxl.load_workbook` decompresses the whole package and parses every XML
+part, which dominates the cost of filling a form. `TemplateCache` keeps each
+template's raw zip bytes, which is all the patch writer needs, and parses a
+template only on its first `get`. It then keeps a pickled snapshot of the
+master workbook; every later `get` unpickles an independent copy, which is an
+order of magnitude cheaper than parsing the xlsx again. Templates that cannot
+be pickled fall back to re-parsing from the raw bytes.
+
+Entries are keyed by resolved path, mtime and size, so an edited template is
+picked up on the next call, and evicted least recently used first once the
+entry or byte budget is exceeded.
+"""
+import io
+import os
+import pickle
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+import openpyxl
+
+DEFAULT_MAX_TEMPLATES = int(os.environ.get('TEMPLATE_CACHE_SIZE', '8'))
+DEFAULT_MAX_BYTES = int(os.environ.get('TEMPLATE_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# Snapshot of a template no `get` has parsed yet
+_UNPARSED = object()
+
+
+class _Template:
+    __slots__ = ('key', 'content_hash', 'raw', 'snapshot')
+
+    def __init__(self, key, content_hash, raw):
+        self.key = key
+        self.content_hash = content_hash
+        self.raw = raw
+        # Pickled workbook, None if it can't be pickled
+        self.snapshot = _UNPARSED
+
+    @property
+    def size(self) -> int:
+        return len(self.raw) + (len(self.snapshot) if isinstance(self.snapshot, bytes) else 0)
+
+
+class TemplateCache:
+    """LRU cache of parsed templates handing out independent workbook copies."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_TEMPLATES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, path) -> tuple:
+        """
+        Returns a fresh workbook for the template at `path`.
+
+        Returns:
+            (workbook, content_hash) tuple; the workbook may be modified freely
+        """
+        entry = self._entry(path)
+        snapshot = entry.snapshot
+        if isinstance(snapshot, bytes):
+            return pickle.loads(snapshot), entry.content_hash
+
+        wb = openpyxl.load_workbook(io.BytesIO(entry.raw))
+        if snapshot is _UNPARSED:
+            self._keep_snapshot(entry, wb)
+        return wb, entry.content_hash
+
+    def raw_bytes(self, path) -> tuple:
+        """Returns (zip bytes, content_hash) of the template at `path`."""
+        entry = self._entry(path)
+        return entry.raw, entry.content_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _entry(self, path) -> _Template:
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry
+
+        raw = path.read_bytes()
+        entry = _Template(key, hashlib.sha256(raw).hexdigest(), raw)
+        with self._lock:
+            self._stats['misses'] += 1
+            if key in self._entries:
+                # Loaded concurrently; share that entry so its snapshot is built once
+                return self._entries[key]
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def _keep_snapshot(self, entry: _Template, wb) -> None:
+        # Pickling leaves `wb` untouched, so the parse that built the snapshot also serves this call
+        try:
+            snapshot = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            snapshot = None
+        with self._lock:
+            if entry.snapshot is not _UNPARSED:
+                return
+            entry.snapshot = snapshot
+            if snapshot is not None and self._entries.get(entry.key) is entry:
+                self._bytes += len(snapshot)
+                self._evict()
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the byte budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._stats['evictions'] += 1
+
+
+_default_cache = TemplateCache()
+
+
+def get_template_cache() -> TemplateCache:
+    """Returns the process-wide template cache."""
+    return _default_cache